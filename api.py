@@ -0,0 +1,170 @@
+import sys
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+
+# Add the src directory to Python path for module imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/src")
+
+# Import required libraries and custom modules
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel
+from src.utils.logger import logger
+from src.services.llm_session import LLMSession
+from src.services.retrieval_service import RetrievalService
+from src.services.semantic_cache import SemanticAnswerCache
+from src.services.prompt_builder import PromptBuilder
+# Same module as the calls record their usage to (imported without the src prefix)
+from services.usage import UsageScope
+from retrieval.faiss_langchain_vector_store import embed_query
+from utils.timing import StageTimings
+from utils.slow_query_log import slow_query_log
+from src.config.config import LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL, SEMANTIC_CACHE_ENABLE, METRICS_ENABLE, API_HOST, API_PORT, API_WORKERS
+
+
+class QueryRequest(BaseModel):
+    query: str
+    return_scores: bool = False
+
+
+class AnswerRequest(BaseModel):
+    query: str
+    stream: bool = True
+
+
+# Index and models are loaded once per worker process
+state = {"service": None, "llm_session": None, "error": None}
+
+
+def load_state():
+    try:
+        service = RetrievalService()
+        semantic_cache = None
+        if SEMANTIC_CACHE_ENABLE.lower() == "yes":
+            semantic_cache = SemanticAnswerCache(embed_query)
+        state["llm_session"] = LLMSession(LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL, semantic_cache, PromptBuilder())
+        state["service"] = service
+        if service.loaded:
+            logger.info(f"API ready (index version {service.index_version})")
+        else:
+            logger.error(f"API started without index, not ready until the index watcher loads one")
+    except Exception as e:
+        state["error"] = str(e)
+        logger.error(f"An error has occurred while loading the API: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load in the background so that /health answers while the index loads
+    loading = asyncio.create_task(asyncio.to_thread(load_state))
+    yield
+    await loading
+    if state["service"] is not None:
+        state["service"].close()
+
+
+app = FastAPI(title="Contextual RAG Example", lifespan=lifespan)
+
+
+def get_service():
+    if state["service"] is None:
+        raise HTTPException(status_code=503, detail=state["error"] or "Index is loading")
+    if not state["service"].loaded:
+        raise HTTPException(status_code=503, detail="No index could be loaded yet")
+    return state["service"]
+
+
+async def retrieve_documents(query: str, return_scores: bool = False):
+    if query.strip() == "":
+        raise HTTPException(status_code=400, detail="Query can't be empty.")
+
+    # Retrieval is blocking (FAISS, BM25, cross-encoder): run it in a worker thread
+    return await asyncio.to_thread(get_service().query, query.strip(), False, return_scores)
+
+
+@app.get("/health")
+async def health():
+    """Liveness: the process answers."""
+
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: the index is loaded and queries can be served."""
+
+    service = get_service()
+    return {"status": "ready", "index_version": service.index_version}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Stage histograms and counters in the Prometheus text format (METRICS_ENABLE)."""
+
+    if METRICS_ENABLE.lower() != "yes":
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+
+    # Same module as the stages record to (imported without the src prefix)
+    from utils.metrics import metrics
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/retrieve")
+async def retrieve(request: QueryRequest):
+    """Return the chunks most relevant to a query."""
+
+    results = await retrieve_documents(request.query, request.return_scores)
+    return {"query": request.query, "index_version": get_service().index_version, "results": results}
+
+
+@app.post("/answer")
+async def answer(request: AnswerRequest):
+    """Answer a query from the retrieved chunks.
+
+    With stream (default), the response is newline-delimited JSON: a first line with the
+    sources, then one line per piece of answer, then a last line with 'done'. The token
+    usage and cost of the query come with the answer, or with 'done'. Slow answers are
+    logged with their stage timings (see utils.slow_query_log).
+    """
+
+    llm_session = state["llm_session"]
+    index_version = get_service().index_version
+
+    if not request.stream:
+        with UsageScope(request.query) as usage, slow_query_log.track("answer", request.query, index_version=index_version, stream=False):
+            documents = await retrieve_documents(request.query)
+            response = await asyncio.to_thread(llm_session.get_response_from_documents, request.query, documents)
+        if response is None:
+            raise HTTPException(status_code=502, detail="The language model didn't answer.")
+        return {"query": request.query, "answer": response, "sources": documents, "usage": usage.totals()}
+
+    # The answer is generated after this returns, so its timings are recorded at the end of the stream
+    usage, timings, start = UsageScope(request.query), StageTimings(), time.perf_counter()
+    with usage, timings:
+        documents = await retrieve_documents(request.query)
+
+    async def stream_answer():
+        # Also logged if the stream fails or the client disconnects, with the error like SlowQueryLog.track
+        fields = {"index_version": index_version, "stream": True}
+        try:
+            yield json.dumps({"sources": documents}, ensure_ascii=False) + "\n"
+            with usage, timings:
+                async for token in llm_session.astream_response_from_documents(request.query, documents):
+                    yield json.dumps({"token": token}, ensure_ascii=False) + "\n"
+        except BaseException as e:
+            fields["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            slow_query_log.record("answer", request.query, time.perf_counter() - start, timings, **fields)
+        yield json.dumps({"done": True, "usage": usage.totals()}) + "\n"
+
+    return StreamingResponse(stream_answer(), media_type="application/x-ndjson")
+
+
+if __name__ == "__main__":
+    uvicorn.run("api:app", host=API_HOST, port=API_PORT, workers=API_WORKERS)
@@ -0,0 +1,296 @@
+import sys
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+
+# Add the src directory to Python path for module imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/src")
+
+# Only modules without config imports here: config is read at import, after the benchmark environment is set
+from src.benchmarks.report import environment, write_report
+
+
+def profiling_environment(targets: str, every: int = 1):
+    """Return the environment variables profiling targets every Nth call (see utils.profiling)."""
+
+    return {"PROFILE_ENABLE": "yes", "PROFILE_TARGETS": targets, "PROFILE_EVERY": str(every)}
+
+
+def run_indexing(args):
+    """Benchmark the indexing pipeline, one child process per corpus size."""
+
+    from src.benchmarks.indexing import workspace_environment, offline_environment
+
+    if args.profile:
+        # Inherited by the child processes
+        os.environ.update(profiling_environment(args.profile))
+
+    if args.child:
+        os.environ.update(workspace_environment(args.workdir))
+        if not args.configured_providers:
+            os.environ.update(offline_environment(args.llm_latency_ms, args.embedding_latency_ms))
+
+        from src.benchmarks.indexing import benchmark_indexing
+        write_report(benchmark_indexing(args.chunks[0], args.chunks_per_document, args.seed), args.output)
+        return 0
+
+    results = []
+    for chunks in args.chunks:
+        workdir = tempfile.mkdtemp(prefix=f"rag_indexing_{chunks}_", dir=args.workdir)
+        output = os.path.join(workdir, "result.json")
+        command = [sys.executable, os.path.abspath(__file__), "indexing", "--child", "--workdir", workdir, "--output", output,
+                   "--chunks", str(chunks), "--chunks-per-document", str(args.chunks_per_document), "--seed", str(args.seed),
+                   "--llm-latency-ms", str(args.llm_latency_ms), "--embedding-latency-ms", str(args.embedding_latency_ms)]
+        if args.configured_providers:
+            command.append("--configured-providers")
+
+        code = subprocess.run(command, stdout=sys.stderr).returncode
+        if code == 0 and os.path.exists(output):
+            with open(output, 'r', encoding='utf-8') as f:
+                results.append(json.load(f))
+        else:
+            results.append({"success": False, "chunks_requested": chunks, "error": f"Benchmark process exited with code {code}"})
+
+        if args.keep:
+            print(f"Workspace kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "indexing",
+        "environment": environment(),
+        "parameters": {
+            "chunks_per_document": args.chunks_per_document,
+            "seed": args.seed,
+            "providers": "configured" if args.configured_providers else "fake",
+            "llm_latency_ms": args.llm_latency_ms,
+            "embedding_latency_ms": args.embedding_latency_ms,
+        },
+        "results": results,
+    }
+    write_report(report, args.output)
+    return 0 if all(result["success"] for result in results) else 1
+
+
+def run_queries(args):
+    """Load test of the query path, in this process or over HTTP."""
+
+    from src.benchmarks.indexing import workspace_environment, offline_environment
+
+    in_process = args.target == "inprocess"
+    if in_process:
+        if args.workspace is not None:
+            os.environ.update(workspace_environment(args.workspace))
+        if args.fake_providers:
+            os.environ.update(offline_environment(args.llm_latency_ms, args.embedding_latency_ms))
+        if args.no_query_cache:
+            os.environ["QUERY_CACHE_ENABLE"] = "no"
+        if args.profile:
+            os.environ.update(profiling_environment(args.profile, args.profile_every))
+
+    from src.benchmarks.load import load_queries, InProcessTarget, HttpTarget, run_load, summarize
+
+    queries, offsets = load_queries(args.queries, args.synthetic, args.documents, args.seed)
+    if not args.replay_offsets:
+        offsets = None
+    elif offsets is None:
+        print("The query file has no arrival times to replay.", file=sys.stderr)
+        return 1
+    else:
+        offsets = [offset / args.speed for offset in offsets]
+
+    target = InProcessTarget(args.generate) if in_process else HttpTarget(args.target, args.generate, args.timeout)
+    samples, elapsed = run_load(target, queries, args.concurrency, args.rate, offsets, args.requests, args.duration, args.warmup, args.seed)
+
+    report = {
+        "benchmark": "queries",
+        "environment": environment(),
+        "parameters": {
+            "target": args.target,
+            "generate": args.generate,
+            "queries": args.queries or f"synthetic ({len(queries)})",
+            "mode": "trace" if offsets is not None else ("open-loop" if args.rate is not None else "closed-loop"),
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "requests": args.requests,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "fake_providers": args.fake_providers,
+            "query_cache": not args.no_query_cache,
+        },
+        "result": summarize(samples, elapsed),
+    }
+    write_report(report, args.output)
+    return 0
+
+
+def run_slow_queries(args):
+    """Replay the queries of the slow query log in this process and compare their latency with the logged one."""
+
+    from src.benchmarks.indexing import workspace_environment, offline_environment
+
+    if args.workspace is not None:
+        os.environ.update(workspace_environment(args.workspace))
+    if args.fake_providers:
+        os.environ.update(offline_environment(args.llm_latency_ms, args.embedding_latency_ms))
+    # Measure every run, and don't log the replayed queries again
+    os.environ["QUERY_CACHE_ENABLE"] = "no"
+    os.environ["SLOW_QUERY_ENABLE"] = "no"
+
+    from src.config.config import SLOW_QUERY_PATH
+    from src.benchmarks.load import InProcessTarget
+    from src.benchmarks.slow_queries import read_slow_queries, latest_per_query, replay_slow_queries, summarize_replay, format_replay
+
+    entries = latest_per_query(read_slow_queries(args.log or SLOW_QUERY_PATH, args.kind))
+    entries = sorted(entries, key=lambda entry: entry["latency_ms"], reverse=True)[:args.limit]
+    if not entries:
+        print(f"No {args.kind} entry in the slow query log.", file=sys.stderr)
+        return 1
+
+    target = InProcessTarget(args.kind == "answer")
+    results = replay_slow_queries(target, entries, args.repeat)
+    summary = summarize_replay(results)
+
+    if args.format == "table":
+        print(format_replay(results, summary))
+        return 0
+
+    report = {
+        "benchmark": "slow-queries",
+        "environment": environment(),
+        "parameters": {
+            "log": args.log or SLOW_QUERY_PATH,
+            "kind": args.kind,
+            "limit": args.limit,
+            "repeat": args.repeat,
+            "index_version": target.indexer.index_version,
+            "fake_providers": args.fake_providers,
+        },
+        "summary": summary,
+        "results": results,
+    }
+    write_report(report, args.output)
+    return 0
+
+
+def run_ann(args):
+    """Recall against latency of ANN index configurations, per corpus size."""
+
+    if args.threads:
+        import faiss
+        faiss.omp_set_num_threads(args.threads)
+
+    from src.benchmarks.ann import load_vectors, synthetic_vectors, benchmark_ann, format_table, plot_pareto
+    from src.config.config import EMBEDDING_DIM, RETRIEVAL_TOP_K
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim or EMBEDDING_DIM, seed=args.seed)
+    else:
+        vectors = load_vectors(args.vectors) if args.vectors else load_vectors()
+    options = {name: getattr(args, name) for name in ["nlists", "nprobes", "hnsw_m", "ef_search", "pq_m"] if getattr(args, name) is not None}
+    results = [benchmark_ann(vectors, size, args.queries, args.k or RETRIEVAL_TOP_K, args.noise, args.seed, **options) for size in (args.sizes or [None])]
+
+    if args.plot:
+        plot_pareto(results, args.plot)
+    if args.format == "table":
+        print("\n\n".join(format_table(result) for result in results), file=sys.stderr if args.output else sys.stdout)
+
+    report = {
+        "benchmark": "ann",
+        "environment": environment(),
+        "parameters": {"vectors": "synthetic" if args.synthetic else (args.vectors or "index"), "queries": args.queries, "noise": args.noise, "seed": args.seed, **options},
+        "results": results,
+    }
+    if args.format == "json" or args.output:
+        write_report(report, args.output)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the contextual RAG pipeline, reported as JSON.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    indexing = subparsers.add_parser("indexing", help="End-to-end indexing (Indexer2.execute_pipeline) of synthetic corpora.")
+    indexing.add_argument("--chunks", type=int, nargs="+", default=[1000], help="Corpus sizes in chunks, one run per size (default: 1000).")
+    indexing.add_argument("--chunks-per-document", type=int, default=10, help="Approximate number of chunks per document (default: 10).")
+    indexing.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus (default: 0).")
+    indexing.add_argument("--llm-latency-ms", type=float, default=0, help="Latency of the fake contextual LLM (default: 0).")
+    indexing.add_argument("--embedding-latency-ms", type=float, default=0, help="Latency of the fake embeddings (default: 0).")
+    indexing.add_argument("--configured-providers", action="store_true", help="Use the providers of the configuration instead of the fake ones.")
+    indexing.add_argument("--workdir", default=None, help="Directory of the temporary workspaces (default: system temporary directory).")
+    indexing.add_argument("--keep", action="store_true", help="Keep the workspaces (corpus and index) after the run.")
+    indexing.add_argument("--profile", nargs="?", const="execute_pipeline", default=None, metavar="TARGETS",
+                          help="Profile the pipeline, or the comma-separated stages, to PROFILE_PATH (default: execute_pipeline).")
+    indexing.add_argument("--output", default=None, help="JSON report file (default: standard output).")
+    indexing.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    indexing.set_defaults(run=run_indexing)
+
+    queries = subparsers.add_parser("queries", help="Load test of query_index (and generation), per-stage latency percentiles.")
+    queries.add_argument("--target", default="inprocess", help="'inprocess' (default) or the URL of the HTTP API, e.g. http://127.0.0.1:8000.")
+    queries.add_argument("--generate", action="store_true", help="Also generate the answers.")
+    queries.add_argument("--queries", default=None, help="File with one query per line, or .jsonl trace with 'query' and 'offset' or 'timestamp'.")
+    queries.add_argument("--synthetic", type=int, default=100, help="Number of synthetic queries without --queries (default: 100).")
+    queries.add_argument("--documents", type=int, default=1000, help="Number of documents of the synthetic corpus, for synthetic queries (default: 1000).")
+    queries.add_argument("--concurrency", type=int, default=1, help="Concurrent clients, or maximum requests in flight with --rate (default: 1).")
+    queries.add_argument("--rate", type=float, default=None, help="Open-loop arrival rate in queries per second (default: closed loop).")
+    queries.add_argument("--replay-offsets", action="store_true", help="Send the queries of a trace at their recorded arrival times.")
+    queries.add_argument("--speed", type=float, default=1.0, help="Speed-up of the replayed arrival times (default: 1).")
+    queries.add_argument("--requests", type=int, default=None, help="Number of requests (default: every query once).")
+    queries.add_argument("--duration", type=float, default=None, help="Duration of the test in seconds.")
+    queries.add_argument("--warmup", type=int, default=0, help="Queries sent before the test and not measured (default: 0).")
+    queries.add_argument("--seed", type=int, default=0, help="Seed of the synthetic queries and arrival times (default: 0).")
+    queries.add_argument("--timeout", type=float, default=60, help="HTTP timeout in seconds (default: 60).")
+    queries.add_argument("--workspace", default=None, help="Workspace kept by 'indexing --keep' to query instead of the configured index.")
+    queries.add_argument("--fake-providers", action="store_true", help="Use the fake providers (required for an index built with them).")
+    queries.add_argument("--llm-latency-ms", type=float, default=300, help="Latency of the fake LLM (default: 300).")
+    queries.add_argument("--embedding-latency-ms", type=float, default=50, help="Latency of the fake embeddings (default: 50).")
+    queries.add_argument("--no-query-cache", action="store_true", help="Disable the retrieval cache, so that repeated queries are measured.")
+    queries.add_argument("--profile", nargs="?", const="query_index", default=None, metavar="TARGETS",
+                         help="Profile query_index, or the comma-separated stages, to PROFILE_PATH, in process (default: query_index).")
+    queries.add_argument("--profile-every", type=int, default=10, help="Profile every Nth call of the targets with --profile (default: 10).")
+    queries.add_argument("--output", default=None, help="JSON report file (default: standard output).")
+    queries.set_defaults(run=run_queries)
+
+    slow = subparsers.add_parser("slow-queries", help="Replay the slow query log against the current build, logged against replayed latency.")
+    slow.add_argument("--log", default=None, help="Slow query log, rotated files included (default: SLOW_QUERY_PATH).")
+    slow.add_argument("--kind", choices=["query_index", "answer"], default="query_index", help="Entries replayed, answers with generation (default: query_index).")
+    slow.add_argument("--limit", type=int, default=100, help="Slowest distinct queries replayed (default: 100).")
+    slow.add_argument("--repeat", type=int, default=3, help="Runs per query, the median is kept (default: 3).")
+    slow.add_argument("--workspace", default=None, help="Workspace kept by 'indexing --keep' to query instead of the configured index.")
+    slow.add_argument("--fake-providers", action="store_true", help="Use the fake providers (required for an index built with them).")
+    slow.add_argument("--llm-latency-ms", type=float, default=300, help="Latency of the fake LLM (default: 300).")
+    slow.add_argument("--embedding-latency-ms", type=float, default=50, help="Latency of the fake embeddings (default: 50).")
+    slow.add_argument("--format", choices=["json", "table"], default="json", help="Output format (default: json).")
+    slow.add_argument("--output", default=None, help="JSON report file (default: standard output).")
+    slow.set_defaults(run=run_slow_queries)
+
+    ann = subparsers.add_parser("ann", help="Recall@k against latency, build time and memory of IVF, HNSW, PQ and SQ8 indexes.")
+    ann.add_argument("--vectors", default=None, help="FAISS index (directory or file) or .npy array of embeddings (default: the configured index).")
+    ann.add_argument("--synthetic", type=int, default=None, help="Use this number of synthetic clustered vectors instead of stored embeddings.")
+    ann.add_argument("--dim", type=int, default=None, help="Dimension of the synthetic vectors (default: EMBEDDING_DIM).")
+    ann.add_argument("--sizes", type=int, nargs="+", default=None, help="Corpus sizes evaluated on random subsets (default: all the vectors).")
+    ann.add_argument("--queries", type=int, default=200, help="Number of query vectors (default: 200).")
+    ann.add_argument("--k", type=int, default=None, help="Number of neighbours for recall (default: RETRIEVAL_TOP_K).")
+    ann.add_argument("--noise", type=float, default=0.1, help="Relative noise of the queries around stored vectors (default: 0.1).")
+    ann.add_argument("--nlists", type=int, nargs="+", default=None, help="IVF list counts (default: 1x and 4x sqrt(size)).")
+    ann.add_argument("--nprobes", type=int, nargs="+", default=None, help="IVF probes (default: 1 4 16 64).")
+    ann.add_argument("--hnsw-m", type=int, nargs="+", default=None, help="HNSW M values (default: 16 32).")
+    ann.add_argument("--ef-search", type=int, nargs="+", default=None, help="HNSW efSearch values (default: 16 64 256).")
+    ann.add_argument("--pq-m", type=int, nargs="+", default=None, help="PQ sub-quantizer counts (default: dim/16 and dim/8).")
+    ann.add_argument("--threads", type=int, default=None, help="FAISS threads (default: FAISS default).")
+    ann.add_argument("--seed", type=int, default=0, help="Seed of the subsets and queries (default: 0).")
+    ann.add_argument("--format", choices=["json", "table"], default="json", help="Output format (default: json).")
+    ann.add_argument("--plot", default=None, help="Save a recall/latency Pareto chart to this image (needs matplotlib).")
+    ann.add_argument("--output", default=None, help="JSON report file (default: standard output).")
+    ann.set_defaults(run=run_ann)
+
+    args = parser.parse_args()
+    sys.exit(args.run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,9 +9,12 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/src")
 import streamlit as st
 from src.utils.logger import logger
 from src.services.llm_session import LLMSession
-from src.services.indexer import Indexer
-from src.services.indexer2 import Indexer2
-from src.config.config import LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL
+from src.services.retrieval_service import RetrievalService
+from src.services.semantic_cache import SemanticAnswerCache
+from src.services.prompt_builder import PromptBuilder
+# Same module as the retrieval caches query embeddings in (imported without the src prefix)
+from retrieval.faiss_langchain_vector_store import embed_query
+from src.config.config import LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL, SEMANTIC_CACHE_ENABLE
 
 
 
@@ -29,14 +32,21 @@ if "init_mlflow" not in st.session_state:
     setup_mlflow()
     st.session_state.init_mlflow = True
 
-if "llm_session" not in st.session_state:
-    st.session_state.llm_session = LLMSession(LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL)
+# Index and caches shared by every browser session
+@st.cache_resource
+def get_retrieval_service():
+    return RetrievalService()
+
+@st.cache_resource
+def get_semantic_cache():
+    if SEMANTIC_CACHE_ENABLE.lower() != "yes":
+        return None
+    return SemanticAnswerCache(embed_query)
 
-if "indexer" not in st.session_state:
-    # st.session_state.indexer = Indexer()
-    st.session_state.indexer = Indexer2()
-    st.session_state.indexer.load_index()
-    st.session_state.indexer.load_chunks()
+retrieval_service = get_retrieval_service()
+
+if "llm_session" not in st.session_state:
+    st.session_state.llm_session = LLMSession(LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL, get_semantic_cache(), PromptBuilder())
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -59,6 +69,11 @@ user_input = st.chat_input("Posez votre question...")
 
 
 
+if user_input and not retrieval_service.loaded:
+    # The service keeps retrying to load the index in the background
+    st.error("The index isn't loaded yet, please try again in a moment.")
+    st.stop()
+
 if user_input:
     # Show user message
     st.chat_message("user").markdown(user_input)
@@ -66,19 +81,19 @@ if user_input:
     # Show history
     st.session_state.messages.append({"role": "user", "content": user_input})
     
-    # Get response
-    doc_res = st.session_state.indexer.query_index(user_input.strip())
-    response = st.session_state.llm_session.get_response_from_documents(user_input, doc_res)
+    # Get sources
+    doc_res = retrieval_service.query(user_input.strip())
     
     # Show bot response
     with st.chat_message("assistant"):
-        st.markdown(response)
-
-        # Show sources
+        # Show sources as soon as retrieval is done
         if doc_res:
             with st.popover("📄 Sources"):
                 for i, source in enumerate(doc_res):
                     st.markdown(f"**Source {i + 1}:** {source}")
+
+        # Stream the answer as it is generated
+        response = st.write_stream(st.session_state.llm_session.stream_response_from_documents(user_input, doc_res))
         
     # Add response to history
     st.session_state.messages.append({"role": "assistant", "content": response, "sources": doc_res})
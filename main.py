@@ -1,5 +1,6 @@
 import sys
 import os
+import argparse
 import psutil
 
 # Add the src directory to Python path for module imports
@@ -8,7 +9,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/src")
 from src.services.llm_session import LLMSession
 from src.services.indexer import Indexer
 from src.services.indexer2 import Indexer2
-from src.config.config import LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL
+from src.config.config import LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL, METRICS_ENABLE, METRICS_PATH
 from src.utils.logger import setup_mlflow
 from src.utils.logger import logger
 
@@ -35,8 +36,22 @@ def main():
     indexer.execute_pipeline()
 
     logger.info("Successful index construction")
+
+    if METRICS_ENABLE.lower() == "yes" and METRICS_PATH:
+        from utils.metrics import metrics
+        metrics.write_textfile(METRICS_PATH)
         
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the index of the documents of DOCUMENT_PATH_INPUT.")
+    parser.add_argument("--profile", nargs="?", const="execute_pipeline", default=None, metavar="TARGETS",
+                        help="Profile the pipeline, or the comma-separated stages, to PROFILE_PATH (default: execute_pipeline).")
+    args = parser.parse_args()
+
+    if args.profile:
+        # Same module as the stages are profiled by (imported without the src prefix)
+        from utils.profiling import configure_profiling
+        configure_profiling(args.profile)
+
     main()
 
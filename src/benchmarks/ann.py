@@ -0,0 +1,240 @@
+import os
+import math
+import time
+import faiss
+import numpy as np
+from config.config import INDEX_PATH, EMBEDDING_DIM, RETRIEVAL_TOP_K
+from benchmarks.report import percentiles
+from utils.logger import logger
+
+
+def load_vectors(path: str = INDEX_PATH):
+    """Load stored embeddings from a FAISS index.
+
+    Args:
+        path (str, optional): Directory saved by FaissLangchainVectorStore (index.faiss inside),
+            index file saved by FaissVectorStore, or .npy array. Defaults to INDEX_PATH.
+
+    Returns:
+        np.ndarray: The vectors, of shape (n, dim), as float32.
+    """
+
+    if path.endswith(".npy"):
+        return np.load(path).astype("float32")
+    if os.path.isdir(path):
+        path = os.path.join(path, "index.faiss")
+    index = faiss.read_index(path)
+    return index.reconstruct_n(0, index.ntotal).astype("float32")
+
+
+def synthetic_vectors(count: int, dim: int = EMBEDDING_DIM, clusters: int = 100, seed: int = 0):
+    """Generate normalized vectors drawn around random centroids, a stand-in for embeddings of topical documents."""
+
+    generator = np.random.default_rng(seed)
+    centroids = generator.standard_normal((clusters, dim)).astype("float32")
+    vectors = centroids[generator.integers(0, clusters, count)] + 0.5 * generator.standard_normal((count, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def sample_queries(vectors: np.ndarray, count: int, noise: float = 0.1, seed: int = 0):
+    """Draw query vectors near stored vectors: a random sample plus Gaussian noise of relative scale noise."""
+
+    generator = np.random.default_rng(seed + 1)
+    queries = vectors[generator.choice(len(vectors), size=min(count, len(vectors)), replace=False)].copy()
+    scale = noise * float(np.linalg.norm(queries, axis=1).mean()) / math.sqrt(vectors.shape[1])
+    return (queries + scale * generator.standard_normal(queries.shape)).astype("float32")
+
+
+def candidate_configurations(count: int, dim: int, nlists: list[int] = None, nprobes: list[int] = (1, 4, 16, 64),
+                             hnsw_m: list[int] = (16, 32), ef_search: list[int] = (16, 64, 256), pq_m: list[int] = None):
+    """Return the index configurations to evaluate against IndexFlatL2.
+
+    Each configuration is a faiss.index_factory string with the search parameters to
+    sweep: IVF-Flat, IVF-PQ and IVF-SQ8 with every nlist and nprobe, HNSW with every M
+    and efSearch, plus flat SQ8. nlist defaults to 1x and 4x sqrt(count) and is capped so
+    that every centroid gets enough training points; PQ uses 8 and 16 dimensions per
+    sub-quantizer by default, with 8-bit codes or fewer bits on small corpora.
+
+    Returns:
+        list[dict]: Configurations with 'family', 'factory' and 'search' (list of parameter dicts).
+    """
+
+    max_nlist = max(1, count // 39)
+    if nlists is None:
+        nlists = [int(math.sqrt(count)), 4 * int(math.sqrt(count))]
+    nlists = sorted({min(max(nlist, 1), max_nlist) for nlist in nlists})
+    if pq_m is None:
+        pq_m = [dim // 16, dim // 8]
+    pq_m = [m for m in pq_m if m > 0 and dim % m == 0]
+    # 2^bits centroids per sub-quantizer, trained on at least 39 points each
+    pq_bits = min(8, int(math.log2(max(count // 39, 1))))
+
+    configurations = [{"family": "SQ8", "factory": "SQ8", "search": [{}]}]
+    for nlist in nlists:
+        probes = [{"nprobe": nprobe} for nprobe in nprobes if nprobe <= nlist] or [{"nprobe": nlist}]
+        configurations.append({"family": "IVF", "factory": f"IVF{nlist},Flat", "search": probes})
+        configurations.append({"family": "IVF-SQ8", "factory": f"IVF{nlist},SQ8", "search": probes})
+        if pq_bits >= 4:
+            configurations += [{"family": "IVF-PQ", "factory": f"IVF{nlist},PQ{m}x{pq_bits}", "search": probes} for m in pq_m]
+    configurations += [{"family": "HNSW", "factory": f"HNSW{m}", "search": [{"efSearch": ef} for ef in ef_search]} for m in hnsw_m]
+    return configurations
+
+
+def _search_latencies(index, queries: np.ndarray, k: int):
+    # One query per call, as the application searches
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids[0])
+    return latencies, results
+
+
+def _recall(results: list, ground_truth: np.ndarray, k: int):
+    return float(np.mean([len(set(found[found >= 0]) & set(truth)) / k for found, truth in zip(results, ground_truth)]))
+
+
+def evaluate_configuration(configuration: dict, vectors: np.ndarray, queries: np.ndarray, ground_truth: np.ndarray, k: int):
+    """Build one index configuration and measure each of its search settings.
+
+    Returns:
+        list[dict]: One row per search setting with recall@k, per-query latency (ms),
+            batch throughput (queries/s), build time (s) and index memory (bytes).
+    """
+
+    start = time.perf_counter()
+    index = faiss.index_factory(vectors.shape[1], configuration["factory"])
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    build_seconds = time.perf_counter() - start
+    memory = int(faiss.serialize_index(index).nbytes)
+
+    rows = []
+    parameter_space = faiss.ParameterSpace()
+    for params in configuration["search"]:
+        for name, value in params.items():
+            parameter_space.set_index_parameter(index, name, value)
+
+        latencies, results = _search_latencies(index, queries, k)
+        start = time.perf_counter()
+        index.search(queries, k)
+        batch_seconds = time.perf_counter() - start
+
+        rows.append({
+            "family": configuration["family"],
+            "factory": configuration["factory"],
+            "params": params,
+            f"recall@{k}": _recall(results, ground_truth, k),
+            "latency_ms": {name: value * 1000 for name, value in percentiles(latencies).items()},
+            "mean_latency_ms": float(np.mean(latencies)) * 1000,
+            "batch_qps": len(queries) / batch_seconds if batch_seconds > 0 else None,
+            "build_seconds": build_seconds,
+            "memory_bytes": memory,
+        })
+    return rows
+
+
+def pareto_front(rows: list[dict], k: int):
+    """Mark the rows that no other row beats on both recall and p50 latency."""
+
+    key = f"recall@{k}"
+    for row in rows:
+        row["pareto"] = not any(
+            other is not row and other[key] >= row[key] and other["latency_ms"]["p50"] <= row["latency_ms"]["p50"]
+            and (other[key] > row[key] or other["latency_ms"]["p50"] < row["latency_ms"]["p50"])
+            for other in rows
+        )
+    return rows
+
+
+def benchmark_ann(vectors: np.ndarray, size: int = None, queries: int = 200, k: int = RETRIEVAL_TOP_K, noise: float = 0.1,
+                  seed: int = 0, **configuration_options):
+    """Evaluate candidate ANN indexes on a corpus size against exact flat search.
+
+    Args:
+        vectors (np.ndarray): The stored embeddings.
+        size (int, optional): Number of vectors indexed, a random subset. Defaults to all.
+        queries (int, optional): Number of query vectors. Defaults to 200.
+        k (int, optional): Number of neighbours. Defaults to RETRIEVAL_TOP_K.
+        noise (float, optional): Relative noise of the queries around stored vectors. Defaults to 0.1.
+        seed (int, optional): Seed of the subset and queries. Defaults to 0.
+        **configuration_options: Options of candidate_configurations (nlists, nprobes, hnsw_m, ef_search, pq_m).
+
+    Returns:
+        dict: Corpus size, the exact search baseline and one row per configuration and search setting.
+    """
+
+    generator = np.random.default_rng(seed)
+    if size is not None and size < len(vectors):
+        vectors = vectors[generator.choice(len(vectors), size=size, replace=False)]
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    query_vectors = sample_queries(vectors, queries, noise, seed)
+    k = min(k, len(vectors))
+
+    flat = {"family": "Flat", "factory": "Flat", "search": [{}]}
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(query_vectors, k)
+
+    rows = evaluate_configuration(flat, vectors, query_vectors, ground_truth, k)
+    for configuration in candidate_configurations(len(vectors), vectors.shape[1], **configuration_options):
+        logger.info(f"Evaluating {configuration['factory']} on {len(vectors)} vectors")
+        try:
+            rows += evaluate_configuration(configuration, vectors, query_vectors, ground_truth, k)
+        except Exception as e:
+            logger.error(f"An error has occurred while evaluating {configuration['factory']}: {e}")
+
+    return {"size": len(vectors), "dim": int(vectors.shape[1]), "queries": len(query_vectors), "k": k, "rows": pareto_front(rows, k)}
+
+
+def format_table(result: dict):
+    """Format the rows of a benchmark_ann result as a text table, Pareto-optimal rows starred."""
+
+    k = result["k"]
+    header = f"{'':1} {'index':<22} {'params':<14} {f'recall@{k}':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'qps':>10} {'build s':>8} {'MB':>9}"
+    lines = [f"{result['size']} vectors of dim {result['dim']}, {result['queries']} queries", header, "-" * len(header)]
+    for row in sorted(result["rows"], key=lambda row: row["family"]):
+        params = ",".join(f"{name}={value}" for name, value in row["params"].items())
+        lines.append(
+            f"{'*' if row['pareto'] else '':1} {row['factory']:<22} {params:<14} {row[f'recall@{k}']:>10.4f} "
+            f"{row['latency_ms']['p50']:>8.3f} {row['latency_ms']['p95']:>8.3f} {row['latency_ms']['p99']:>8.3f} "
+            f"{row['batch_qps'] or 0:>10.1f} {row['build_seconds']:>8.2f} {row['memory_bytes'] / 1024 / 1024:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def plot_pareto(results: list[dict], path: str):
+    """Plot recall against p50 latency for each corpus size to an image (needs matplotlib).
+
+    Returns:
+        bool: True if the chart was saved, False otherwise.
+    """
+
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        figure, axes = plt.subplots(1, len(results), figsize=(7 * len(results), 5), squeeze=False)
+        for axis, result in zip(axes[0], results):
+            k = result["k"]
+            for family in sorted({row["family"] for row in result["rows"]}):
+                rows = [row for row in result["rows"] if row["family"] == family]
+                axis.scatter([row["latency_ms"]["p50"] for row in rows], [row[f"recall@{k}"] for row in rows], label=family)
+            front = sorted((row for row in result["rows"] if row["pareto"]), key=lambda row: row["latency_ms"]["p50"])
+            axis.plot([row["latency_ms"]["p50"] for row in front], [row[f"recall@{k}"] for row in front], "k--", linewidth=1)
+            axis.set_xscale("log")
+            axis.set_xlabel("p50 latency per query (ms)")
+            axis.set_ylabel(f"recall@{k}")
+            axis.set_title(f"{result['size']} vectors")
+            axis.legend()
+
+        figure.tight_layout()
+        figure.savefig(path)
+        return True
+    except Exception as e:
+        logger.error(f"An error has occurred while plotting the Pareto chart: {e}")
+        return False
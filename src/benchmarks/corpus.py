@@ -0,0 +1,137 @@
+import os
+import random
+
+SPECIALTIES = ["médecin généraliste", "ophtalmologue", "chirurgien-dentiste", "masseur-kinésithérapeute", "infirmier", "pédiatre", "radiologue", "pharmacien", "cardiologue", "sage-femme"]
+AUTHORITIES = ["la section des assurances sociales de la chambre disciplinaire de première instance", "la section des assurances sociales du Conseil national de l'ordre des médecins", "la caisse primaire d'assurance maladie", "le médecin-conseil chef de service de l'échelon local", "la commission des pénalités financières"]
+REGIONS = ["Île-de-France", "Auvergne-Rhône-Alpes", "Nouvelle-Aquitaine", "Occitanie", "Hauts-de-France", "Grand Est", "Bretagne", "Normandie", "Pays de la Loire", "Provence-Alpes-Côte d'Azur"]
+GRIEVANCES = ["des actes fictifs facturés à la caisse", "le non-respect de la nomenclature générale des actes professionnels", "des cotations d'actes non conformes", "des prescriptions d'arrêts de travail injustifiées", "des dépassements d'honoraires abusifs", "la facturation d'actes non réalisés en présence du patient", "des soins dispensés au-delà des besoins des assurés"]
+SANCTIONS = ["un avertissement", "un blâme", "l'interdiction de donner des soins aux assurés sociaux pendant trois mois", "l'interdiction de donner des soins aux assurés sociaux pendant six mois dont trois avec sursis", "le reversement à la caisse d'une somme de {amount} euros"]
+ARTICLES = ["L. 145-1", "L. 145-2", "L. 162-1-7", "R. 145-2", "R. 145-17", "L. 114-17-1", "R. 4127-8", "R. 4127-32"]
+MONTHS = ["janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août", "septembre", "octobre", "novembre", "décembre"]
+OUTCOMES = ["La requête d'appel est rejetée.", "La décision attaquée est annulée.", "La sanction prononcée est ramenée à {sanction}.", "L'appel de la caisse est rejeté.", "Les conclusions présentées au titre de l'article L. 761-1 du code de justice administrative sont rejetées."]
+
+SENTENCES = [
+    "Vu la procédure suivante, la plainte a été enregistrée le {date} par {authority} de la région {region}.",
+    "Par une plainte du {date}, {authority} a demandé que soit prononcée à l'encontre du Dr {party}, {specialty}, une sanction pour {grievance}.",
+    "Le Dr {party} soutient que les griefs ne sont pas établis et que l'analyse d'activité porte sur un échantillon non représentatif de {count} dossiers.",
+    "Il résulte de l'instruction que {count} actes ont été facturés entre le {date} et le {other_date} sans justification médicale.",
+    "Aux termes de l'article {article} du code de la sécurité sociale, les fautes, abus et fraudes relevés à l'occasion des soins dispensés aux assurés sociaux sont soumis en première instance à une section de la chambre disciplinaire.",
+    "Par une décision du {date}, la chambre disciplinaire a infligé au Dr {party} {sanction}.",
+    "M. {other_party}, assuré social, a déclaré que les séances facturées ne lui avaient pas été dispensées.",
+    "Le médecin-conseil fait valoir que {grievance} constituent une faute au sens de l'article {article}.",
+    "Le Dr {party} fait valoir que la procédure est irrégulière, faute pour la caisse de lui avoir communiqué les pièces du dossier n° {file}.",
+    "Compte tenu de l'ancienneté des faits et de l'absence d'antécédents disciplinaires, il sera fait une juste appréciation de la gravité des fautes en infligeant {sanction}.",
+    "L'audience publique s'est tenue le {date} en présence des parties et de leurs conseils.",
+    "Il n'est pas contesté que le Dr {party} a facturé des actes cotés {code} alors que les conditions de la nomenclature n'étaient pas remplies.",
+]
+
+QUERY_TEMPLATES = [
+    "Cas de {specialty} condamné pour {grievance}",
+    "Liste de cas avec {specialty}",
+    "Quelles sanctions ont été infligées au Dr {party} dans le dossier n° {file} ?",
+    "Que prévoit l'article {article} du code de la sécurité sociale ?",
+    "Dans le dossier n° {file}, quel était le motif du rejet de l'appel de la caisse ?",
+    "Décisions de {authority} en {region}",
+]
+
+
+def _values(generator: random.Random, file: int = None):
+    return {
+        "date": f"{generator.randint(1, 28)} {generator.choice(MONTHS)} {generator.randint(2010, 2024)}",
+        "other_date": f"{generator.randint(1, 28)} {generator.choice(MONTHS)} {generator.randint(2010, 2024)}",
+        "authority": generator.choice(AUTHORITIES),
+        "region": generator.choice(REGIONS),
+        "party": generator.choice("ABCDEFGH"),
+        "other_party": generator.choice("BCDEFGHJ"),
+        "specialty": generator.choice(SPECIALTIES),
+        "grievance": generator.choice(GRIEVANCES),
+        "sanction": generator.choice(SANCTIONS).format(amount=generator.randint(1, 500) * 100),
+        "article": generator.choice(ARTICLES),
+        "count": generator.randint(5, 400),
+        "file": file if file is not None else generator.randint(1000, 9999),
+        "code": generator.choice(["AMS", "AMK", "SFI", "AIS", "C", "V", "ADE"]),
+    }
+
+
+def generate_document(index: int, words: int, seed: int = 0):
+    """Generate a synthetic legal decision of about a number of words.
+
+    Documents follow the layout of the real corpus (header, procedure, grounds, ruling)
+    with randomized parties, dates, articles and sanctions, so that chunking, BM25 and
+    contextualization see realistic text. The same index and seed give the same document.
+
+    Args:
+        index (int): Index of the document, also used as its file number.
+        words (int): Approximate number of words of the document.
+        seed (int, optional): Seed of the corpus. Defaults to 0.
+
+    Returns:
+        str: The document.
+    """
+
+    generator = random.Random(f"{seed}-{index}")
+    file = 1000 + index
+    values = _values(generator, file)
+    lines = [
+        f"Dossier n° {file}",
+        f"Dr {values['party']} c/ {values['authority']}",
+        f"Audience du {values['date']}, décision rendue publique le {values['other_date']}",
+        "",
+    ]
+
+    count = sum(len(line.split()) for line in lines)
+    paragraph = []
+    while count < words:
+        sentence = generator.choice(SENTENCES).format(**{**_values(generator, file), "party": values["party"]})
+        paragraph.append(sentence)
+        count += len(sentence.split())
+        if len(paragraph) >= generator.randint(3, 6):
+            lines.append(" ".join(paragraph))
+            paragraph = []
+    if paragraph:
+        lines.append(" ".join(paragraph))
+
+    lines.append(generator.choice(OUTCOMES).format(sanction=values["sanction"]))
+    return "\n".join(lines)
+
+
+def write_corpus(path: str, documents: int, words: int, seed: int = 0):
+    """Write a synthetic corpus of text documents to a directory.
+
+    Args:
+        path (str): Output directory, created if needed.
+        documents (int): Number of documents.
+        words (int): Approximate number of words per document.
+        seed (int, optional): Seed of the corpus. Defaults to 0.
+
+    Returns:
+        int: Total number of words written.
+    """
+
+    os.makedirs(path, exist_ok=True)
+    total = 0
+    for index in range(documents):
+        content = generate_document(index, words, seed)
+        total += len(content.split())
+        with open(os.path.join(path, f"decision_{index:07d}.txt"), 'w', encoding='utf-8') as f:
+            f.write(content)
+    return total
+
+
+def generate_queries(count: int, documents: int = 1000, seed: int = 0):
+    """Generate synthetic queries matching the vocabulary of the synthetic corpus.
+
+    Args:
+        count (int): Number of queries.
+        documents (int, optional): Number of documents of the corpus, to draw file numbers. Defaults to 1000.
+        seed (int, optional): Seed of the queries. Defaults to 0.
+
+    Returns:
+        list[str]: The queries.
+    """
+
+    generator = random.Random(f"queries-{seed}")
+    return [
+        generator.choice(QUERY_TEMPLATES).format(**_values(generator, 1000 + generator.randrange(max(documents, 1))))
+        for _ in range(count)
+    ]
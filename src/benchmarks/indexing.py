@@ -0,0 +1,178 @@
+import os
+import math
+import time
+import threading
+from benchmarks.corpus import generate_document, write_corpus
+from benchmarks.report import peak_rss_mb, path_size
+
+# Stages of Indexer2.execute_pipeline, timed by wrapping the methods of the indexer.
+# tokenize_chunks is called by build_index and load_chunks, whose times exclude it.
+PIPELINE_STAGES = {
+    "load_index": "load_index",
+    "load_chunks": "load_chunks",
+    "process_docs": "parallel_process_docs",
+    "build_index": "build_index",
+    "tokenize_chunks": "tokenize_chunks",
+    "save_chunks": "save_chunks",
+}
+
+
+def workspace_environment(workdir: str):
+    """Return the environment variables placing every input and output of the pipeline in a directory.
+
+    Config values are read at import, so these must be set before importing the services.
+    """
+
+    index = os.path.join(workdir, "index")
+    return {
+        "DOCUMENT_PATH_INPUT": os.path.join(workdir, "raw"),
+        "DOCUMENT_PATH_OUTPUT": os.path.join(workdir, "processed"),
+        "DOCUMENT_LIMIT": "-1",
+        "INDEX_PATH": os.path.join(index, "faiss_index.index"),
+        "LEXICAL_STORE_PATH": os.path.join(index, "bm25_store.json"),
+        "INDEX_VERSION_PATH": os.path.join(index, "index_version.json"),
+        "RERANKER_TOKENS_PATH": os.path.join(index, "reranker_tokens.npz"),
+        "CHUNKS_PATH": os.path.join(index, "chunks.json"),
+        "CONTEXT_CHUNKS_PATH": os.path.join(index, "context_chunks.json"),
+        "DOCUMENT_CHUNKS_PATH": os.path.join(index, "document_chunks.json"),
+        "UUIDS_CHUNKS_PATH": os.path.join(index, "uuids_chunks.json"),
+        "DOCUMENT_STORE_PATH": os.path.join(index, "doc_store.json"),
+        "DOCUMENT_PROFILES_PATH": os.path.join(index, "document_profiles.json"),
+        "USAGE_REPORT_PATH": os.path.join(index, "usage_report.json"),
+    }
+
+
+def offline_environment(llm_latency_ms: float = 0, embedding_latency_ms: float = 0):
+    """Return the environment variables selecting the offline fake providers (see FakeChatModel and FakeEmbeddings)."""
+
+    return {
+        "EMBEDDING_PROVIDER": "fake",
+        "EMBEDDING_MODEL": "fake",
+        "LLM_CONTEXTUAL_PROVIDER": "fake",
+        "LLM_CONTEXTUAL_MODEL": "fake",
+        "LLM_GENERATIVE_PROVIDER": "fake",
+        "LLM_GENERATIVE_MODEL": "fake",
+        "FAKE_LLM_LATENCY_MS": str(llm_latency_ms),
+        "FAKE_LLM_JITTER_MS": "0",
+        "FAKE_LLM_TOKEN_LATENCY_MS": "0",
+        "FAKE_EMBEDDING_LATENCY_MS": str(embedding_latency_ms),
+        "FAKE_EMBEDDING_JITTER_MS": "0",
+    }
+
+
+_nested = threading.local()  # Time spent in the timed stages called by the running one, per thread
+
+
+def _timed(stages: dict, name: str, func):
+    """Wrap func to add its time to stages[name], minus the time of the timed stages it calls in the same thread."""
+
+    def wrapper(*args, **kwargs):
+        outer = getattr(_nested, "seconds", 0.0)
+        _nested.seconds = 0.0
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stages[name] = stages.get(name, 0.0) + elapsed - _nested.seconds
+            _nested.seconds = outer + elapsed
+    return wrapper
+
+
+def words_per_document(chunks_per_document: int, chunk_size: int, overlap: int, seed: int = 0):
+    """Return the number of words giving about chunks_per_document chunks once split.
+
+    The words to tokens ratio is measured on a sample with the GPT-2 encoding used by the
+    chunker, 1.5 tokens per word if it isn't available.
+    """
+
+    tokens = chunk_size + (chunks_per_document - 1) * max(chunk_size - overlap, 1)
+    try:
+        import tiktoken
+        sample = generate_document(0, 2000, seed)
+        ratio = len(tiktoken.get_encoding("gpt2").encode(sample)) / len(sample.split())
+    except Exception:
+        ratio = 1.5
+    return max(int(tokens / ratio), 1)
+
+
+def benchmark_indexing(chunks: int, chunks_per_document: int = 10, seed: int = 0):
+    """Run Indexer2.execute_pipeline on a synthetic corpus and measure it.
+
+    The workspace and providers must be set in the environment beforehand (see
+    workspace_environment and offline_environment). Peak memory is the one of the whole
+    process, so run one benchmark per process.
+
+    Args:
+        chunks (int): Approximate number of chunks of the corpus.
+        chunks_per_document (int, optional): Approximate number of chunks per document. Defaults to 10.
+        seed (int, optional): Seed of the corpus. Defaults to 0.
+
+    Returns:
+        dict: Corpus size, throughput, peak memory, time per stage (seconds), index size (bytes)
+            and token usage of the run. Stage times don't overlap within a thread: 'build_index'
+            and 'load_chunks' exclude the 'tokenize_chunks' they call. The 'contextualize' stage
+            runs in the processing workers, summed over them, and overlaps 'process_docs'.
+    """
+
+    from config.config import (CHUNK_SIZE, OVERLAP_SIZE, DOCUMENT_PATH_INPUT, PROCESSING_DOC_MAX_WORKERS, CONTEXT_MODE,
+                               EMBEDDING_PROVIDER, EMBEDDING_MODEL, LLM_CONTEXTUAL_PROVIDER, LLM_CONTEXTUAL_MODEL,
+                               INDEX_PATH, LEXICAL_STORE_PATH, INDEX_VERSION_PATH, RERANKER_TOKENS_PATH, DOCUMENT_CHUNKS_PATH,
+                               UUIDS_CHUNKS_PATH, DOCUMENT_STORE_PATH, DOCUMENT_PROFILES_PATH)
+    from services.indexer2 import Indexer2
+
+    documents = max(1, math.ceil(chunks / chunks_per_document))
+    words = words_per_document(chunks_per_document, CHUNK_SIZE, OVERLAP_SIZE, seed)
+
+    start = time.perf_counter()
+    total_words = write_corpus(DOCUMENT_PATH_INPUT, documents, words, seed)
+    corpus_seconds = time.perf_counter() - start
+
+    indexer = Indexer2()
+    stages = {}
+    for name, method in PIPELINE_STAGES.items():
+        setattr(indexer, method, _timed(stages, name, getattr(indexer, method)))
+    indexer.contextualizer.contextualize = _timed(stages, "contextualize", indexer.contextualizer.contextualize)
+
+    start = time.perf_counter()
+    success = indexer.execute_pipeline()
+    seconds = time.perf_counter() - start
+
+    index_files = {
+        "faiss": INDEX_PATH,
+        "bm25": LEXICAL_STORE_PATH,
+        "document_store": DOCUMENT_STORE_PATH,
+        "document_chunks": DOCUMENT_CHUNKS_PATH,
+        "uuids": UUIDS_CHUNKS_PATH,
+        "reranker_tokens": RERANKER_TOKENS_PATH,
+        "document_profiles": DOCUMENT_PROFILES_PATH,
+        "index_version": INDEX_VERSION_PATH,
+    }
+    index_size = {name: path_size(path) for name, path in index_files.items()}
+    index_size["total"] = sum(index_size.values())
+    indexed_chunks = len(indexer.chunk_store)
+    indexer.query_executor.shutdown(wait=False)
+
+    return {
+        "success": success,
+        "chunks_requested": chunks,
+        "documents": documents,
+        "chunks": indexed_chunks,
+        "words": total_words,
+        "seconds": seconds,
+        "documents_per_second": documents / seconds if seconds > 0 else None,
+        "chunks_per_second": indexed_chunks / seconds if seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "corpus_generation_seconds": corpus_seconds,
+        "stages": stages,
+        "index_size_bytes": index_size,
+        "usage": indexer.run_usage.summary() if indexer.run_usage is not None else None,
+        "config": {
+            "chunk_size": CHUNK_SIZE,
+            "overlap_size": OVERLAP_SIZE,
+            "processing_workers": PROCESSING_DOC_MAX_WORKERS,
+            "context_mode": CONTEXT_MODE,
+            "embedding": f"{EMBEDDING_PROVIDER}/{EMBEDDING_MODEL}",
+            "contextual_llm": f"{LLM_CONTEXTUAL_PROVIDER}/{LLM_CONTEXTUAL_MODEL}",
+        },
+    }
@@ -0,0 +1,225 @@
+import json
+import time
+import random
+import threading
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.corpus import generate_queries
+from benchmarks.report import percentiles
+
+
+def load_queries(path: str = None, synthetic: int = 100, documents: int = 1000, seed: int = 0):
+    """Load the queries of a load test.
+
+    A .jsonl file is a recorded trace: one object per line with a 'query' and optionally
+    its arrival time, as an 'offset' in seconds from the start or a 'timestamp' in seconds.
+    Any other file has one query per line. Without file, synthetic queries matching the
+    synthetic corpus are generated.
+
+    Args:
+        path (str, optional): File of queries. Defaults to None.
+        synthetic (int, optional): Number of synthetic queries without file. Defaults to 100.
+        documents (int, optional): Number of documents of the synthetic corpus. Defaults to 1000.
+        seed (int, optional): Seed of the synthetic queries. Defaults to 0.
+
+    Returns:
+        tuple: (list of queries, list of arrival offsets in seconds or None if there are none).
+    """
+
+    if path is None:
+        return generate_queries(synthetic, documents, seed), None
+
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+
+    if not path.lower().endswith(".jsonl"):
+        return lines, None
+
+    entries = [json.loads(line) for line in lines]
+    queries = [entry["query"] for entry in entries]
+    if all("offset" in entry for entry in entries):
+        return queries, [float(entry["offset"]) for entry in entries]
+    if all("timestamp" in entry for entry in entries):
+        first = min(float(entry["timestamp"]) for entry in entries)
+        return queries, [float(entry["timestamp"]) - first for entry in entries]
+    return queries, None
+
+
+class InProcessTarget:
+    """Send the load to an Indexer2 (and LLMSession for generation) of this process.
+
+    Stage durations come from the stage() blocks of the query path (see utils.timing).
+    """
+
+    def __init__(self, generate: bool = False):
+        from config.config import LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL
+        from services.indexer2 import Indexer2
+        from services.llm_session import LLMSession
+        from services.prompt_builder import PromptBuilder
+
+        self.indexer = Indexer2()
+        if not self.indexer.load_index() or not self.indexer.load_chunks():
+            raise RuntimeError("Index can't be loaded, build it first.")
+        self.llm_session = LLMSession(LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL, prompt_builder=PromptBuilder()) if generate else None
+
+    def __call__(self, query: str):
+        from utils.timing import StageTimings
+
+        with StageTimings() as timings:
+            documents = self.indexer.query_index(query)
+            if not documents:
+                raise RuntimeError("No chunk retrieved")
+            if self.llm_session is not None and self.llm_session.get_response_from_documents(query, documents) is None:
+                raise RuntimeError("No answer generated")
+        return timings.stages
+
+
+class HttpTarget:
+    """Send the load to the HTTP API (see api.py).
+
+    Only 'retrieve' and 'generate' stages are measured, from the client: the streamed
+    /answer sends the sources before the first piece of answer.
+    """
+
+    def __init__(self, url: str, generate: bool = False, timeout: float = 60):
+        self.url = url.rstrip("/")
+        self.generate = generate
+        self.timeout = timeout
+
+    def _post(self, path: str, payload: dict):
+        request = urllib.request.Request(self.url + path, data=json.dumps(payload).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def __call__(self, query: str):
+        start = time.perf_counter()
+
+        if not self.generate:
+            with self._post("/retrieve", {"query": query}) as response:
+                results = json.loads(response.read())["results"]
+            if not results:
+                raise RuntimeError("No chunk retrieved")
+            return {"retrieve": time.perf_counter() - start}
+
+        stages, done = {}, False
+        with self._post("/answer", {"query": query, "stream": True}) as response:
+            for line in response:
+                message = json.loads(line)
+                if "sources" in message:
+                    stages["retrieve"] = time.perf_counter() - start
+                    if not message["sources"]:
+                        raise RuntimeError("No chunk retrieved")
+                done = done or message.get("done", False)
+        if not done:
+            raise RuntimeError("Answer stream interrupted")
+        stages["generate"] = time.perf_counter() - start - stages.get("retrieve", 0.0)
+        return stages
+
+
+def _measure(target, query: str, scheduled: float):
+    # Latency counts from the scheduled arrival, so that queueing behind a saturated target is included
+    start = time.perf_counter()
+    try:
+        stages, error = target(query), None
+    except Exception as e:
+        stages, error = {}, f"{type(e).__name__}: {e}"
+    end = time.perf_counter()
+    return {"latency": end - scheduled, "service_time": end - start, "stages": stages, "error": error}
+
+
+def run_load(target, queries: list[str], concurrency: int = 1, rate: float = None, offsets: list[float] = None,
+             requests: int = None, duration: float = None, warmup: int = 0, seed: int = 0):
+    """Run a load test.
+
+    Without rate and offsets, the load is closed-loop: concurrency clients send their next
+    query as soon as they get an answer. With a rate, queries arrive open-loop with
+    exponential inter-arrival times (a Poisson process), and with offsets at their recorded
+    times; concurrency then caps the requests in flight. Queries are sent in order and
+    cycled, until requests are sent or duration is elapsed (all the queries once if neither
+    is set).
+
+    Args:
+        target (callable): Target called with a query, returning its stage durations.
+        queries (list[str]): The queries.
+        concurrency (int, optional): Number of concurrent clients. Defaults to 1.
+        rate (float, optional): Arrival rate in queries per second. Defaults to None.
+        offsets (list[float], optional): Arrival offset of each query in seconds. Defaults to None.
+        requests (int, optional): Number of requests. Defaults to None.
+        duration (float, optional): Duration of the test in seconds. Defaults to None.
+        warmup (int, optional): Number of queries sent one by one before the test and not measured. Defaults to 0.
+        seed (int, optional): Seed of the arrival times. Defaults to 0.
+
+    Returns:
+        tuple: (list of samples, elapsed seconds).
+    """
+
+    for query in queries[:warmup]:
+        _measure(target, query, time.perf_counter())
+
+    if requests is None and duration is None:
+        requests = len(queries)
+    if offsets is not None:
+        requests = len(queries) if requests is None else min(requests, len(queries))
+
+    start = time.perf_counter()
+    deadline = start + duration if duration is not None else None
+    samples = []
+
+    if rate is None and offsets is None:
+        lock = threading.Lock()
+        sent = [0]
+
+        def client():
+            while True:
+                with lock:
+                    index = sent[0]
+                    sent[0] += 1
+                if (requests is not None and index >= requests) or (deadline is not None and time.perf_counter() >= deadline):
+                    return
+                samples.append(_measure(target, queries[index % len(queries)], time.perf_counter()))
+
+        clients = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return samples, time.perf_counter() - start
+
+    generator = random.Random(seed)
+    futures, scheduled, index = [], start, 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while requests is None or index < requests:
+            scheduled = start + offsets[index] if offsets is not None else scheduled + generator.expovariate(rate)
+            if deadline is not None and scheduled >= deadline:
+                break
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+            futures.append(executor.submit(_measure, target, queries[index % len(queries)], scheduled))
+            index += 1
+        samples = [future.result() for future in futures]
+    return samples, time.perf_counter() - start
+
+
+def _distribution(values: list[float]):
+    if not values:
+        return {"count": 0, "mean": None, "min": None, "max": None, **percentiles(values)}
+    return {"count": len(values), "mean": sum(values) / len(values), "min": min(values), "max": max(values), **percentiles(values)}
+
+
+def summarize(samples: list[dict], elapsed: float):
+    """Summarize the samples of a load test: throughput, error rate and latency percentiles (seconds), overall and per stage."""
+
+    succeeded = [sample for sample in samples if sample["error"] is None]
+    stage_names = sorted({name for sample in succeeded for name in sample["stages"]})
+
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(succeeded),
+        "error_rate": (len(samples) - len(succeeded)) / len(samples) if samples else None,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(succeeded) / elapsed if elapsed > 0 else None,
+        "latency": _distribution([sample["latency"] for sample in succeeded]),
+        "service_time": _distribution([sample["service_time"] for sample in succeeded]),
+        "stages": {name: _distribution([sample["stages"][name] for sample in succeeded if name in sample["stages"]]) for name in stage_names},
+        "top_errors": dict(Counter(sample["error"] for sample in samples if sample["error"] is not None).most_common(5)),
+    }
@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+
+def percentiles(values: list[float], points: tuple = (50, 95, 99)):
+    """Return the percentiles of a list of values (nearest rank), None if it is empty."""
+
+    if not values:
+        return {f"p{point}": None for point in points}
+    ordered = sorted(values)
+    return {f"p{point}": ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))] for point in points}
+
+
+def peak_rss_mb():
+    """Return the peak resident memory of the process in MB."""
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, kilobytes elsewhere
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+
+def path_size(path: str):
+    """Return the size in bytes of a file or of all the files of a directory, 0 if it doesn't exist."""
+
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def git_commit():
+    """Return the current git commit of the repository, None outside a git checkout."""
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def environment():
+    """Describe the machine and code a benchmark runs on, to compare reports between commits."""
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_report(report: dict, path: str = None):
+    """Write a report as JSON to a file, or to the standard output if path is None."""
+
+    content = json.dumps(report, indent=2, ensure_ascii=False)
+    if path is None:
+        print(content)
+        return
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import statistics
+
+
+def read_slow_queries(path: str, kind: str = None):
+    """Read a slow query log and its rotated files (see utils.slow_query_log), oldest entries first.
+
+    Args:
+        path (str): Path of the log.
+        kind (str, optional): Only keep the entries of this kind ('query_index' or 'answer'). Defaults to None.
+
+    Returns:
+        list[dict]: The log entries.
+    """
+
+    # Rotated files are path.1 (newest) to path.N (oldest)
+    rotated = []
+    while os.path.exists(f"{path}.{len(rotated) + 1}"):
+        rotated.append(f"{path}.{len(rotated) + 1}")
+    entries = []
+    for file_path in list(reversed(rotated)) + ([path] if os.path.exists(path) else []):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            entries += [json.loads(line) for line in f if line.strip()]
+    return [entry for entry in entries if kind is None or entry["kind"] == kind]
+
+
+def latest_per_query(entries: list[dict]):
+    """Keep the last entry of each logged query, with the number of times it was logged."""
+
+    latest = {}
+    for entry in entries:
+        occurrences = latest[entry["query"]]["occurrences"] + 1 if entry["query"] in latest else 1
+        latest.pop(entry["query"], None)
+        latest[entry["query"]] = {**entry, "occurrences": occurrences}
+    return list(latest.values())
+
+
+def replay_slow_queries(target, entries: list[dict], repeat: int = 3):
+    """Replay logged slow queries and compare their latency with the logged one.
+
+    Args:
+        target (callable): Target called with a query, returning its stage durations
+            in seconds (see benchmarks.load.InProcessTarget).
+        entries (list[dict]): Log entries, one per query to replay.
+        repeat (int, optional): Runs per query, the median is kept. Defaults to 3.
+
+    Returns:
+        list[dict]: Per query, the logged and replayed latency (ms), their ratio, whether
+            it is still above the threshold, and the logged and replayed stage durations (ms).
+    """
+
+    results = []
+    for entry in entries:
+        latencies, runs, error = [], [], None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            try:
+                runs.append(target(entry["query"]))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                break
+            latencies.append(time.perf_counter() - start)
+
+        result = {
+            "query": entry["query"],
+            "kind": entry["kind"],
+            "occurrences": entry.get("occurrences", 1),
+            "logged_index_version": entry.get("index_version"),
+            "logged_ms": entry["latency_ms"],
+            "threshold_ms": entry.get("threshold_ms"),
+            "error": error,
+        }
+        if latencies:
+            replayed = statistics.median(latencies) * 1000
+            stage_names = sorted({name for run in runs for name in run} | set(entry.get("stages_ms", {})))
+            result.update({
+                "replayed_ms": replayed,
+                "speedup": entry["latency_ms"] / replayed if replayed > 0 else None,
+                "still_slow": entry.get("threshold_ms") is not None and replayed >= entry["threshold_ms"],
+                "stages_ms": {
+                    name: {
+                        "logged": entry.get("stages_ms", {}).get(name),
+                        "replayed": statistics.median(run[name] for run in runs if name in run) * 1000 if any(name in run for run in runs) else None,
+                    }
+                    for name in stage_names
+                },
+            })
+        results.append(result)
+    return results
+
+
+def summarize_replay(results: list[dict]):
+    """Summarize a replay: queries faster than logged, still above their threshold, and median speedup."""
+
+    replayed = [result for result in results if result.get("replayed_ms") is not None]
+    speedups = [result["speedup"] for result in replayed if result["speedup"] is not None]
+    return {
+        "queries": len(results),
+        "errors": len(results) - len(replayed),
+        "faster": sum(1 for result in replayed if result["replayed_ms"] < result["logged_ms"]),
+        "still_slow": sum(1 for result in replayed if result["still_slow"]),
+        "median_speedup": statistics.median(speedups) if speedups else None,
+        "logged_ms_total": sum(result["logged_ms"] for result in replayed),
+        "replayed_ms_total": sum(result["replayed_ms"] for result in replayed),
+    }
+
+
+def format_replay(results: list[dict], summary: dict):
+    """Format a replay as a text table, queries still above their threshold starred."""
+
+    header = f"{'':1} {'query':<60} {'logged ms':>10} {'now ms':>10} {'speedup':>8}  slowest stage now"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        query = result["query"] if len(result["query"]) <= 60 else result["query"][:57] + "..."
+        if result.get("replayed_ms") is None:
+            lines.append(f"{'!':1} {query:<60} {result['logged_ms']:>10.1f} {'error':>10} {'':>8}  {result['error']}")
+            continue
+        stages = {name: value["replayed"] for name, value in result["stages_ms"].items() if value["replayed"] is not None}
+        slowest = max(stages, key=stages.get) if stages else ""
+        line = (f"{'*' if result['still_slow'] else '':1} {query:<60} {result['logged_ms']:>10.1f} "
+                f"{result['replayed_ms']:>10.1f} {result['speedup'] or 0:>7.2f}x")
+        lines.append(f"{line}  {slowest} {stages[slowest]:.1f} ms" if slowest else line)
+    median = f"{summary['median_speedup']:.2f}x" if summary["median_speedup"] is not None else "n/a"
+    lines.append(f"{summary['faster']}/{summary['queries']} faster, {summary['still_slow']} still slow, "
+                 f"{summary['errors']} errors, median speedup {median}")
+    return "\n".join(lines)
@@ -11,8 +11,66 @@ OVERLAP_SIZE = int(os.getenv("OVERLAP_SIZE"))
 RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K"))
 # Number of top results to rerank
 RERANK_TOP_K = int(os.getenv("RERANK_TOP_K"))
+# Fusion method for vector and lexical results (rrf or weighted)
+FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf")
+# Rank offset for reciprocal rank fusion
+FUSION_RRF_K = int(os.getenv("FUSION_RRF_K", "60"))
+# Weight of the vector results in fusion (lexical weight is 1 - this value)
+FUSION_VECTOR_WEIGHT = float(os.getenv("FUSION_VECTOR_WEIGHT", "0.5"))
+# Number of fused candidates sent to the reranker (0 to send them all)
+FUSION_TOP_K = int(os.getenv("FUSION_TOP_K", "30"))
+# Minimum fused score, as a ratio of the best one, to be sent to the reranker (0 to disable)
+FUSION_MIN_SCORE_RATIO = float(os.getenv("FUSION_MIN_SCORE_RATIO", "0"))
+# Timeout in seconds of the vector retrieval branch (0 for no timeout)
+RETRIEVAL_VECTOR_TIMEOUT = float(os.getenv("RETRIEVAL_VECTOR_TIMEOUT", "10"))
+# Timeout in seconds of the lexical retrieval branch (0 for no timeout)
+RETRIEVAL_LEXICAL_TIMEOUT = float(os.getenv("RETRIEVAL_LEXICAL_TIMEOUT", "10"))
+# // Workers for query retrieval branches
+QUERY_MAX_WORKERS = int(os.getenv("QUERY_MAX_WORKERS", "4"))
+# Cross-encoder model used for reranking
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Reranker backend (torch or onnx)
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch")
+# Number of pairs scored per reranker forward pass
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "32"))
+# Maximum number of tokens of a (query, passage) pair
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+# Directory of the exported ONNX reranker models, one file per model and quantization
+RERANKER_ONNX_DIR = os.getenv("RERANKER_ONNX_DIR", "data/models")
+# Quantize the exported ONNX reranker model to int8
+RERANKER_ONNX_QUANTIZE = os.getenv("RERANKER_ONNX_QUANTIZE", "yes")
+# Intra-op threads of the ONNX reranker (0 for the runtime default)
+RERANKER_NUM_THREADS = int(os.getenv("RERANKER_NUM_THREADS", "0"))
+# First stage scorer of the reranking cascade (none, cosine or model)
+RERANK_CASCADE_FIRST_STAGE = os.getenv("RERANK_CASCADE_FIRST_STAGE", "none")
+# Small cross-encoder used by the model first stage
+RERANK_CASCADE_FIRST_STAGE_MODEL = os.getenv("RERANK_CASCADE_FIRST_STAGE_MODEL", "cross-encoder/ms-marco-TinyBERT-L-2-v2")
+# Number of first stage candidates sent to the cross-encoder (0 for all)
+RERANK_CASCADE_DEPTH = int(os.getenv("RERANK_CASCADE_DEPTH", "0"))
+# Cross-encoder early stop margin on scores (0 to disable)
+RERANK_CASCADE_STOP_MARGIN = float(os.getenv("RERANK_CASCADE_STOP_MARGIN", "0"))
+# Gather concurrent reranker and query embedding calls into micro-batches (yes or no)
+MICRO_BATCH_ENABLE = os.getenv("MICRO_BATCH_ENABLE", "no")
+# Maximum number of requests in a micro-batch
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "64"))
+# Maximum time to wait for more requests after the first one, in milliseconds
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+# Unload shared models not used for this many seconds (0 to keep them loaded)
+MODEL_IDLE_TIMEOUT = float(os.getenv("MODEL_IDLE_TIMEOUT", "0"))
 # Path to the index file
 INDEX_PATH = os.getenv("INDEX_PATH")
+# Path to the index version file
+INDEX_VERSION_PATH = os.getenv("INDEX_VERSION_PATH", "data/index/index_version.json")
+# Seconds between two checks of the index version by the retrieval service (0 to disable hot reload)
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "10"))
+# Host of the HTTP API
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+# Port of the HTTP API
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# Number of worker processes of the HTTP API
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+# Path to the pre-tokenized reranker passages
+RERANKER_TOKENS_PATH = os.getenv("RERANKER_TOKENS_PATH", "data/index/reranker_tokens.npz")
 # Path to the lexical store
 LEXICAL_STORE_PATH = os.getenv("LEXICAL_STORE_PATH")
 # Path to the documents
@@ -29,17 +87,77 @@ DOCUMENT_CHUNKS_PATH = os.getenv("DOCUMENT_CHUNKS_PATH")
 UUIDS_CHUNKS_PATH = os.getenv("UUIDS_CHUNKS_PATH")
 # Path to the document store
 DOCUMENT_STORE_PATH = os.getenv("DOCUMENT_STORE_PATH")
+# Path to the document profiles (facts and summary of each document)
+DOCUMENT_PROFILES_PATH = os.getenv("DOCUMENT_PROFILES_PATH", "data/index/document_profiles.json")
 # Limit on the number of documents to process
 DOCUMENT_LIMIT = int(os.getenv("DOCUMENT_LIMIT"))
 # // Workers for process doc
 PROCESSING_DOC_MAX_WORKERS = int(os.getenv("PROCESSING_DOC_MAX_WORKERS"))
 
+# Activate query result cache
+QUERY_CACHE_ENABLE = os.getenv("QUERY_CACHE_ENABLE", "yes")
+# Maximum number of cached query results
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024"))
+# Maximum estimated memory of cached query results in bytes
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Lifetime of a cached query result in seconds (0 for no expiration)
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+# Activate semantic answer cache
+SEMANTIC_CACHE_ENABLE = os.getenv("SEMANTIC_CACHE_ENABLE", "no")
+# Minimum cosine similarity between a query and a cached query
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+# Minimum overlap (Jaccard) between retrieved chunks and the chunks of a cached answer
+SEMANTIC_CACHE_MIN_OVERLAP = float(os.getenv("SEMANTIC_CACHE_MIN_OVERLAP", "0.7"))
+# Lifetime of a cached answer in seconds (0 for no expiration)
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+# Maximum number of cached answers
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+
 # Activate mflow logs
 MLFLOW_ENABLE = os.getenv("MLFLOW_ENABLE")
 # mlflow host
 MFFLOW_HOST = os.getenv("MFFLOW_HOST")
 # mlflow port
 MFFLOW_PORT = os.getenv("MFFLOW_PORT")
+# Enable stage duration histograms and counters (Prometheus text format)
+METRICS_ENABLE = str(os.getenv("METRICS_ENABLE", "no"))
+# Upper bounds of the stage duration histogram buckets in seconds
+METRICS_BUCKETS = str(os.getenv("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60"))
+# File where batch jobs write their metrics at the end (empty to skip)
+METRICS_PATH = str(os.getenv("METRICS_PATH", "data/metrics/metrics.prom"))
+# Enable OpenTelemetry spans of the stages
+TRACING_ENABLE = str(os.getenv("TRACING_ENABLE", "no"))
+# Record the tokens and cost of the LLM and embeddings calls
+USAGE_ENABLE = str(os.getenv("USAGE_ENABLE", "yes"))
+# JSON price table per million tokens, keyed by provider/model (empty: no cost)
+USAGE_PRICES_PATH = str(os.getenv("USAGE_PRICES_PATH", ""))
+# Usage of the last indexing run, per document (empty to skip)
+USAGE_REPORT_PATH = str(os.getenv("USAGE_REPORT_PATH", "data/index/usage_report.json"))
+# Enable the profiling of PROFILE_TARGETS (see utils.profiling)
+PROFILE_ENABLE = str(os.getenv("PROFILE_ENABLE", "no"))
+# Profiled calls: execute_pipeline, query_index or stage names
+PROFILE_TARGETS = str(os.getenv("PROFILE_TARGETS", "execute_pipeline,query_index"))
+# Profile every Nth call of a target
+PROFILE_EVERY = int(os.getenv("PROFILE_EVERY", 1))
+# sampling (collapsed stacks of every thread) or cprofile (pstats of the calling thread)
+PROFILE_ENGINE = str(os.getenv("PROFILE_ENGINE", "sampling"))
+# Interval between stack samples in milliseconds
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+# Trace allocations with tracemalloc during profiles
+PROFILE_MEMORY = str(os.getenv("PROFILE_MEMORY", "yes"))
+# Directory of the profiles, one subdirectory per profiled call
+PROFILE_PATH = str(os.getenv("PROFILE_PATH", "data/profiles"))
+# Log the queries slower than the thresholds (see utils.slow_query_log)
+SLOW_QUERY_ENABLE = str(os.getenv("SLOW_QUERY_ENABLE", "yes"))
+# Threshold of query_index in milliseconds
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 1000))
+# Threshold of the answers (retrieval and generation) in milliseconds
+SLOW_ANSWER_THRESHOLD_MS = float(os.getenv("SLOW_ANSWER_THRESHOLD_MS", 10000))
+# JSON lines log of the slow queries, rotated at SLOW_QUERY_MAX_BYTES with SLOW_QUERY_BACKUPS old files
+SLOW_QUERY_PATH = str(os.getenv("SLOW_QUERY_PATH", "data/logs/slow_queries.jsonl"))
+SLOW_QUERY_MAX_BYTES = int(os.getenv("SLOW_QUERY_MAX_BYTES", 10485760))
+SLOW_QUERY_BACKUPS = int(os.getenv("SLOW_QUERY_BACKUPS", 5))
 
 # Provider for embeddings
 EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER")
@@ -48,12 +166,53 @@ EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
 # Dimension of the embeddings
 EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM"))
 
+# Latency distribution of the fake providers (constant, uniform, normal or lognormal)
+FAKE_LATENCY_DISTRIBUTION = os.getenv("FAKE_LATENCY_DISTRIBUTION", "normal")
+# Seed of the fake providers latencies and errors
+FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+# Mean latency of a fake embeddings call in milliseconds
+FAKE_EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "50"))
+# Latency spread of a fake embeddings call in milliseconds
+FAKE_EMBEDDING_JITTER_MS = float(os.getenv("FAKE_EMBEDDING_JITTER_MS", "10"))
+# Probability that a fake embeddings call fails
+FAKE_EMBEDDING_ERROR_RATE = float(os.getenv("FAKE_EMBEDDING_ERROR_RATE", "0"))
+# Mean time to first token of a fake LLM call in milliseconds
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+# Time to first token spread of a fake LLM call in milliseconds
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "100"))
+# Probability that a fake LLM call fails
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+# Generation time per word of the fake LLM in milliseconds
+FAKE_LLM_TOKEN_LATENCY_MS = float(os.getenv("FAKE_LLM_TOKEN_LATENCY_MS", "10"))
+# Number of words of a fake LLM response
+FAKE_LLM_RESPONSE_WORDS = int(os.getenv("FAKE_LLM_RESPONSE_WORDS", "64"))
+# Record/replay of LLM and embeddings calls: off, record or replay
+CASSETTE_MODE = str(os.getenv("CASSETTE_MODE", "off"))
+# File of the recorded calls
+CASSETTE_PATH = str(os.getenv("CASSETTE_PATH", "data/cassettes/cassette.jsonl"))
+# Multiplier of the recorded latencies in replay mode (0 to answer at once)
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+
 # Provider for contextual language model
 LLM_CONTEXTUAL_PROVIDER = os.getenv("LLM_CONTEXTUAL_PROVIDER")
 # Model used for contextual language processing
 LLM_CONTEXTUAL_MODEL = os.getenv("LLM_CONTEXTUAL_MODEL")
 # Context length for the contextual language model
 LLM_CONTEXTUAL_CONTEXT_LENGTH = int(os.getenv("LLM_CONTEXTUAL_CONTEXT_LENGTH"))
+# Contextualization mode: full document, bounded window, summary (facts and summary once per document) or auto (full when the document fits)
+CONTEXT_MODE = os.getenv("CONTEXT_MODE", "auto")
+# Tokens of the contextual context length reserved for the generated context
+CONTEXT_ANSWER_TOKENS = int(os.getenv("CONTEXT_ANSWER_TOKENS", "512"))
+# Tokens of the beginning of the document sent with each chunk in window mode
+CONTEXT_HEADER_TOKENS = int(os.getenv("CONTEXT_HEADER_TOKENS", "512"))
+# Maximum tokens of the document summary in window mode
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "512"))
+# Number of chunks sent before and after each chunk in window mode
+CONTEXT_WINDOW_NEIGHBOURS = int(os.getenv("CONTEXT_WINDOW_NEIGHBOURS", "1"))
+# Chunks with fewer tokens get a template context without model call in summary mode
+CONTEXT_BOILERPLATE_MIN_TOKENS = int(os.getenv("CONTEXT_BOILERPLATE_MIN_TOKENS", "32"))
+# Share of lines found in other documents above which a chunk is boilerplate in summary mode (0 to disable)
+CONTEXT_BOILERPLATE_RATIO = float(os.getenv("CONTEXT_BOILERPLATE_RATIO", "0.8"))
 
 # Provider for generative language model
 LLM_GENERATIVE_PROVIDER = os.getenv("LLM_GENERATIVE_PROVIDER")
@@ -61,6 +220,14 @@ LLM_GENERATIVE_PROVIDER = os.getenv("LLM_GENERATIVE_PROVIDER")
 LLM_GENERATIVE_MODEL = os.getenv("LLM_GENERATIVE_MODEL")
 # Context length for the generative language model
 LLM_GENERATIVE_CONTEXT_LENGTH = int(os.getenv("LLM_GENERATIVE_CONTEXT_LENGTH"))
+# Tiktoken encoding used to count prompt tokens
+PROMPT_TOKENIZER_ENCODING = os.getenv("PROMPT_TOKENIZER_ENCODING", "cl100k_base")
+# Tokens of the generative context length reserved for the answer
+PROMPT_ANSWER_TOKENS = int(os.getenv("PROMPT_ANSWER_TOKENS", "1024"))
+# Maximum tokens of retrieved documents in a prompt (0 to fill the context length)
+PROMPT_MAX_DOCUMENT_TOKENS = int(os.getenv("PROMPT_MAX_DOCUMENT_TOKENS", "0"))
+# Minimum length in characters of the text shared by two chunks to remove it from the prompt
+PROMPT_MIN_OVERLAP_CHARS = int(os.getenv("PROMPT_MIN_OVERLAP_CHARS", "32"))
 
 # API key for OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
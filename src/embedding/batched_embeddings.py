@@ -0,0 +1,42 @@
+from langchain_core.embeddings import Embeddings
+from config.config import MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS
+from utils.batching import MicroBatcher
+
+
+class BatchedEmbeddings(Embeddings):
+    """A LangChain embeddings wrapper that micro-batches concurrent query embeddings.
+
+    Queries embedded at the same time by different threads (e.g. several chatbot
+    sessions) are gathered for a few milliseconds and sent to the wrapped model in a
+    single embed_documents call. Document embeddings are already batched by the caller
+    and go straight to the wrapped model.
+
+    Attributes:
+        inner (Embeddings): The wrapped embeddings model.
+        batcher (MicroBatcher): Gathers concurrent embed_query calls.
+    """
+
+    def __init__(self, inner: Embeddings, max_batch_size: int = MICRO_BATCH_MAX_SIZE, max_wait_ms: float = MICRO_BATCH_MAX_WAIT_MS):
+        self.inner = inner
+        self.batcher = MicroBatcher(self._embed_batch, max_batch_size, max_wait_ms, "embeddings-batcher")
+
+    def _embed_batch(self, queries: list[str]):
+        # Identical concurrent queries are embedded once
+        unique = list(dict.fromkeys(queries))
+        vectors = dict(zip(unique, self.inner.embed_documents(unique)))
+        return [vectors[query] for query in queries]
+
+    def embed_query(self, text: str):
+        """Embed a query, batched with the queries of other threads."""
+
+        return self.batcher.submit(text)
+
+    def embed_documents(self, texts: list[str]):
+        """Embed documents with the wrapped model."""
+
+        return self.inner.embed_documents(texts)
+
+    def close(self):
+        """Stop the micro-batcher thread."""
+
+        self.batcher.close()
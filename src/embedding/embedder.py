@@ -3,6 +3,8 @@ import numpy as np
 # from transformers import AutoTokenizer, AutoModel, AutoModelForCausalLM
 from huggingface_hub import login
 from utils.logger import logger
+from utils.cassette import get_cassette
+from services.usage import record_embedding_usage
 from config.config import HUGGINGFACE_HUB_TOKEN, OPENAI_API_KEY, EMBEDDING_MODEL
 
 class Embedder:
@@ -26,6 +28,9 @@ class Embedder:
 
         openai.api_key = OPENAI_API_KEY
 
+        # Offline embeddings for load tests, created on first use
+        self.fake_embeddings = None
+
         # legal-bert-base-uncased
         # self.legalbert_tokenizer = AutoTokenizer.from_pretrained('nlpaueb/legal-bert-base-uncased')
         # self.legalbert_model = AutoModel.from_pretrained('nlpaueb/legal-bert-base-uncased')
@@ -63,11 +68,25 @@ class Embedder:
         
         try:
             if model_type == "openai":
-                response = openai.embeddings.create(
-                    model=EMBEDDING_MODEL,
-                    input=text
-                )
-                embeddings = np.array(response.data[0].embedding)
+                def create_embedding():
+                    response = openai.embeddings.create(
+                        model=EMBEDDING_MODEL,
+                        input=text
+                    )
+                    return response.data[0].embedding
+
+                cassette = get_cassette()
+                if cassette is not None:
+                    embeddings = np.array(cassette.call("embed_query", "openai", EMBEDDING_MODEL, text, create_embedding))
+                else:
+                    embeddings = np.array(create_embedding())
+                record_embedding_usage("embed_query", "openai", EMBEDDING_MODEL, [text])
+
+            elif model_type == "fake":
+                if self.fake_embeddings is None:
+                    from embedding.fake_embeddings import FakeEmbeddings
+                    self.fake_embeddings = FakeEmbeddings()
+                embeddings = np.array(self.fake_embeddings.embed_query(text))
             
             # elif model_type == "legalbert":
             #     inputs = self.legalbert_tokenizer(text, return_tensors='pt', truncation=True, max_length=512)
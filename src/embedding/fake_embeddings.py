@@ -0,0 +1,71 @@
+import re
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config.config import EMBEDDING_DIM, FAKE_EMBEDDING_LATENCY_MS, FAKE_EMBEDDING_JITTER_MS, FAKE_EMBEDDING_ERROR_RATE, FAKE_LATENCY_DISTRIBUTION, FAKE_SEED
+from utils.simulation import CallSimulator
+
+
+def _feature(token: str):
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value >> 1, 1.0 if value & 1 else -1.0
+
+
+def hash_embedding(text: str, dim: int = EMBEDDING_DIM):
+    """Build a deterministic embedding of a text by feature hashing.
+
+    Each word and word bigram is hashed to a signed dimension, so texts sharing words get
+    close vectors and the same text always gets the same vector, in any process.
+
+    Args:
+        text (str): The text to embed.
+        dim (int, optional): Dimension of the embedding. Defaults to EMBEDDING_DIM.
+
+    Returns:
+        list[float]: The L2-normalized embedding.
+    """
+
+    vector = np.zeros(dim, dtype="float32")
+    words = re.findall(r"\w+", text.lower())
+    for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        index, sign = _feature(token)
+        vector[index % dim] += sign
+
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+
+class FakeEmbeddings(Embeddings):
+    """An offline embeddings model for load tests and CI.
+
+    Vectors come from hash_embedding and every call waits for a simulated latency and
+    may fail with a simulated error (see utils.simulation.CallSimulator).
+
+    Attributes:
+        model (str): Name of the model, only informative.
+        dim (int): Dimension of the embeddings.
+        simulator (CallSimulator): The simulated latency and errors of a call.
+    """
+
+    def __init__(self, model: str = "fake", dim: int = EMBEDDING_DIM, latency_ms: float = FAKE_EMBEDDING_LATENCY_MS,
+                 jitter_ms: float = FAKE_EMBEDDING_JITTER_MS, error_rate: float = FAKE_EMBEDDING_ERROR_RATE,
+                 distribution: str = FAKE_LATENCY_DISTRIBUTION, seed: int = FAKE_SEED):
+        self.model = model
+        self.dim = dim
+        self.simulator = CallSimulator("embeddings", latency_ms, jitter_ms, distribution, error_rate, seed)
+
+    def embed_documents(self, texts: list[str]):
+        """Embed documents, with the latency of one call."""
+
+        self.simulator.call()
+        return [hash_embedding(text, self.dim) for text in texts]
+
+    def embed_query(self, text: str):
+        """Embed a query, with the latency of one call."""
+
+        self.simulator.call()
+        return hash_embedding(text, self.dim)
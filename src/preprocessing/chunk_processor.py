@@ -1,5 +1,6 @@
 from langchain.text_splitter import TokenTextSplitter
 from transformers import GPT2TokenizerFast
+from utils.timing import stage
 from utils.logger import logger
 
 def chunk_text(text: str, chunk_size: int, overlap: int):
@@ -30,6 +31,7 @@ def chunk_text(text: str, chunk_size: int, overlap: int):
         logger.error(f"An error occured during split text: {e}")
         return []
 
+@stage("chunking")
 def chunk_text_gpt2(text: str, chunk_size: int, overlap: int):
     """Split text into chunks using GPT-2 tokenizer and token-based text splitter.
 
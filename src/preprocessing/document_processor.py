@@ -3,6 +3,7 @@ import fitz
 import PyPDF2
 import docx
 import win32com.client as win32
+from utils.timing import stage
 from utils.logger import logger
 
 def load_document_PyPDF2(file_path: str):
@@ -197,6 +198,7 @@ def list_files_in_directory(dir_path: str, complete=False):
         logger.error(f"An error occured during list files in directory {dir_path}: {e}")
         return []
 
+@stage("load_documents")
 def load_documents(dir_path: str, limit: int = -1):
     """Load and process documents from a directory.
 
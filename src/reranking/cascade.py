@@ -0,0 +1,146 @@
+import numpy as np
+from config.config import RERANK_TOP_K, RERANK_CASCADE_FIRST_STAGE, RERANK_CASCADE_FIRST_STAGE_MODEL, RERANK_CASCADE_DEPTH, RERANK_CASCADE_STOP_MARGIN
+from reranking.reranker import Reranker, shared_reranker
+from utils.timing import record_count
+from utils.logger import logger
+
+
+class CascadeReranker:
+    """A multi-stage reranker: a cheap scorer prunes candidates before the cross-encoder.
+
+    The first stage orders the candidates with one of:
+        - 'none': keep the order they come in (e.g. the fused retrieval order),
+        - 'cosine': cosine similarity between the query embedding and the stored chunk embeddings,
+        - 'model': a small cross-encoder (RERANK_CASCADE_FIRST_STAGE_MODEL).
+    Only the first `depth` candidates reach the expensive cross-encoder, which scores them
+    batch by batch in first-stage order and stops early once a batch brings nothing that
+    comes within `stop_margin` of the current top_k scores.
+
+    Without an explicit reranker, both cross-encoders are the shared models of the
+    model registry, fetched at use time.
+
+    Attributes:
+        reranker (Reranker): The expensive cross-encoder.
+        first_stage (str): The first-stage scorer ('none', 'cosine' or 'model').
+        first_stage_model (str): The small cross-encoder model of the 'model' first stage.
+        first_stage_reranker (Reranker): The small cross-encoder of the 'model' first stage.
+        depth (int): Number of candidates sent to the cross-encoder, 0 for all.
+        stop_margin (float): Early stop margin on cross-encoder scores, 0 to disable.
+    """
+
+    def __init__(self, reranker: Reranker = None, first_stage: str = RERANK_CASCADE_FIRST_STAGE, depth: int = RERANK_CASCADE_DEPTH,
+                 stop_margin: float = RERANK_CASCADE_STOP_MARGIN, first_stage_model: str = RERANK_CASCADE_FIRST_STAGE_MODEL):
+        self._reranker = reranker
+        self.first_stage = first_stage
+        self.first_stage_model = first_stage_model
+        self.depth = depth
+        self.stop_margin = stop_margin
+
+        if self.first_stage not in ["none", "cosine", "model"]:
+            raise Exception(f"Invalid first stage scorer: {self.first_stage}")
+
+    @property
+    def reranker(self):
+        return self._reranker if self._reranker is not None else shared_reranker()
+
+    @property
+    def first_stage_reranker(self):
+        if self.first_stage != "model":
+            return None
+        return shared_reranker(self.first_stage_model)
+
+    def first_stage_scores(self, query: str, results: list[str], query_embedding=None, embeddings: np.ndarray = None, found: np.ndarray = None):
+        """Score candidates with the cheap first-stage scorer.
+
+        Args:
+            query (str): The search query.
+            results (list[str]): The candidate passages.
+            query_embedding (optional): Query embedding, for the 'cosine' stage.
+            embeddings (np.ndarray, optional): Stored embedding of each candidate, for the 'cosine' stage.
+            found (np.ndarray, optional): Mask of the candidates that have a stored embedding.
+
+        Returns:
+            np.ndarray or None: One score per candidate (higher is better), or None to keep
+                the input order.
+        """
+
+        if self.first_stage == "model":
+            scores = np.zeros(len(results), dtype="float32")
+            for item in self.first_stage_reranker.rerank_results(query, results, None):
+                scores[item["corpus_id"]] = item["score"]
+            return scores
+
+        if self.first_stage == "cosine" and query_embedding is not None and embeddings is not None:
+            query_vector = np.array(query_embedding, dtype="float32")
+            query_vector /= np.linalg.norm(query_vector) or 1.0
+            norms = np.linalg.norm(embeddings, axis=1)
+            norms[norms == 0] = 1.0
+            scores = embeddings @ query_vector / norms
+            if found is not None:
+                scores[~found] = -1.0  # Candidates without embedding go last, in input order
+            return scores
+
+        return None
+
+    def rerank_results(self, query: str, results: list[str], top_k: int = RERANK_TOP_K, passages_ids: list = None,
+                       query_embedding=None, embeddings: np.ndarray = None, found: np.ndarray = None):
+        """Rerank candidates through the cascade.
+
+        Args:
+            query (str): The search query.
+            results (list[str]): The candidate passages, in retrieval order.
+            top_k (int, optional): Number of results to return. Defaults to RERANK_TOP_K.
+            passages_ids (list, optional): Pre-tokenized passages for the cross-encoder.
+            query_embedding (optional): Query embedding, for the 'cosine' stage.
+            embeddings (np.ndarray, optional): Stored embedding of each candidate, for the 'cosine' stage.
+            found (np.ndarray, optional): Mask of the candidates that have a stored embedding.
+
+        Returns:
+            list[dict]: Dicts with 'corpus_id' (index in results), 'score' (cross-encoder) and
+                'first_stage_score' keys, sorted by decreasing score.
+                Empty list if an error occurs during reranking.
+        """
+
+        try:
+            first_scores = self.first_stage_scores(query, results, query_embedding, embeddings, found)
+            if first_scores is None:
+                order = list(range(len(results)))
+            else:
+                order = sorted(range(len(results)), key=lambda i: first_scores[i], reverse=True)
+            if self.depth > 0:
+                order = order[:self.depth]
+
+            reranker = self.reranker
+            batch_size = len(order) if self.stop_margin <= 0 else reranker.batch_size
+            scored = []
+            for start in range(0, len(order), max(batch_size, 1)):
+                batch = order[start:start + batch_size]
+                batch_ids = [passages_ids[i] for i in batch] if passages_ids is not None else None
+                ranked = reranker.rerank_results(query, [results[i] for i in batch], None, batch_ids)
+                batch_scored = [(batch[item["corpus_id"]], item["score"]) for item in ranked]
+                scored.extend(batch_scored)
+
+                # Stop when the last batch can't compete with the current top_k
+                if self.stop_margin > 0 and top_k and len(scored) >= top_k and batch_scored and start + batch_size < len(order):
+                    kth_score = sorted((score for _, score in scored), reverse=True)[top_k - 1]
+                    if max(score for _, score in batch_scored) < kth_score - self.stop_margin:
+                        logger.info(f"Cascade stopped after {len(scored)} of {len(order)} candidates")
+                        break
+
+            record_count("cross_encoder_candidates", len(scored))
+            scored.sort(key=lambda item: item[1], reverse=True)
+            if top_k:
+                scored = scored[:top_k]
+
+            logger.info(f"Cascade reranked {len(scored)} of {len(results)} candidates with {self.first_stage} first stage")
+            return [
+                {
+                    "corpus_id": corpus_id,
+                    "score": float(score),
+                    "first_stage_score": float(first_scores[corpus_id]) if first_scores is not None else None,
+                }
+                for corpus_id, score in scored
+            ]
+        except Exception as e:
+            logger.error(f"An error has occurred while cascade reranking: {e}")
+            return []
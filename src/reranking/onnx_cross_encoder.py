@@ -0,0 +1,167 @@
+import os
+import re
+import numpy as np
+import onnxruntime as ort
+from transformers import AutoTokenizer
+from config.config import RERANKER_MODEL, RERANKER_BATCH_SIZE, RERANKER_MAX_LENGTH, RERANKER_ONNX_DIR, RERANKER_ONNX_QUANTIZE, RERANKER_NUM_THREADS
+from utils.logger import logger
+
+
+def onnx_model_path(model_name: str, quantize: bool = True, directory: str = RERANKER_ONNX_DIR):
+    """Return the path of the ONNX export of a model: <directory>/<model slug>[.int8].onnx.
+
+    Args:
+        model_name (str): Name or path of the Hugging Face model.
+        quantize (bool, optional): Whether the export is int8-quantized. Defaults to True.
+        directory (str, optional): Directory of the exports. Defaults to RERANKER_ONNX_DIR.
+
+    Returns:
+        str: The path of the export.
+    """
+
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "--", model_name.strip("/"))
+    return os.path.join(directory, f"{slug}{'.int8' if quantize else ''}.onnx")
+
+
+def export_onnx_model(model_name: str, onnx_path: str, quantize: bool = True):
+    """Export a Hugging Face cross-encoder to ONNX, optionally int8 dynamic-quantized.
+
+    Args:
+        model_name (str): Name or path of the Hugging Face model.
+        onnx_path (str): Path of the ONNX file to write.
+        quantize (bool, optional): If True, the weights of the exported model are
+            quantized to int8 and the quantized model is written to onnx_path. Defaults to True.
+
+    Returns:
+        str: The path of the written model.
+    """
+
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+
+    dummy = tokenizer(["query"], ["passage"], return_tensors="pt")
+    input_names = [name for name in ["input_ids", "attention_mask", "token_type_ids"] if name in dummy]
+    export_path = f"{onnx_path}.fp32.onnx" if quantize else onnx_path
+
+    torch.onnx.export(
+        model,
+        tuple(dummy[name] for name in input_names),
+        export_path,
+        input_names=input_names,
+        output_names=["logits"],
+        dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in input_names}, "logits": {0: "batch"}},
+        opset_version=14,
+    )
+    logger.info(f"Cross-encoder {model_name} exported to {export_path}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantize_dynamic(export_path, onnx_path, weight_type=QuantType.QInt8)
+        os.remove(export_path)
+        logger.info(f"Cross-encoder quantized to int8 in {onnx_path}")
+
+    return onnx_path
+
+
+class OnnxCrossEncoder:
+    """A cross-encoder running an exported ONNX model with ONNX Runtime on CPU.
+
+    The model is exported (and quantized) on first use if the ONNX file doesn't exist.
+    By default the file is named after the model and quantization (see onnx_model_path),
+    so an export is never reused for another model or quantization.
+    rank() returns the same format as sentence-transformers CrossEncoder.rank, with
+    sigmoid scores as for single-label models.
+
+    Attributes:
+        model_name (str): Name of the Hugging Face model.
+        onnx_path (str): Path of the ONNX model.
+        batch_size (int): Number of pairs scored per inference call.
+        max_length (int): Maximum number of tokens of a (query, passage) pair.
+        tokenizer: The Hugging Face tokenizer of the model.
+        session (ort.InferenceSession): The ONNX Runtime session.
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL, onnx_path: str = None, quantize: bool = RERANKER_ONNX_QUANTIZE.lower() == "yes",
+                 batch_size: int = RERANKER_BATCH_SIZE, max_length: int = RERANKER_MAX_LENGTH, num_threads: int = RERANKER_NUM_THREADS):
+        self.model_name = model_name
+        self.onnx_path = onnx_path or onnx_model_path(model_name, quantize)
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        if not os.path.exists(self.onnx_path):
+            export_onnx_model(self.model_name, self.onnx_path, quantize)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(self.onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+        logger.info(f"OnnxCrossEncoder: model = {self.model_name}, onnx_path = {self.onnx_path}, batch_size = {self.batch_size}, max_length = {self.max_length}")
+
+    def run(self, features: dict):
+        """Run the model on tokenized pairs and return one sigmoid score per pair."""
+
+        logits = self.session.run(["logits"], {name: features[name].astype(np.int64) for name in self.input_names})[0]
+        return 1 / (1 + np.exp(-logits[:, 0]))
+
+    def predict(self, pairs: list, batch_size: int = None):
+        """Score (query, passage) pairs.
+
+        Args:
+            pairs (list): (query, passage) pairs to score.
+            batch_size (int, optional): Pairs per inference call. Defaults to self.batch_size.
+
+        Returns:
+            np.ndarray: One relevance score per pair.
+        """
+
+        batch_size = batch_size or self.batch_size
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            features = self.tokenizer(
+                [query for query, _ in batch],
+                [passage for _, passage in batch],
+                padding=True,
+                truncation="longest_first",
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            scores.append(self.run(features))
+
+        return np.concatenate(scores) if scores else np.array([])
+
+    def rank(self, query: str, documents: list[str], top_k: int = None, batch_size: int = None, return_documents: bool = False):
+        """Rank passages by relevance, in the CrossEncoder.rank format.
+
+        Args:
+            query (str): The search query.
+            documents (list[str]): The passages to rank.
+            top_k (int, optional): Number of results to return, all if None.
+            batch_size (int, optional): Pairs per inference call. Defaults to self.batch_size.
+            return_documents (bool, optional): If True, adds the passage as 'text'. Defaults to False.
+
+        Returns:
+            list[dict]: Dicts with 'corpus_id' and 'score' keys, sorted by decreasing score.
+        """
+
+        scores = self.predict([(query, document) for document in documents], batch_size)
+        results = []
+        for corpus_id, score in enumerate(scores):
+            result = {"corpus_id": corpus_id, "score": float(score)}
+            if return_documents:
+                result["text"] = documents[corpus_id]
+            results.append(result)
+
+        results.sort(key=lambda result: result["score"], reverse=True)
+        return results[:top_k] if top_k else results
@@ -1,22 +1,197 @@
+import numpy as np
 from sentence_transformers import CrossEncoder
-from config.config import RERANK_TOP_K
+from config.config import RERANK_TOP_K, RERANKER_MODEL, RERANKER_BACKEND, RERANKER_BATCH_SIZE, RERANKER_MAX_LENGTH, RERANKER_ONNX_QUANTIZE, MICRO_BATCH_ENABLE, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS
+from utils.batching import MicroBatcher
+from utils.model_registry import registry
 from utils.logger import logger
 
 class Reranker:
     """A class for reranking search results using a cross-encoder model.
 
-    This class provides functionality to rerank a list of search results based on their 
+    This class provides functionality to rerank a list of search results based on their
     relevance to a query using a cross-encoder model from sentence-transformers. It uses
     the 'ms-marco-MiniLM-L-6-v2' model which is specifically trained for passage reranking.
 
+    Two backends are available: 'torch' runs the sentence-transformers CrossEncoder and
+    'onnx' runs an exported, optionally int8-quantized, ONNX Runtime model on CPU.
+
+    Passages can be tokenized once at indexing time (tokenize_passages). Reranking
+    pre-tokenized passages only tokenizes the query and concatenates the stored IDs.
+
+    With micro-batching, concurrent rerank requests are gathered for a few milliseconds
+    and their pairs scored together (see utils.batching.MicroBatcher).
+
     Attributes:
-        cross_encoder (CrossEncoder): The cross-encoder model used for reranking.
+        backend (str): The backend used for inference ('torch' or 'onnx').
+        model_name (str): Name of the cross-encoder model.
+        batch_size (int): Number of pairs scored per forward pass.
+        max_length (int): Maximum number of tokens of a (query, passage) pair.
+        onnx_path (str): ONNX export of the model, one per model (None with the torch backend).
+        cross_encoder (CrossEncoder or OnnxCrossEncoder): The cross-encoder model used for reranking.
+        tokenizer: The tokenizer of the cross-encoder.
+        special_tokens (int): Number of special tokens the tokenizer adds to a (query, passage) pair.
+        uses_token_types (bool): Whether the model takes token_type_ids (not RoBERTa or DistilBERT-style models).
+        tokens_signature (str): Identifies the tokenizer and truncation of pre-tokenized passages.
+        batcher (MicroBatcher): Gathers concurrent requests, None if micro-batching is disabled.
     """
 
-    def __init__(self):
-        self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+    def __init__(self, backend: str = RERANKER_BACKEND, model_name: str = RERANKER_MODEL,
+                 batch_size: int = RERANKER_BATCH_SIZE, max_length: int = RERANKER_MAX_LENGTH,
+                 micro_batching: bool = MICRO_BATCH_ENABLE.lower() == "yes", onnx_path: str = None):
+        self.backend = backend
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.onnx_path = None
+
+        if self.backend == "torch":
+            self.cross_encoder = CrossEncoder(model_name, max_length=max_length)
+        elif self.backend == "onnx":
+            from reranking.onnx_cross_encoder import OnnxCrossEncoder, onnx_model_path
+            # Each model has its own export, e.g. the first stage and final cross-encoders of the cascade
+            self.onnx_path = onnx_path or onnx_model_path(model_name, RERANKER_ONNX_QUANTIZE.lower() == "yes")
+            self.cross_encoder = OnnxCrossEncoder(model_name, self.onnx_path, batch_size=batch_size, max_length=max_length)
+        else:
+            raise Exception(f"Invalid reranker backend: {self.backend}")
+
+        self.tokenizer = self.cross_encoder.tokenizer
+        self.special_tokens = self.tokenizer.num_special_tokens_to_add(pair=True)
+        if self.backend == "onnx":
+            self.uses_token_types = "token_type_ids" in self.cross_encoder.input_names
+        else:
+            self.uses_token_types = "token_type_ids" in self.tokenizer.model_input_names
+        self.tokens_signature = f"{self.model_name}:{self.max_length}"
+
+        self.batcher = None
+        if micro_batching:
+            self.batcher = MicroBatcher(self._score_requests, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS, "reranker-batcher")
+
+    def tokenize_passages(self, passages: list[str]):
+        """Tokenize passages for later reranking, without special tokens.
+
+        Passages are truncated so that they fit in max_length with the special tokens
+        and at least one query token.
+
+        Args:
+            passages (list[str]): The passages to tokenize.
+
+        Returns:
+            list[list[int]]: The token IDs of each passage.
+        """
+
+        return self.tokenizer(
+            passages,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self.max_length - self.special_tokens - 1,
+        )["input_ids"]
+
+    def _build_features(self, pairs_ids: list):
+        """Build padded model inputs from (query IDs, passage IDs) pairs."""
+
+        input_ids, token_type_ids = [], []
+        for query_ids, passage_ids in pairs_ids:
+            passage_ids = list(passage_ids[:self.max_length - len(query_ids) - self.special_tokens])
+            input_ids.append(self.tokenizer.build_inputs_with_special_tokens(query_ids, passage_ids))
+            if self.uses_token_types:
+                token_type_ids.append(self.tokenizer.create_token_type_ids_from_sequences(query_ids, passage_ids))
+
+        width = max(len(ids) for ids in input_ids)
+        features = {
+            "input_ids": np.full((len(input_ids), width), self.tokenizer.pad_token_id, dtype=np.int64),
+            "attention_mask": np.zeros((len(input_ids), width), dtype=np.int64),
+        }
+        for row, ids in enumerate(input_ids):
+            features["input_ids"][row, :len(ids)] = ids
+            features["attention_mask"][row, :len(ids)] = 1
+
+        # Only for models that take them, e.g. DistilBERT rejects token_type_ids
+        if self.uses_token_types:
+            features["token_type_ids"] = np.zeros((len(input_ids), width), dtype=np.int64)
+            for row, types in enumerate(token_type_ids):
+                features["token_type_ids"][row, :len(types)] = types
+
+        return features
+
+    def _score_features(self, features: dict):
+        """Return one sigmoid relevance score per row of model inputs."""
+
+        if self.backend == "onnx":
+            return self.cross_encoder.run(features)
+
+        import torch
+
+        model = self.cross_encoder.model
+        with torch.no_grad():
+            logits = model(**{name: torch.from_numpy(value).to(model.device) for name, value in features.items()}).logits
+        return torch.sigmoid(logits[:, 0]).cpu().numpy()
+
+    def _score_pairs_now(self, queries: list[str], passages: list[str], passages_ids: list = None):
+        """Score (query, passage) pairs in forward passes of batch_size pairs."""
+
+        if not passages:
+            return np.array([])
+
+        if passages_ids is not None and len(passages_ids) == len(passages) and all(ids is not None for ids in passages_ids):
+            # Pre-tokenized passages: only tokenize each distinct query
+            query_ids = {
+                query: self.tokenizer(query, add_special_tokens=False, truncation=True, max_length=self.max_length - self.special_tokens - 1)["input_ids"]
+                for query in set(queries)
+            }
+            pairs_ids = [(query_ids[query], ids) for query, ids in zip(queries, passages_ids)]
+            scores = [
+                self._score_features(self._build_features(pairs_ids[start:start + self.batch_size]))
+                for start in range(0, len(pairs_ids), self.batch_size)
+            ]
+            return np.concatenate(scores)
+
+        return np.asarray(self.cross_encoder.predict(list(zip(queries, passages)), batch_size=self.batch_size))
+
+    def _score_requests(self, requests: list):
+        """Score the pairs of several requests together and split the scores back."""
+
+        queries, passages, passages_ids = [], [], []
+        all_tokenized = True
+        for request_queries, request_passages, request_ids in requests:
+            queries.extend(request_queries)
+            passages.extend(request_passages)
+            if request_ids is None or any(ids is None for ids in request_ids):
+                all_tokenized = False
+            else:
+                passages_ids.extend(request_ids)
+
+        scores = self._score_pairs_now(queries, passages, passages_ids if all_tokenized else None)
+
+        results, start = [], 0
+        for request_queries, _, _ in requests:
+            results.append(scores[start:start + len(request_queries)])
+            start += len(request_queries)
+        return results
+
+    def score_pairs(self, queries: list[str], passages: list[str], passages_ids: list = None):
+        """Score (query, passage) pairs, through the micro-batcher if it is enabled.
 
-    def rerank_results(self, query: str, results: list[str], top_k: int = RERANK_TOP_K):
+        Args:
+            queries (list[str]): The query of each pair.
+            passages (list[str]): The passage of each pair.
+            passages_ids (list, optional): Pre-tokenized passages (see tokenize_passages). When
+                every passage has its token IDs, passages are not tokenized again.
+
+        Returns:
+            np.ndarray: One sigmoid relevance score per pair.
+        """
+
+        if self.batcher is not None:
+            return self.batcher.submit((queries, passages, passages_ids))
+        return self._score_pairs_now(queries, passages, passages_ids)
+
+    def close(self):
+        """Stop the micro-batcher thread, if any."""
+
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def rerank_results(self, query: str, results: list[str], top_k: int = RERANK_TOP_K, passages_ids: list = None):
         """Rerank a list of search results based on their relevance to a query.
 
         This method uses the cross-encoder model to rerank search results by computing
@@ -27,22 +202,96 @@ class Reranker:
             query (str): The search query to compare results against.
             results (list[str]): List of text results to rerank.
             top_k (int, optional): Number of top results to return. Defaults to RERANK_TOP_K.
+            passages_ids (list, optional): Pre-tokenized results (see tokenize_passages). When
+                every result has its token IDs, results are not tokenized again.
 
         Returns:
-            list[str]: The top_k most relevant results, reranked by relevance score.
+            list[dict]: The top_k most relevant results as dicts with 'corpus_id' and 'score' keys,
+            sorted by relevance score.
             Empty list if an error occurs during reranking.
         """
-        
+
         try:
-            reranked = self.cross_encoder.rank(
-                query, 
-                results, 
-                top_k=top_k
-            )
-            
+            scores = self.score_pairs([query] * len(results), results, passages_ids)
+            reranked = [{"corpus_id": corpus_id, "score": float(score)} for corpus_id, score in enumerate(scores)]
+            reranked.sort(key=lambda item: item["score"], reverse=True)
+            if top_k:
+                reranked = reranked[:top_k]
+
             logger.info(f"Reranking successfully")
             return reranked
         except Exception as e:
             logger.error(f"An error has occurred while reranking: {e}")
             return []
-    
\ No newline at end of file
+
+
+def shared_reranker(model_name: str = RERANKER_MODEL, backend: str = RERANKER_BACKEND):
+    """Return the Reranker of a model shared by the whole process.
+
+    Args:
+        model_name (str, optional): Name of the cross-encoder model. Defaults to RERANKER_MODEL.
+        backend (str, optional): The backend used for inference. Defaults to RERANKER_BACKEND.
+
+    Returns:
+        Reranker: The shared reranker, loaded on first use.
+    """
+
+    return registry.get("reranker", backend, model_name, lambda: Reranker(backend, model_name))
+
+
+def ranking_agreement(reference: list[dict], candidate: list[dict], top_k: int = RERANK_TOP_K):
+    """Measure how well two rankings in the rank() format agree.
+
+    Args:
+        reference (list[dict]): Full ranking of the reference backend.
+        candidate (list[dict]): Full ranking of the candidate backend, over the same passages.
+        top_k (int, optional): Depth of the top-k overlap. Defaults to RERANK_TOP_K.
+
+    Returns:
+        dict: 'top_k_overlap' (share of the reference top_k found in the candidate top_k),
+            'top_1_match' and 'spearman' (rank correlation over all passages).
+    """
+
+    reference_ids = [item["corpus_id"] for item in reference]
+    candidate_ids = [item["corpus_id"] for item in candidate]
+    size = len(reference_ids)
+    if size == 0:
+        return {"top_k_overlap": 1.0, "top_1_match": True, "spearman": 1.0}
+
+    depth = min(top_k, size)
+    overlap = len(set(reference_ids[:depth]) & set(candidate_ids[:depth])) / depth
+
+    candidate_rank = {corpus_id: rank for rank, corpus_id in enumerate(candidate_ids)}
+    squared = sum((rank - candidate_rank.get(corpus_id, size)) ** 2 for rank, corpus_id in enumerate(reference_ids))
+    spearman = 1 - 6 * squared / (size * (size ** 2 - 1)) if size > 1 else 1.0
+
+    return {"top_k_overlap": overlap, "top_1_match": reference_ids[0] == candidate_ids[0], "spearman": spearman}
+
+
+def check_parity(reference: Reranker, candidate: Reranker, queries: list[tuple], top_k: int = RERANK_TOP_K):
+    """Compare the rankings of two rerankers, e.g. the torch and onnx backends.
+
+    Args:
+        reference (Reranker): The reference reranker.
+        candidate (Reranker): The reranker to validate.
+        queries (list[tuple]): (query, passages) pairs to rank with both rerankers.
+        top_k (int, optional): Depth of the top-k overlap. Defaults to RERANK_TOP_K.
+
+    Returns:
+        dict: The mean 'top_k_overlap', 'top_1_match' rate and 'spearman' over all queries.
+    """
+
+    agreements = []
+    for query, passages in queries:
+        agreements.append(ranking_agreement(
+            reference.rerank_results(query, passages, None),
+            candidate.rerank_results(query, passages, None),
+            top_k,
+        ))
+
+    report = {
+        key: sum(float(agreement[key]) for agreement in agreements) / len(agreements) if agreements else 0.0
+        for key in ["top_k_overlap", "top_1_match", "spearman"]
+    }
+    logger.info(f"Reranker parity ({reference.backend} vs {candidate.backend}): {report}")
+    return report
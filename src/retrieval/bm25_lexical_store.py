@@ -3,6 +3,8 @@ import json
 from rank_bm25 import BM25Okapi
 import numpy as np
 from config.config import RETRIEVAL_TOP_K, LEXICAL_STORE_PATH
+from retrieval.chunk_store import ChunkStore
+from utils.timing import stage
 from utils.logger import logger
 
 class BM25LexicalStore:
@@ -14,7 +16,8 @@ class BM25LexicalStore:
 
     Attributes:
         store_path (str): Path to the file where the document store is saved.
-        documents (list): List of documents stored in the lexical store.
+        documents (list or ChunkStore): Documents stored in the lexical store. When a
+            ChunkStore is given, the store indexes its rows instead of keeping a copy.
         bm25 (BM25Okapi): The BM25 index built from the stored documents.
 
     Note:
@@ -22,9 +25,10 @@ class BM25LexicalStore:
         appearing in each document, regardless of their proximity within the document.
     """
 
-    def __init__(self, store_path: str = LEXICAL_STORE_PATH, preload: bool = True):
+    def __init__(self, store_path: str = LEXICAL_STORE_PATH, preload: bool = True, chunk_store: ChunkStore = None):
         self.store_path = store_path
-        self.documents = []
+        self.chunk_store = chunk_store
+        self.documents = chunk_store if chunk_store is not None else []
         self.bm25 = None
 
         if preload:
@@ -46,10 +50,17 @@ class BM25LexicalStore:
         try:
             result = False
 
-            if os.path.exists(self.store_path):
+            if self.chunk_store is not None and len(self.chunk_store):
+                # Rows already loaded in the shared chunk store
+                self.build_bm25_index()
+                result = True
+            elif os.path.exists(self.store_path):
                 with open(self.store_path, 'r') as f:
                     data = json.load(f)
-                    self.documents = data["documents"]
+                    if self.chunk_store is not None:
+                        self.chunk_store.add_store_docs(data["documents"])
+                    else:
+                        self.documents = data["documents"]
                     self.build_bm25_index()  # Rebuild bm25 index
                     result = True
 
@@ -75,7 +86,10 @@ class BM25LexicalStore:
         try:
             result = False
 
-            data = {"documents": self.documents}
+            if self.chunk_store is not None:
+                data = {"documents": [doc.to_dict() for doc in self.chunk_store]}
+            else:
+                data = {"documents": self.documents}
             with open(self.store_path, 'w') as f:
                 json.dump(data, f)
                 logger.info(f"BM25 store saved successfuly in {self.store_path}!")
@@ -129,8 +143,12 @@ class BM25LexicalStore:
         """
         
         try:
-            self.documents.append(doc)
-            self.build_bm25_index()  # Rebuild BM25
+            if self.chunk_store is not None:
+                self.chunk_store.add_store_docs([doc])
+            else:
+                self.documents.append(doc)
+            with stage("bm25_index"):
+                self.build_bm25_index()  # Rebuild BM25
 
             logger.info(f"Document successfully adding in bm25 index")
             return True
@@ -153,8 +171,13 @@ class BM25LexicalStore:
         """
         
         try:
-            for doc in docs:
-                self.documents.append(doc)
+            if self.chunk_store is not None:
+                # Documents already in the shared chunk store only need to be indexed
+                if docs is not self.chunk_store:
+                    self.chunk_store.add_store_docs(docs)
+            else:
+                for doc in docs:
+                    self.documents.append(doc)
 
             self.build_bm25_index()  # Rebuild BM25
 
@@ -176,8 +199,14 @@ class BM25LexicalStore:
 
         Returns:
             bool: True if the document was successfully deleted and the index rebuilt, False otherwise.
+                  Always False with a shared chunk store, whose chunk ids are also used by the
+                  vector store: rebuild the index instead.
         """
         
+        if self.chunk_store is not None:
+            logger.error(f"Can't delete document {doc_id} from a shared chunk store, rebuild the index instead")
+            return False
+
         try:
             # Delete doc by ID
             self.documents = [doc for doc in self.documents if doc["document_id"] != doc_id]
@@ -189,7 +218,7 @@ class BM25LexicalStore:
             logger.error(f"An error has occurred while deleting document: {e}")
             return False
     
-    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K):
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K, with_score: bool = False):
         """Search for documents in the BM25 index based on a query.
 
         This method retrieves the top_k most relevant documents from the BM25 index
@@ -200,6 +229,7 @@ class BM25LexicalStore:
         Args:
             query (str): The search query to find relevant documents.
             top_k (int, optional): The number of top results to return. Defaults to RETRIEVAL_TOP_K.
+            with_score (bool, optional): If True, returns (document, score) tuples. Defaults to False.
 
         Returns:
             list: A list of the top_k most relevant documents, sorted by relevance score.
@@ -211,10 +241,13 @@ class BM25LexicalStore:
         
         try:
             # Tokenise query
-            query_tokens = query.split()
-            scores = self.bm25.get_scores(query_tokens)
-            ranked_docs = np.argsort(scores)[::-1]  # Sort by descending scores
+            with stage("bm25"):
+                query_tokens = query.split()
+                scores = self.bm25.get_scores(query_tokens)
+                ranked_docs = np.argsort(scores)[::-1]  # Sort by descending scores
 
+            if with_score:
+                return [(self.documents[i], float(scores[i])) for i in ranked_docs[:top_k]]
             return [self.documents[i] for i in ranked_docs[:top_k]]
         except Exception as e:
             logger.error(f"An error has occurred while searching document: {e}")
@@ -0,0 +1,421 @@
+import os
+import sys
+import threading
+from array import array
+from uuid import UUID, uuid4
+import numpy as np
+
+CONTEXT_PREFIX = "CONTEXT:\n"
+CHUNK_SEPARATOR = "\nCHUNK:\n"
+
+_CONTEXT_PREFIX_BYTES = CONTEXT_PREFIX.encode("utf-8")
+_CHUNK_SEPARATOR_BYTES = CHUNK_SEPARATOR.encode("utf-8")
+_UUID_SIZE = 16
+
+
+def format_content(context: str, chunk: str):
+    """Build the stored text of a chunk from its context and its raw text.
+
+    Args:
+        context (str): The context generated for the chunk.
+        chunk (str): The raw chunk text.
+
+    Returns:
+        str: The text indexed by the vector and lexical stores.
+    """
+
+    return f"{CONTEXT_PREFIX}{context}{CHUNK_SEPARATOR}{chunk}"
+
+
+def split_content(content: str):
+    """Split a stored chunk text built with format_content back into its parts.
+
+    Args:
+        content (str): The stored text of a chunk.
+
+    Returns:
+        tuple: (context, chunk). The context is empty if the text has no context part.
+    """
+
+    if content.startswith(CONTEXT_PREFIX) and CHUNK_SEPARATOR in content:
+        context, chunk = content[len(CONTEXT_PREFIX):].split(CHUNK_SEPARATOR, 1)
+        return context, chunk
+    return "", content
+
+
+class ChunkRecord:
+    """A lightweight view over one row of a ChunkStore.
+
+    Records are built on demand and are not kept by the store. They support
+    dict-style access (``record["content"]``) so they can be used wherever the
+    former store documents (``{"file_path", "document_id", "content"}``) were used.
+
+    Attributes:
+        chunk_id (int): Position of the chunk in the store.
+        uuid (str): UUID of the chunk, as used by the vector store.
+        file_path (str): Path of the source document.
+        document_id (str): File name of the source document.
+        content (str): Stored text of the chunk (context and chunk).
+    """
+
+    __slots__ = ("chunk_id", "uuid", "file_path", "document_id", "content")
+
+    def __init__(self, chunk_id: int, uuid: str, file_path: str, document_id: str, content: str):
+        self.chunk_id = chunk_id
+        self.uuid = uuid
+        self.file_path = file_path
+        self.document_id = document_id
+        self.content = content
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """Return the record in the document store format.
+
+        Returns:
+            dict: A dictionary with the 'file_path', 'document_id' and 'content' keys.
+        """
+
+        return {
+            "file_path": self.file_path,
+            "document_id": self.document_id,
+            "content": self.content,
+        }
+
+
+class ChunkStore:
+    """A compact, append-only table of indexed chunks shared by every component.
+
+    All chunk texts are stored UTF-8 encoded in a single buffer and addressed by
+    integer offsets, UUIDs are kept as 16 raw bytes per chunk, and source paths are
+    interned once per document. The chunk text and the generated context are not
+    stored separately: both are slices of the stored content.
+
+    The table can also hold the reranker token IDs of each chunk (see add_passage_tokens),
+    so passages don't have to be tokenized again on every query.
+
+    Attributes:
+        lock (threading.Lock): Lock guarding writes to the table.
+        tokens_signature (str): Identifies the tokenizer and truncation of the passage tokens.
+    """
+
+    def __init__(self):
+        self._init_storage()
+        self.lock = threading.Lock()
+
+    def _init_storage(self):
+        self._buffer = bytearray()
+        self._offsets = array("Q", [0])
+        self._chunk_starts = array("I")
+        self._sources = array("I")
+        self._uuids = bytearray()
+        self._source_names = []
+        self._source_ids = {}
+        self._uuid_index = None
+        self._init_passage_tokens()
+
+    def _init_passage_tokens(self):
+        self._token_ids = array("I")
+        self._token_offsets = array("Q", [0])
+        self.tokens_signature = None
+
+    def __len__(self):
+        return len(self._sources)
+
+    def __getitem__(self, chunk_id: int):
+        return self.get(chunk_id)
+
+    def __iter__(self):
+        for chunk_id in range(len(self)):
+            yield self.get(chunk_id)
+
+    def _source_id(self, file_path: str):
+        source_id = self._source_ids.get(file_path)
+        if source_id is None:
+            source_id = len(self._source_names)
+            self._source_names.append(sys.intern(file_path))
+            self._source_ids[self._source_names[-1]] = source_id
+        return source_id
+
+    def add(self, file_path: str, content: str, uuid: str = None):
+        """Append a chunk to the table.
+
+        Args:
+            file_path (str): Path of the source document.
+            content (str): Stored text of the chunk, usually built with format_content.
+            uuid (str, optional): UUID of the chunk. A new one is generated if omitted.
+
+        Returns:
+            int: The integer ID of the new chunk.
+        """
+
+        encoded = content.encode("utf-8")
+        chunk_start = 0
+        if encoded.startswith(_CONTEXT_PREFIX_BYTES):
+            separator = encoded.find(_CHUNK_SEPARATOR_BYTES)
+            if separator != -1:
+                chunk_start = separator + len(_CHUNK_SEPARATOR_BYTES)
+        uuid_bytes = UUID(uuid).bytes if uuid else uuid4().bytes
+
+        with self.lock:
+            chunk_id = len(self._sources)
+            self._buffer += encoded
+            self._offsets.append(len(self._buffer))
+            self._chunk_starts.append(chunk_start)
+            self._sources.append(self._source_id(file_path))
+            self._uuids += uuid_bytes
+            if self._uuid_index is not None:
+                self._uuid_index[uuid_bytes] = chunk_id
+
+        return chunk_id
+
+    def add_chunks(self, file_path: str, contexts: list[str], chunks: list[str]):
+        """Append all contextualized chunks of one document to the table.
+
+        Args:
+            file_path (str): Path of the source document.
+            contexts (list[str]): Generated context of each chunk.
+            chunks (list[str]): Raw text of each chunk.
+
+        Returns:
+            list[int]: The integer IDs of the new chunks.
+        """
+
+        return [self.add(file_path, format_content(context, chunk)) for context, chunk in zip(contexts, chunks)]
+
+    def add_store_docs(self, docs: list[dict]):
+        """Append documents in the store format ('file_path' and 'content' keys).
+
+        Args:
+            docs (list[dict]): Documents as saved in the document or BM25 store.
+
+        Returns:
+            int: The number of chunks added.
+        """
+
+        for doc in docs:
+            self.add(doc.get("file_path") or doc.get("document_id", ""), doc["content"])
+        return len(docs)
+
+    def set_uuids(self, uuids: list[str]):
+        """Replace the UUIDs of the table, e.g. with the ones persisted next to the index.
+
+        Args:
+            uuids (list[str]): One UUID per chunk, in chunk order.
+
+        Raises:
+            ValueError: If the number of UUIDs doesn't match the number of chunks.
+        """
+
+        if len(uuids) != len(self):
+            raise ValueError(f"Got {len(uuids)} UUIDs for {len(self)} chunks.")
+
+        with self.lock:
+            self._uuids = bytearray(b"".join(UUID(uuid).bytes for uuid in uuids))
+            self._uuid_index = None
+
+    def clear(self):
+        """Remove every chunk from the table."""
+
+        with self.lock:
+            self._init_storage()
+
+    def content(self, chunk_id: int):
+        """Return the stored text (context and chunk) of a chunk."""
+
+        return self._buffer[self._offsets[chunk_id]:self._offsets[chunk_id + 1]].decode("utf-8")
+
+    def chunk(self, chunk_id: int):
+        """Return the raw text of a chunk, without its context."""
+
+        start = self._offsets[chunk_id] + self._chunk_starts[chunk_id]
+        return self._buffer[start:self._offsets[chunk_id + 1]].decode("utf-8")
+
+    def context(self, chunk_id: int):
+        """Return the generated context of a chunk, or an empty string if it has none."""
+
+        if not self._chunk_starts[chunk_id]:
+            return ""
+        start = self._offsets[chunk_id] + len(_CONTEXT_PREFIX_BYTES)
+        end = self._offsets[chunk_id] + self._chunk_starts[chunk_id] - len(_CHUNK_SEPARATOR_BYTES)
+        return self._buffer[start:end].decode("utf-8")
+
+    def file_path(self, chunk_id: int):
+        """Return the path of the document a chunk comes from."""
+
+        return self._source_names[self._sources[chunk_id]]
+
+    def document_id(self, chunk_id: int):
+        """Return the file name of the document a chunk comes from."""
+
+        return os.path.basename(self.file_path(chunk_id))
+
+    def uuid(self, chunk_id: int):
+        """Return the UUID of a chunk as a string."""
+
+        return str(UUID(bytes=bytes(self._uuids[chunk_id * _UUID_SIZE:(chunk_id + 1) * _UUID_SIZE])))
+
+    def uuids(self):
+        """Return the UUIDs of all chunks as strings, in chunk order."""
+
+        return [self.uuid(chunk_id) for chunk_id in range(len(self))]
+
+    def index_of(self, uuid: str):
+        """Return the integer ID of the chunk with the given UUID.
+
+        The UUID lookup table is built on first use.
+
+        Args:
+            uuid (str): UUID of the chunk.
+
+        Returns:
+            int or None: The chunk ID, or None if the UUID is unknown.
+        """
+
+        if self._uuid_index is None:
+            with self.lock:
+                self._uuid_index = {
+                    bytes(self._uuids[i * _UUID_SIZE:(i + 1) * _UUID_SIZE]): i for i in range(len(self))
+                }
+
+        try:
+            return self._uuid_index.get(UUID(uuid).bytes)
+        except ValueError:
+            return None
+
+    def get(self, chunk_id: int):
+        """Return a ChunkRecord view of a chunk.
+
+        Args:
+            chunk_id (int): The integer ID of the chunk.
+
+        Returns:
+            ChunkRecord: The record of the chunk.
+
+        Raises:
+            IndexError: If the chunk ID is out of range.
+        """
+
+        if chunk_id < 0:
+            chunk_id += len(self)
+        if not 0 <= chunk_id < len(self):
+            raise IndexError(f"Chunk id out of range: {chunk_id}")
+
+        return ChunkRecord(
+            chunk_id,
+            self.uuid(chunk_id),
+            self.file_path(chunk_id),
+            self.document_id(chunk_id),
+            self.content(chunk_id),
+        )
+
+    def passage_token_count(self):
+        """Return the number of chunks, from the first one, whose passage tokens are stored."""
+
+        return len(self._token_offsets) - 1
+
+    def add_passage_tokens(self, token_lists: list, signature: str):
+        """Append the reranker token IDs of the next chunks without tokens.
+
+        Tokens are stored in chunk order: the first list belongs to the chunk following
+        the last tokenized one. Stored tokens are dropped if the signature changes.
+
+        Args:
+            token_lists (list): One list of token IDs per chunk.
+            signature (str): Identifies the tokenizer and truncation used.
+
+        Raises:
+            ValueError: If there are more token lists than chunks without tokens.
+        """
+
+        with self.lock:
+            if signature != self.tokens_signature:
+                self._init_passage_tokens()
+                self.tokens_signature = signature
+
+            if self.passage_token_count() + len(token_lists) > len(self._sources):
+                raise ValueError(f"Got tokens for {self.passage_token_count() + len(token_lists)} chunks but the store has {len(self._sources)}.")
+
+            for token_ids in token_lists:
+                self._token_ids.extend(token_ids)
+                self._token_offsets.append(len(self._token_ids))
+
+    def passage_tokens(self, chunk_id: int, signature: str = None):
+        """Return the stored reranker token IDs of a chunk.
+
+        Args:
+            chunk_id (int): The integer ID of the chunk.
+            signature (str, optional): Expected tokens signature, checked if given.
+
+        Returns:
+            array or None: The token IDs, or None if they are not stored (or don't match the signature).
+        """
+
+        if chunk_id is None or chunk_id >= self.passage_token_count():
+            return None
+        if signature is not None and signature != self.tokens_signature:
+            return None
+
+        return self._token_ids[self._token_offsets[chunk_id]:self._token_offsets[chunk_id + 1]]
+
+    def save_passage_tokens(self, path: str):
+        """Save the passage tokens to a numpy .npz file.
+
+        Args:
+            path (str): Path of the file to write.
+        """
+
+        np.savez(
+            path,
+            token_ids=np.frombuffer(self._token_ids, dtype=np.uint32),
+            token_offsets=np.frombuffer(self._token_offsets, dtype=np.uint64),
+            signature=np.array(self.tokens_signature or ""),
+        )
+
+    def load_passage_tokens(self, path: str, signature: str):
+        """Load passage tokens saved by save_passage_tokens.
+
+        Args:
+            path (str): Path of the saved file.
+            signature (str): Expected tokens signature.
+
+        Returns:
+            bool: True if tokens were loaded, False if the file is missing or doesn't match.
+        """
+
+        if not os.path.exists(path):
+            return False
+
+        with np.load(path) as data:
+            if str(data["signature"]) != signature or len(data["token_offsets"]) - 1 > len(self):
+                return False
+
+            with self.lock:
+                self._token_ids = array("I", data["token_ids"].astype(np.uint32).tobytes())
+                self._token_offsets = array("Q", data["token_offsets"].astype(np.uint64).tobytes())
+                self.tokens_signature = signature
+
+        return True
+
+    def memory_usage(self):
+        """Return the approximate memory used by the table, in bytes."""
+
+        return (
+            len(self._buffer)
+            + self._offsets.itemsize * len(self._offsets)
+            + self._chunk_starts.itemsize * len(self._chunk_starts)
+            + self._sources.itemsize * len(self._sources)
+            + len(self._uuids)
+            + self._token_ids.itemsize * len(self._token_ids)
+            + self._token_offsets.itemsize * len(self._token_offsets)
+            + sum(len(name) for name in self._source_names)
+        )
@@ -1,40 +1,180 @@
 import os
+import threading
+from collections import OrderedDict
 from langchain_openai import OpenAIEmbeddings
 from langchain_ollama import OllamaEmbeddings
 from langchain_huggingface import HuggingFaceEmbeddings
 import faiss
+import numpy as np
 from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
-from config.config import OPENAI_API_KEY, RETRIEVAL_TOP_K, INDEX_PATH, EMBEDDING_PROVIDER, EMBEDDING_MODEL
+from langchain_core.embeddings import Embeddings
+from config.config import OPENAI_API_KEY, RETRIEVAL_TOP_K, INDEX_PATH, EMBEDDING_PROVIDER, EMBEDDING_MODEL, MICRO_BATCH_ENABLE
+from retrieval.chunk_store import ChunkStore
+from utils.model_registry import registry
+from utils.timing import stage
+from utils.cassette import get_cassette, CassetteEmbeddings
+from services.usage import record_embedding_usage
 from utils.logger import logger
 
+
+class ChunkStoreDocstore(InMemoryDocstore):
+    """A LangChain docstore backed by a shared ChunkStore.
+
+    Documents are built on demand from the chunk table instead of being kept in a
+    dictionary, so the vector store doesn't hold a second copy of every chunk.
+    Documents added with unknown ids are kept in the regular in-memory dictionary.
+    When pickled (FAISS.save_local), it is saved as a plain InMemoryDocstore so the
+    index files stay readable without the chunk table.
+
+    Attributes:
+        chunk_store (ChunkStore): The shared chunk table.
+    """
+
+    def __init__(self, chunk_store: ChunkStore):
+        super().__init__()
+        self.chunk_store = chunk_store
+
+    def _document(self, chunk_id: int):
+        return Document(
+            page_content=self.chunk_store.content(chunk_id),
+            metadata={"source": self.chunk_store.document_id(chunk_id), "chunk_id": chunk_id},
+        )
+
+    def add(self, texts: dict[str, Document]):
+        unknown = {_id: doc for _id, doc in texts.items() if self.chunk_store.index_of(_id) is None}
+        if unknown:
+            super().add(unknown)
+
+    def delete(self, ids: list):
+        super().delete([_id for _id in ids if _id in self._dict])
+
+    def search(self, search: str):
+        chunk_id = self.chunk_store.index_of(search)
+        if chunk_id is not None:
+            return self._document(chunk_id)
+        return super().search(search)
+
+    def __reduce__(self):
+        documents = {self.chunk_store.uuid(i): self._document(i) for i in range(len(self.chunk_store))}
+        documents.update(self._dict)
+        return (InMemoryDocstore, (documents,))
+
+
+# Embeddings of the latest queries, (provider, model, query) -> embedding, shared by every
+# vector store of the process so that they survive index reloads
+_query_embeddings = OrderedDict()
+_query_embeddings_lock = threading.Lock()
+QUERY_EMBEDDINGS_MAX = 256
+
+
+def get_embeddings(provider: str = EMBEDDING_PROVIDER, model: str = EMBEDDING_MODEL):
+    """Return the embeddings client shared by the process (see utils.model_registry), created on first use."""
+
+    model_providers = {
+        "openai": lambda: OpenAIEmbeddings(model=model, openai_api_key=OPENAI_API_KEY),
+        "ollama": lambda: OllamaEmbeddings(model=model),
+        "huggingface": lambda: HuggingFaceEmbeddings(model=model),
+        "fake": lambda: _fake_embeddings(model),
+    }
+
+    if provider not in model_providers:
+        raise Exception(f"Invalid embedding provider: {provider}")
+
+    def load_client():
+        embeddings = model_providers[provider]()
+        if MICRO_BATCH_ENABLE.lower() == "yes":
+            from embedding.batched_embeddings import BatchedEmbeddings
+            embeddings = BatchedEmbeddings(embeddings)
+        return embeddings
+
+    def load_embeddings():
+        # Outside the micro-batcher so that recorded calls don't depend on batch composition
+        cassette = get_cassette()
+        if cassette is not None:
+            return CassetteEmbeddings(cassette, provider, model, load_client)
+        return load_client()
+
+    return registry.get("embeddings", provider, model, load_embeddings)
+
+
+def _fake_embeddings(model: str):
+    from embedding.fake_embeddings import FakeEmbeddings
+    return FakeEmbeddings(model)
+
+
+def embed_query(query: str, provider: str = EMBEDDING_PROVIDER, model: str = EMBEDDING_MODEL):
+    """Return the embedding of a query, reusing the one computed by a recent search.
+
+    The semantic answer cache embeds the query the retrieval has just embedded, so
+    the latest query embeddings are kept instead of calling the model again. It
+    doesn't depend on a vector store, so callers don't keep a replaced index alive.
+
+    Args:
+        query (str): The query.
+        provider (str, optional): The embeddings provider. Defaults to EMBEDDING_PROVIDER.
+        model (str, optional): The embeddings model. Defaults to EMBEDDING_MODEL.
+
+    Returns:
+        list[float]: The query embedding.
+    """
+
+    key = (provider, model, query)
+    with _query_embeddings_lock:
+        embedding = _query_embeddings.get(key)
+        if embedding is not None:
+            _query_embeddings.move_to_end(key)
+            return embedding
+
+    embedding = get_embeddings(provider, model).embed_query(query)
+    record_embedding_usage("embed_query", provider, model, [query])
+    with _query_embeddings_lock:
+        _query_embeddings[key] = embedding
+        while len(_query_embeddings) > QUERY_EMBEDDINGS_MAX:
+            _query_embeddings.popitem(last=False)
+    return embedding
+
+
+class RegistryEmbeddings(Embeddings):
+    """LangChain embeddings resolving the shared client through the model registry at every call.
+
+    Stores keep this instead of the client, so an idle client can be unloaded and
+    reloaded without stores holding (or using) a closed instance, and every call marks
+    the client as used.
+    """
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+
+    def embed_query(self, text: str):
+        return get_embeddings(self.provider, self.model).embed_query(text)
+
+    def embed_documents(self, texts: list[str]):
+        return get_embeddings(self.provider, self.model).embed_documents(texts)
+
+
 class FaissLangchainVectorStore:
     # TODO Write docstring
 
-    def __init__(self, provider: str = EMBEDDING_PROVIDER, model: str = EMBEDDING_MODEL, index_file_path: str = INDEX_PATH, preload: bool = True):
+    def __init__(self, provider: str = EMBEDDING_PROVIDER, model: str = EMBEDDING_MODEL, index_file_path: str = INDEX_PATH, preload: bool = True, chunk_store: ChunkStore = None):
         self.provider = provider
         self.model = model
         self.index_file_path = index_file_path
+        self.chunk_store = chunk_store
+        self._chunk_positions = None  # chunk id -> position in the Faiss index, built on demand
 
         logger.info(f"FaissLangchainVectorStore: provider = {self.provider}, model = {self.model}, index_file_path = {self.index_file_path}")
 
-        model_providers = {
-            "openai": lambda: OpenAIEmbeddings(model=self.model, openai_api_key=OPENAI_API_KEY),
-            "ollama": lambda: OllamaEmbeddings(model=self.model),
-            "huggingface": lambda: HuggingFaceEmbeddings(model=self.model),
-        }
-
-        if self.provider not in ["openai", "ollama", "huggingface"]:
-            raise Exception(f"Invalid embedding provider: {self.provider}")
-
-        self.embeddings = model_providers[self.provider]()
+        # Embeddings client shared by every vector store of the process, fetched at use time
+        self.embeddings = RegistryEmbeddings(self.provider, self.model)
 
-        self.index = faiss.IndexFlatL2(len(self.embeddings.embed_query("hello world")))
+        self.index = faiss.IndexFlatL2(len(get_embeddings(self.provider, self.model).embed_query("hello world")))
         self.vector_store = FAISS(
             embedding_function=self.embeddings,
             index=self.index,
-            docstore=InMemoryDocstore(),
+            docstore=ChunkStoreDocstore(self.chunk_store) if self.chunk_store is not None else InMemoryDocstore(),
             index_to_docstore_id={},
         )
 
@@ -45,7 +185,13 @@ class FaissLangchainVectorStore:
         # TODO Write docstring
 
         try:
-            self.vector_store.add_documents(documents=documents, ids=uuids)
+            texts = [document.page_content for document in documents]
+            with stage("embed_documents"):
+                embeddings = self.embeddings.embed_documents(texts)
+            record_embedding_usage("embed_documents", self.provider, self.model, texts)
+            with stage("faiss_add"):
+                self.vector_store.add_embeddings(zip(texts, embeddings), metadatas=[document.metadata for document in documents], ids=uuids)
+            self._chunk_positions = None
 
             logger.info(f"Elements successfuly added in Faiss Vector Store")
             return True
@@ -73,11 +219,72 @@ class FaissLangchainVectorStore:
             logger.error(f"An error has occurred while searching elements in Faiss Vector Store: {e}")
             return False
         
+    def search_with_embedding(self, query: str, top_k: int = RETRIEVAL_TOP_K, filter: dict = None):
+        """Search the index and also return the query embedding, so later stages can reuse it.
+
+        Args:
+            query (str): The search query.
+            top_k (int, optional): The number of results to return. Defaults to RETRIEVAL_TOP_K.
+            filter (dict, optional): Metadata filter. Defaults to None.
+
+        Returns:
+            tuple: (list of (Document, distance) tuples, query embedding as a list of floats).
+                   Returns ([], None) if an error occurs.
+        """
+
+        try:
+            with stage("embed"):
+                embedding = self.embed_query(query)
+            with stage("faiss"):
+                results = self.vector_store.similarity_search_with_score_by_vector(embedding, k=top_k, filter=filter)
+            return results, embedding
+        except Exception as e:
+            logger.error(f"An error has occurred while searching elements in Faiss Vector Store: {e}")
+            return [], None
+
+    def embed_query(self, query: str):
+        """Return the embedding of a query, reusing the one computed by a recent search (see embed_query)."""
+
+        return embed_query(query, self.provider, self.model)
+
+    def get_vectors(self, chunk_ids: list):
+        """Return the stored embeddings of chunks of the shared chunk store.
+
+        Args:
+            chunk_ids (list): Chunk IDs of the shared chunk store (None entries are allowed).
+
+        Returns:
+            tuple: (np.ndarray of shape (len(chunk_ids), dim), boolean mask of the rows found).
+        """
+
+        index = self.vector_store.index
+        vectors = np.zeros((len(chunk_ids), index.d), dtype="float32")
+        found = np.zeros(len(chunk_ids), dtype=bool)
+
+        if self.chunk_store is None:
+            return vectors, found
+
+        if self._chunk_positions is None or len(self._chunk_positions) != len(self.chunk_store):
+            positions = np.full(len(self.chunk_store), -1, dtype="int64")
+            for position, _id in self.vector_store.index_to_docstore_id.items():
+                chunk_id = self.chunk_store.index_of(_id)
+                if chunk_id is not None:
+                    positions[chunk_id] = position
+            self._chunk_positions = positions
+
+        for row, chunk_id in enumerate(chunk_ids):
+            if chunk_id is not None and 0 <= chunk_id < len(self._chunk_positions) and self._chunk_positions[chunk_id] >= 0:
+                vectors[row] = index.reconstruct(int(self._chunk_positions[chunk_id]))
+                found[row] = True
+
+        return vectors, found
+
     def delete_elements(self, uuids: list[str]):
         # TODO Write docstring
 
         try:
             res = self.vector_store.delete(ids=uuids)
+            self._chunk_positions = None
 
             logger.info(f"Elements successfuly deleted in Faiss Store")
             return res
@@ -104,12 +311,41 @@ class FaissLangchainVectorStore:
             self.vector_store = FAISS.load_local(
                 self.index_file_path, self.embeddings, allow_dangerous_deserialization=True
             )
+            self._chunk_positions = None
 
             logger.info(f"Faiss Store successfuly loaded")
             return True
         except Exception as e:
             logger.error(f"An error has occurred while loading Faiss Vector Store: {e}")
             return False
+
+    def share_chunk_store(self):
+        """Serve documents from the shared chunk store instead of the docstore copy.
+
+        The docstore is only replaced when every id of the index is present in the
+        chunk store, otherwise the loaded docstore is kept.
+
+        Returns:
+            bool: True if the docstore was replaced, False otherwise.
+        """
+
+        if self.chunk_store is None:
+            return False
+
+        try:
+            ids = self.vector_store.index_to_docstore_id.values()
+            if any(self.chunk_store.index_of(_id) is None for _id in ids):
+                logger.warning(f"Chunk store doesn't match Faiss Vector Store, keeping its docstore")
+                return False
+
+            self.vector_store.docstore = ChunkStoreDocstore(self.chunk_store)
+            self._chunk_positions = None
+
+            logger.info(f"Faiss Vector Store now shares the chunk store")
+            return True
+        except Exception as e:
+            logger.error(f"An error has occurred while sharing chunk store with Faiss Vector Store: {e}")
+            return False
     
     def delete_index(self):
         # TODO Write docstring
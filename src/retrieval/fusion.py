@@ -0,0 +1,110 @@
+from config.config import FUSION_METHOD, FUSION_RRF_K, FUSION_VECTOR_WEIGHT, FUSION_TOP_K, FUSION_MIN_SCORE_RATIO
+from utils.logger import logger
+
+
+def _normalize(scores: list[float]):
+    """Min-max normalize a list of scores to [0, 1]."""
+
+    if not scores:
+        return []
+
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0 for _ in scores]
+
+    return [(score - low) / (high - low) for score in scores]
+
+
+def fuse_results(vector_hits: list[tuple], lexical_hits: list[tuple], method: str = FUSION_METHOD,
+                 rrf_k: int = FUSION_RRF_K, vector_weight: float = FUSION_VECTOR_WEIGHT, vector_distance: bool = True):
+    """Fuse the ranked hits of the vector and lexical stores into a single ranking.
+
+    Hits are identified by their content, so a chunk found by both stores appears once
+    and keeps the rank and score it got from each store. A hit may carry the chunk ID
+    of the shared chunk store as a third element.
+
+    Args:
+        vector_hits (list[tuple]): (content, score[, chunk_id]) tuples from the vector store, best first.
+        lexical_hits (list[tuple]): (content, score[, chunk_id]) tuples from the lexical store, best first.
+        method (str, optional): 'rrf' for reciprocal rank fusion or 'weighted' for a weighted
+            sum of min-max normalized scores. Defaults to FUSION_METHOD.
+        rrf_k (int, optional): Rank offset of reciprocal rank fusion. Defaults to FUSION_RRF_K.
+        vector_weight (float, optional): Weight of the vector store, the lexical store gets
+            1 - vector_weight. Defaults to FUSION_VECTOR_WEIGHT.
+        vector_distance (bool, optional): True if vector scores are distances (lower is better),
+            as returned by a FAISS L2 index. Defaults to True.
+
+    Returns:
+        list[dict]: The fused candidates sorted by decreasing 'fused_score'. Each candidate has
+            the 'content', 'chunk_id', 'fused_score', 'vector_rank', 'vector_score', 'lexical_rank'
+            and 'lexical_score' keys (None when unknown or when a store didn't return it).
+
+    Raises:
+        ValueError: If the fusion method is not supported.
+    """
+
+    if method not in ["rrf", "weighted"]:
+        raise ValueError(f"Fusion method '{method}' not supported. Use 'rrf' or 'weighted'.")
+
+    weights = {"vector": vector_weight, "lexical": 1 - vector_weight}
+    candidates = {}
+
+    for store, hits in [("vector", vector_hits), ("lexical", lexical_hits)]:
+        scores = [float(hit[1]) for hit in hits]
+        if store == "vector" and vector_distance:
+            normalized = _normalize([-score for score in scores])
+        else:
+            normalized = _normalize(scores)
+
+        for rank, (hit, norm) in enumerate(zip(hits, normalized), start=1):
+            content, score = hit[0], hit[1]
+            candidate = candidates.get(content)
+            if candidate is None:
+                candidate = candidates[content] = {
+                    "content": content,
+                    "chunk_id": None,
+                    "fused_score": 0.0,
+                    "vector_rank": None,
+                    "vector_score": None,
+                    "lexical_rank": None,
+                    "lexical_score": None,
+                }
+            elif candidate[f"{store}_rank"] is not None:
+                continue  # Keep the best rank of duplicated hits
+
+            if len(hit) > 2 and hit[2] is not None:
+                candidate["chunk_id"] = hit[2]
+            candidate[f"{store}_rank"] = rank
+            candidate[f"{store}_score"] = float(score)
+            if method == "rrf":
+                candidate["fused_score"] += weights[store] / (rrf_k + rank)
+            else:
+                candidate["fused_score"] += weights[store] * norm
+
+    return sorted(candidates.values(), key=lambda candidate: candidate["fused_score"], reverse=True)
+
+
+def prune_candidates(candidates: list[dict], top_k: int = FUSION_TOP_K, min_score_ratio: float = FUSION_MIN_SCORE_RATIO):
+    """Keep the fused candidates worth sending to the reranker.
+
+    Args:
+        candidates (list[dict]): Fused candidates sorted by decreasing 'fused_score'.
+        top_k (int, optional): Maximum number of candidates to keep. A value <= 0 keeps
+            them all. Defaults to FUSION_TOP_K.
+        min_score_ratio (float, optional): Drop candidates whose fused score is below this
+            ratio of the best fused score. 0 disables the margin. Defaults to FUSION_MIN_SCORE_RATIO.
+
+    Returns:
+        list[dict]: The kept candidates, in the same order.
+    """
+
+    if not candidates:
+        return []
+
+    kept = candidates[:top_k] if top_k > 0 else list(candidates)
+    if min_score_ratio > 0:
+        threshold = candidates[0]["fused_score"] * min_score_ratio
+        kept = [candidate for candidate in kept if candidate["fused_score"] >= threshold]
+
+    logger.info(f"Fusion kept {len(kept)} of {len(candidates)} candidates")
+    return kept
@@ -0,0 +1,166 @@
+import sys
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from config.config import QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_MAX_BYTES, QUERY_CACHE_TTL
+from utils.logger import logger
+
+
+def normalize_query(query: str):
+    """Normalize a query for cache lookups (unicode form, case and whitespace)."""
+
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def estimate_size(value):
+    """Estimate the memory used by a cached value (strings, numbers, lists, tuples and dicts)."""
+
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """An LRU/TTL cache of retrieval results bound to an index version.
+
+    Entries are keyed by the normalized query and the retrieval parameters. The cache
+    is bounded both by number of entries and by estimated memory, entries expire after
+    a TTL, and every entry is dropped when a new index version is seen.
+
+    Attributes:
+        max_entries (int): Maximum number of cached results.
+        max_bytes (int): Maximum estimated memory of the cached results.
+        ttl (float): Lifetime of an entry in seconds, 0 for no expiration.
+        index_version (int): Version of the index the cached results come from.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups not found in the cache.
+        evictions (int): Number of entries evicted to respect the bounds.
+        expirations (int): Number of entries dropped because of the TTL.
+        invalidations (int): Number of times the cache was cleared by a new index version.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, max_bytes: int = QUERY_CACHE_MAX_BYTES, ttl: float = QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.index_version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, query: str, *params):
+        """Build the cache key of a query and its retrieval parameters."""
+
+        return (normalize_query(query),) + params
+
+    def _check_version(self, index_version):
+        if index_version != self.index_version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info(f"Query cache invalidated by index version {index_version}")
+            self._entries.clear()
+            self._bytes = 0
+            self.index_version = index_version
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key, index_version):
+        """Return a cached result, or None if it is missing, expired or from another index version.
+
+        Args:
+            key (tuple): Cache key built with make_key.
+            index_version (int): Current version of the index.
+
+        Returns:
+            The cached result, or None.
+        """
+
+        with self._lock:
+            self._check_version(index_version)
+
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, index_version):
+        """Store a result, evicting the least recently used entries if needed.
+
+        Args:
+            key (tuple): Cache key built with make_key.
+            value: The retrieval result to cache.
+            index_version (int): Version of the index the result comes from.
+
+        Returns:
+            bool: True if the result was cached, False if it is larger than the whole cache.
+        """
+
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return False
+
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+
+        with self._lock:
+            self._check_version(index_version)
+
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+        return True
+
+    def clear(self):
+        """Remove every cached result."""
+
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return the cache metrics.
+
+        Returns:
+            dict: Entries, estimated bytes, hits, misses, hit rate, evictions, expirations,
+                invalidations and index version.
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "index_version": self.index_version,
+            }
@@ -0,0 +1,281 @@
+import re
+import threading
+from config.config import LLM_CONTEXTUAL_CONTEXT_LENGTH, CONTEXT_MODE, CONTEXT_ANSWER_TOKENS, CONTEXT_HEADER_TOKENS, CONTEXT_SUMMARY_TOKENS, CONTEXT_WINDOW_NEIGHBOURS, CONTEXT_BOILERPLATE_MIN_TOKENS, CONTEXT_BOILERPLATE_RATIO
+from services.llm_session import LLMSession
+from services.document_profiles import DocumentProfiles, content_hash
+from services.prompt_builder import count_tokens, truncate_tokens, split_tokens, text_overlap
+from templates.prompts import ADD_CONTEXT_SYSTEM_PROMPT, ADD_CONTEXT_WINDOW_HUMAN_PROMPT, DOCUMENT_FACTS_TEMPLATE
+from utils.timing import stage
+from utils.logger import logger
+
+_SHARED_LINE = ""  # Owner of a line found in several documents
+_TEMPLATE_SUMMARY_TOKENS = 64
+
+
+def _normalize_line(line: str):
+    """Normalize a line for boilerplate detection: case, digits and spacing are ignored."""
+
+    return re.sub(r"\s+", " ", re.sub(r"\d", "", line.lower())).strip()
+
+
+class DocumentContextualizer:
+    """Generate the context of every chunk of a document within the model context length.
+
+    Four modes are available:
+        - 'full': every chunk is sent with the whole document (ADD_CONTEXT_HUMAN_PROMPT).
+          Input tokens grow as chunks x document length and long documents fail.
+        - 'window': the document is summarized once, part by part, then every chunk is
+          sent with the beginning of the document (header), the summary and its
+          neighbouring chunks, all sized to fit the context length. Input tokens grow
+          linearly with the document length.
+        - 'summary': the document facts (reference, authority, date, place) and summary
+          are extracted once, then every chunk is situated by a short call against the
+          summary and prefixed with the facts (DOCUMENT_FACTS_TEMPLATE). Boilerplate
+          chunks (very short, or mostly made of lines found in other documents) are
+          filled from the template without calling the model.
+        - 'auto': 'full' for documents that fit in the context length, 'window' otherwise.
+
+    The facts and summary of a document are kept in its profile (DocumentProfiles) and
+    reused when the document is processed again.
+
+    Attributes:
+        llm_session (LLMSession): The contextual language model.
+        mode (str): The contextualization mode ('full', 'window' or 'auto').
+        context_length (int): Context length of the model, in tokens.
+        answer_tokens (int): Tokens reserved for the generated context.
+        header_tokens (int): Tokens of the beginning of the document sent with each chunk.
+        summary_tokens (int): Maximum tokens of the document summary.
+        neighbours (int): Number of chunks sent before and after each chunk.
+        profiles (DocumentProfiles): The facts and summary of each processed document.
+        boilerplate_min_tokens (int): Chunks with fewer tokens are boilerplate in 'summary' mode.
+        boilerplate_ratio (float): Chunks with at least this share of lines found in other
+            documents are boilerplate in 'summary' mode, 0 to disable.
+    """
+
+    def __init__(self, llm_session: LLMSession, mode: str = CONTEXT_MODE, context_length: int = LLM_CONTEXTUAL_CONTEXT_LENGTH,
+                 answer_tokens: int = CONTEXT_ANSWER_TOKENS, header_tokens: int = CONTEXT_HEADER_TOKENS,
+                 summary_tokens: int = CONTEXT_SUMMARY_TOKENS, neighbours: int = CONTEXT_WINDOW_NEIGHBOURS,
+                 profiles: DocumentProfiles = None, boilerplate_min_tokens: int = CONTEXT_BOILERPLATE_MIN_TOKENS,
+                 boilerplate_ratio: float = CONTEXT_BOILERPLATE_RATIO):
+        self.llm_session = llm_session
+        self.mode = mode
+        self.context_length = context_length
+        self.answer_tokens = answer_tokens
+        self.header_tokens = header_tokens
+        self.summary_tokens = summary_tokens
+        self.neighbours = neighbours
+        self.profiles = profiles if profiles is not None else DocumentProfiles()
+        self.boilerplate_min_tokens = boilerplate_min_tokens
+        self.boilerplate_ratio = boilerplate_ratio
+
+        if self.mode not in ["full", "window", "summary", "auto"]:
+            raise Exception(f"Invalid contextualization mode: {self.mode}")
+
+        self._prompt_budget = None
+        self._line_owners = {}  # Normalized line hash mapped to its document, _SHARED_LINE if several
+        self._lines_lock = threading.Lock()
+
+    @property
+    def prompt_budget(self):
+        """Tokens left for the variable parts of a prompt, computed on first use."""
+
+        if self._prompt_budget is None:
+            fixed_text = ADD_CONTEXT_SYSTEM_PROMPT + ADD_CONTEXT_WINDOW_HUMAN_PROMPT.format(chunk="", header="", summary="", window="")
+            self._prompt_budget = max(self.context_length - self.answer_tokens - count_tokens(fixed_text), 0)
+        return self._prompt_budget
+
+    def summarize(self, document: str):
+        """Summarize a document part by part, each part with the summary of the previous ones.
+
+        Args:
+            document (str): The document content.
+
+        Returns:
+            str: The summary, cut to summary_tokens.
+                 Returns None if an error occurs during summarization.
+        """
+
+        summary = ""
+        parts = split_tokens(document, max(self.prompt_budget - self.summary_tokens, 1))
+        for count, part in enumerate(parts, start=1):
+            logger.info(f"Summarize part {count} of {len(parts)}")
+            summary = self.llm_session.get_summary(part, summary)
+            if summary is None:
+                return None
+            summary = truncate_tokens(summary, self.summary_tokens)
+
+        return summary
+
+    def profile(self, document: str, source: str = ""):
+        """Return the profile of a document, computing its summary and facts on first use.
+
+        Args:
+            document (str): The document content.
+            source (str, optional): Path of the document. Defaults to "".
+
+        Returns:
+            dict: The profile, with 'file_path', 'facts' and 'summary' keys.
+                 Returns None if the document can't be summarized.
+        """
+
+        profile = self.profiles.get(document)
+        if profile is not None and (profile["facts"] is not None or self.mode != "summary"):
+            logger.info(f"Reuse profile of {profile['file_path'] or source}")
+            return profile
+
+        summary = profile["summary"] if profile is not None else self.summarize(document)
+        if summary is None:
+            return None
+
+        facts = None
+        if self.mode == "summary":
+            facts = self.llm_session.get_facts(truncate_tokens(document, self.header_tokens), summary)
+        return self.profiles.put(document, source, facts, summary)
+
+    def register_lines(self, document: str):
+        """Record the lines of a document, to find the lines shared with other documents.
+
+        Call it for every document of a run before contextualizing any of them (see
+        register_documents), otherwise the first documents are compared with fewer others
+        and the result depends on the processing order.
+        """
+
+        owner = content_hash(document)
+        with self._lines_lock:
+            for line in document.splitlines():
+                line = _normalize_line(line)
+                if not line:
+                    continue
+                key = hash(line)
+                current = self._line_owners.setdefault(key, owner)
+                if current != owner:
+                    self._line_owners[key] = _SHARED_LINE
+
+    def register_documents(self, documents: list[str]):
+        """Record the lines of all the documents of a run, before they are contextualized."""
+
+        if self.mode != "summary" or self.boilerplate_ratio <= 0:
+            return
+        for document in documents:
+            self.register_lines(document)  # No-op if registered by register_documents
+
+    def is_boilerplate(self, chunk: str):
+        """Tell whether a chunk is boilerplate: very short, or mostly lines shared by several documents."""
+
+        if count_tokens(chunk) < self.boilerplate_min_tokens:
+            return True
+        if self.boilerplate_ratio <= 0:
+            return False
+
+        lines = [line for line in (_normalize_line(line) for line in chunk.splitlines()) if line]
+        if not lines:
+            return True
+        shared = sum(1 for line in lines if self._line_owners.get(hash(line)) == _SHARED_LINE)
+        return shared / len(lines) >= self.boilerplate_ratio
+
+    def fill_template(self, facts: dict, context: str):
+        """Build a chunk context from the document facts and a short context."""
+
+        facts = facts or {}
+        return DOCUMENT_FACTS_TEMPLATE.format(
+            reference = facts.get("reference", ""),
+            authority = facts.get("authority", ""),
+            date = facts.get("date", ""),
+            place = facts.get("place", ""),
+            context = context
+        )
+
+    def window(self, chunks: list[str], index: int, max_tokens: int):
+        """Build the text around a chunk from its neighbouring chunks.
+
+        The overlap between adjacent chunks is removed and each side gets half of max_tokens,
+        the end of the previous chunks and the start of the next ones being kept.
+
+        Args:
+            chunks (list[str]): The chunks of the document.
+            index (int): Index of the chunk.
+            max_tokens (int): Maximum tokens of the window.
+
+        Returns:
+            str: The window text, with a [CHUNK] marker at the position of the chunk.
+        """
+
+        chunk = chunks[index]
+        before = "".join(chunks[max(index - self.neighbours, 0):index])
+        after = "".join(chunks[index + 1:index + 1 + self.neighbours])
+        if before:
+            before = before[:len(before) - text_overlap(before, chunk)]
+        if after:
+            after = after[text_overlap(chunk, after):]
+
+        before = truncate_tokens(before, max_tokens // 2, keep_end=True)
+        after = truncate_tokens(after, max_tokens - max_tokens // 2)
+        return f"{before}\n[CHUNK]\n{after}".strip()
+
+    @stage("contextualize")
+    def contextualize(self, document: str, chunks: list[str], source: str = ""):
+        """Generate the context of every chunk of a document.
+
+        Args:
+            document (str): The document content.
+            chunks (list[str]): The chunks of the document.
+            source (str, optional): Path of the document, stored in its profile. Defaults to "".
+
+        Returns:
+            list[str]: The context of each chunk.
+                 Returns None if the context of a chunk can't be generated.
+        """
+
+        mode = self.mode
+        if mode == "auto":
+            largest_chunk = max((count_tokens(chunk) for chunk in chunks), default=0)
+            mode = "full" if count_tokens(document) + largest_chunk <= self.prompt_budget else "window"
+        logger.info(f"Contextualize {len(chunks)} chunks in {mode} mode")
+
+        if mode == "full":
+            contexts = []
+            for count, chunk in enumerate(chunks, start=1):
+                logger.info(f"Process chunk no: {count}")
+                context = self.llm_session.get_context(chunk, document)
+                if context is None:
+                    return None
+                contexts.append(context)
+            return contexts
+
+        profile = self.profile(document, source)
+        if profile is None:
+            return None
+        summary = profile["summary"]
+
+        if mode == "summary":
+            self.register_lines(document)
+            short_summary = truncate_tokens(summary, _TEMPLATE_SUMMARY_TOKENS)
+            contexts = []
+            templated = 0
+            for count, chunk in enumerate(chunks, start=1):
+                if self.is_boilerplate(chunk):
+                    contexts.append(self.fill_template(profile["facts"], short_summary))
+                    templated += 1
+                    continue
+
+                logger.info(f"Process chunk no: {count}")
+                context = self.llm_session.get_summary_context(chunk, summary)
+                if context is None:
+                    return None
+                contexts.append(self.fill_template(profile["facts"], context))
+
+            logger.info(f"{templated} of {len(chunks)} chunks filled from template")
+            return contexts
+
+        header = truncate_tokens(document, self.header_tokens)
+        fixed_tokens = count_tokens(header) + count_tokens(summary)
+        contexts = []
+        for count, chunk in enumerate(chunks):
+            logger.info(f"Process chunk no: {count + 1}")
+            window = self.window(chunks, count, self.prompt_budget - fixed_tokens - count_tokens(chunk))
+            context = self.llm_session.get_window_context(chunk, header, summary, window)
+            if context is None:
+                return None
+            contexts.append(context)
+
+        return contexts
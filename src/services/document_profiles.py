@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+import threading
+from utils.logger import logger
+
+
+def content_hash(content: str):
+    """Return a stable identifier of a document content."""
+
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class DocumentProfiles:
+    """The facts and summary of each document, computed once and reused by all its chunks.
+
+    Profiles are keyed by the hash of the document content, so a document processed
+    again (or moved) reuses its profile instead of summarizing it again.
+
+    Attributes:
+        profiles (dict): Content hash mapped to a dict with 'file_path', 'facts' and 'summary' keys.
+        lock (threading.Lock): Guards writes from parallel document processing.
+    """
+
+    def __init__(self):
+        self.profiles = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def get(self, content: str):
+        """Return the profile of a document content, None if it isn't computed yet."""
+
+        return self.profiles.get(content_hash(content))
+
+    def put(self, content: str, file_path: str, facts: dict, summary: str):
+        """Store the profile of a document.
+
+        Args:
+            content (str): The document content.
+            file_path (str): Path of the document.
+            facts (dict): The document-level facts.
+            summary (str): The summary of the document.
+
+        Returns:
+            dict: The stored profile.
+        """
+
+        profile = {"file_path": file_path, "facts": facts, "summary": summary}
+        with self.lock:
+            self.profiles[content_hash(content)] = profile
+        return profile
+
+    def save(self, path: str):
+        """Save the profiles to a JSON file.
+
+        Returns:
+            bool: True if the profiles are saved, False otherwise.
+        """
+
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({"profiles": self.profiles}, f, ensure_ascii=False, indent=4)
+            logger.info(f"Document profiles saved to {path}")
+            return True
+        except Exception as e:
+            logger.error(f"An error occurred while saving document profiles: {e}")
+            return False
+
+    def load(self, path: str):
+        """Load the profiles saved in a JSON file, if it exists.
+
+        Returns:
+            bool: True if the profiles are loaded, False otherwise.
+        """
+
+        try:
+            if not os.path.exists(path):
+                return False
+            with open(path, 'r', encoding='utf-8') as f:
+                profiles = json.load(f).get("profiles", {})
+            with self.lock:
+                self.profiles.update(profiles)
+            logger.info(f"Document profiles loaded from {path}")
+            return True
+        except Exception as e:
+            logger.error(f"An error occurred while loading document profiles: {e}")
+            return False
@@ -0,0 +1,102 @@
+import re
+import json
+import time
+import random
+import hashlib
+from typing import Any, Iterator, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from config.config import FAKE_LLM_LATENCY_MS, FAKE_LLM_JITTER_MS, FAKE_LLM_ERROR_RATE, FAKE_LLM_TOKEN_LATENCY_MS, FAKE_LLM_RESPONSE_WORDS, FAKE_LATENCY_DISTRIBUTION, FAKE_SEED
+from utils.simulation import CallSimulator
+
+
+def fake_response(messages: list[BaseMessage], words: int = FAKE_LLM_RESPONSE_WORDS):
+    """Build a deterministic templated response to a prompt.
+
+    The response is made of words of the prompt picked with a seed derived from the
+    prompt, so the same prompt always gets the same response. Prompts asking for a JSON
+    object get a JSON object of facts.
+
+    Args:
+        messages (list[BaseMessage]): The prompt.
+        words (int, optional): Number of words of the response. Defaults to FAKE_LLM_RESPONSE_WORDS.
+
+    Returns:
+        str: The response.
+    """
+
+    prompt = "\n".join(str(message.content) for message in messages)
+    digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=6).hexdigest()
+
+    if "JSON" in prompt:
+        return json.dumps({"reference": f"fake-{digest}", "authority": "fake authority", "date": "", "place": ""})
+
+    vocabulary = re.findall(r"\w+", prompt) or ["fake"]
+    generator = random.Random(digest)
+    return f"Fake response {digest}: " + " ".join(generator.choice(vocabulary) for _ in range(words))
+
+
+class FakeChatModel(BaseChatModel):
+    """An offline chat model for load tests and CI.
+
+    Responses come from fake_response. A call waits for a simulated latency (time to first
+    token) plus token_latency_ms per word, and may fail with a simulated error (see
+    utils.simulation.CallSimulator). Streaming yields one word at a time.
+
+    Attributes:
+        model (str): Name of the model, only informative.
+        latency_ms (float): Mean time to first token in milliseconds.
+        jitter_ms (float): Spread of the time to first token in milliseconds.
+        error_rate (float): Probability that a call fails.
+        distribution (str): Latency distribution ('constant', 'uniform', 'normal' or 'lognormal').
+        token_latency_ms (float): Generation time per word in milliseconds.
+        response_words (int): Number of words of a response.
+        seed (int): Seed of the simulated latencies and errors.
+    """
+
+    model: str = "fake"
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    jitter_ms: float = FAKE_LLM_JITTER_MS
+    error_rate: float = FAKE_LLM_ERROR_RATE
+    distribution: str = FAKE_LATENCY_DISTRIBUTION
+    token_latency_ms: float = FAKE_LLM_TOKEN_LATENCY_MS
+    response_words: int = FAKE_LLM_RESPONSE_WORDS
+    seed: Optional[int] = FAKE_SEED
+
+    _simulator: Any = None
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    @property
+    def simulator(self):
+        if self._simulator is None:
+            self._simulator = CallSimulator("LLM", self.latency_ms, self.jitter_ms, self.distribution, self.error_rate, self.seed)
+        return self._simulator
+
+    @staticmethod
+    def _usage(messages: list[BaseMessage], text: str):
+        # One token per word
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        output_tokens = len(text.split())
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs):
+        text = fake_response(messages, self.response_words)
+        self.simulator.call(self.simulator.sample_latency() + self.response_words * self.token_latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=self._usage(messages, text)))])
+
+    def _stream(self, messages: list[BaseMessage], stop: Optional[list[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        text = fake_response(messages, self.response_words)
+        self.simulator.call()
+        words = text.split(" ")
+        for count, word in enumerate(words):
+            time.sleep(self.token_latency_ms / 1000)
+            # Usage comes with the last chunk, as with OpenAI
+            usage = self._usage(messages, text) if count == len(words) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if count == 0 else f" {word}", usage_metadata=usage))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
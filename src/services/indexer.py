@@ -1,13 +1,15 @@
 import os
 import json
-from config.config import LLM_CONTEXTUAL_MODEL, LLM_CONTEXTUAL_PROVIDER, DOCUMENT_PATH_INPUT, DOCUMENT_LIMIT, CHUNK_SIZE, OVERLAP_SIZE, INDEX_PATH, EMBEDDING_DIM, EMBEDDING_PROVIDER, RETRIEVAL_TOP_K, RERANK_TOP_K, CHUNKS_PATH, CONTEXT_CHUNKS_PATH
+from concurrent.futures import ThreadPoolExecutor
+from config.config import LLM_CONTEXTUAL_MODEL, LLM_CONTEXTUAL_PROVIDER, DOCUMENT_PATH_INPUT, DOCUMENT_LIMIT, CHUNK_SIZE, OVERLAP_SIZE, INDEX_PATH, EMBEDDING_DIM, EMBEDDING_PROVIDER, RETRIEVAL_TOP_K, RERANK_TOP_K, CHUNKS_PATH, CONTEXT_CHUNKS_PATH, RETRIEVAL_VECTOR_TIMEOUT, RETRIEVAL_LEXICAL_TIMEOUT, QUERY_MAX_WORKERS
 from services.llm_session import LLMSession
 from embedding.embedder import Embedder
-from reranking.reranker import Reranker
+from reranking.reranker import shared_reranker
 from preprocessing.document_processor import load_documents
 from preprocessing.chunk_processor import chunk_text_gpt2
 from retrieval.faiss_vector_store import FaissVectorStore
 from retrieval.bm25_lexical_store import BM25LexicalStore
+from utils.concurrency import run_branches
 from utils.logger import logger
 
 class Indexer:
@@ -29,12 +31,13 @@ class Indexer:
         global_context_chunks_list (list): List to hold contextual chunks.
         global_embedding_list (list): List to hold generated embeddings.
         global_store_docs (list): List to hold documents for storage.
+        query_executor (ThreadPoolExecutor): Executor running the retrieval branches of queries.
     """
 
     def __init__(self):
         self.context_llm_session = LLMSession(LLM_CONTEXTUAL_PROVIDER, LLM_CONTEXTUAL_MODEL)
         self.embedder = Embedder()
-        self.reranker = Reranker()
+        self.reranker = shared_reranker()
 
         self.vector_store = None
         self.lexical_store = None
@@ -46,6 +49,8 @@ class Indexer:
         self.global_embedding_list = []
         self.global_store_docs = []
 
+        self.query_executor = ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS)
+
     def process_docs(self, limit:int = DOCUMENT_LIMIT):
         """
         Process documents from the specified directory, chunk the text, generate embeddings,
@@ -167,7 +172,8 @@ class Indexer:
         """Query the vector and lexical indexes to retrieve relevant chunks based on the input query.
 
         This method takes a user query, retrieves the corresponding embeddings from the vector store,
-        and searches the lexical store for relevant documents. It combines the results from both stores,
+        and searches the lexical store for relevant documents. Both branches run concurrently, each
+        with its own timeout, and a failed or late branch contributes no result. It combines the results from both stores,
         optionally removing duplicate entries, and reranks the final results using a reranker model.
 
         Args:
@@ -186,20 +192,33 @@ class Indexer:
             raise ValueError("Query can't be empty.")
         
         try:
-            # Querying vector store
-            emb_q1 = self.embedder.get_embedding(query, EMBEDDING_PROVIDER)
-            indices, distances = self.vector_store.search(emb_q1, RETRIEVAL_TOP_K)
-
-            # Retrieve chunk
-            retrieved_chunks = []
-            for idx in indices[0]:
-                retrieved_chunks.append(self.global_chunks_list[idx])
-
-            # Retrieve lexical content
-            lexical_result = self.lexical_store.search(query, RETRIEVAL_TOP_K)
-            retrieved_lex = []
-            for item in lexical_result:
-                retrieved_lex.append(item["content"])
+            def vector_branch():
+                emb_q1 = self.embedder.get_embedding(query, EMBEDDING_PROVIDER)
+                indices, distances = self.vector_store.search(emb_q1, RETRIEVAL_TOP_K)
+
+                # Retrieve chunk
+                retrieved_chunks = []
+                for idx in indices[0]:
+                    retrieved_chunks.append(self.global_chunks_list[idx])
+                return retrieved_chunks
+
+            def lexical_branch():
+                lexical_result = self.lexical_store.search(query, RETRIEVAL_TOP_K)
+                retrieved_lex = []
+                for item in lexical_result:
+                    retrieved_lex.append(item["content"])
+                return retrieved_lex
+
+            # Querying vector and lexical stores concurrently
+            branches = run_branches(self.query_executor, {
+                "vector": (vector_branch, RETRIEVAL_VECTOR_TIMEOUT),
+                "lexical": (lexical_branch, RETRIEVAL_LEXICAL_TIMEOUT),
+            }, default=[])
+            retrieved_chunks = branches["vector"]
+            retrieved_lex = branches["lexical"]
+            if not retrieved_chunks and not retrieved_lex:
+                logger.error(f"No result from vector and lexical stores")
+                return []
 
             # Build final chunk
             if keeps_double_entries:
@@ -1,37 +1,81 @@
 import os
 import shutil
 import json
-from uuid import uuid4
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+import contextvars
 from langchain_core.documents import Document
-from config.config import LLM_CONTEXTUAL_MODEL, LLM_CONTEXTUAL_PROVIDER, DOCUMENT_PATH_INPUT, DOCUMENT_LIMIT, CHUNK_SIZE, OVERLAP_SIZE, INDEX_PATH, EMBEDDING_MODEL, EMBEDDING_PROVIDER, RETRIEVAL_TOP_K, RERANK_TOP_K, CHUNKS_PATH, CONTEXT_CHUNKS_PATH, DOCUMENT_CHUNKS_PATH, UUIDS_CHUNKS_PATH, DOCUMENT_PATH_OUTPUT, PROCESSING_DOC_MAX_WORKERS, DOCUMENT_STORE_PATH
+from config.config import LLM_CONTEXTUAL_MODEL, LLM_CONTEXTUAL_PROVIDER, DOCUMENT_PATH_INPUT, DOCUMENT_LIMIT, CHUNK_SIZE, OVERLAP_SIZE, INDEX_PATH, EMBEDDING_MODEL, EMBEDDING_PROVIDER, RETRIEVAL_TOP_K, RERANK_TOP_K, FUSION_TOP_K, FUSION_MIN_SCORE_RATIO, RETRIEVAL_VECTOR_TIMEOUT, RETRIEVAL_LEXICAL_TIMEOUT, QUERY_MAX_WORKERS, QUERY_CACHE_ENABLE, INDEX_VERSION_PATH, RERANKER_TOKENS_PATH, RERANK_CASCADE_FIRST_STAGE, RERANK_CASCADE_DEPTH, RERANK_CASCADE_STOP_MARGIN, CHUNKS_PATH, CONTEXT_CHUNKS_PATH, DOCUMENT_CHUNKS_PATH, UUIDS_CHUNKS_PATH, DOCUMENT_PATH_OUTPUT, PROCESSING_DOC_MAX_WORKERS, DOCUMENT_STORE_PATH, DOCUMENT_PROFILES_PATH, USAGE_ENABLE, USAGE_REPORT_PATH
 from services.llm_session import LLMSession
-from reranking.reranker import Reranker
+from services.contextualizer import DocumentContextualizer
+from services.document_profiles import DocumentProfiles
+from services.usage import UsageScope, save_usage_report
+from reranking.reranker import shared_reranker
+from reranking.cascade import CascadeReranker
 from preprocessing.document_processor import load_documents
 from preprocessing.chunk_processor import chunk_text_gpt2
 from retrieval.faiss_langchain_vector_store import FaissLangchainVectorStore
 from retrieval.bm25_lexical_store import BM25LexicalStore
+from retrieval.chunk_store import ChunkStore
+from retrieval.fusion import fuse_results, prune_candidates
+from retrieval.query_cache import QueryCache
+from utils.concurrency import run_branches
+from utils.timing import stage, record_count, recording
+from utils.slow_query_log import slow_query_log
+from utils.profiling import profile
 from utils.logger import logger
 
+def read_index_version(path: str = INDEX_VERSION_PATH):
+    """Read the index version saved next to the index.
+
+    Args:
+        path (str, optional): Path to the index version file. Defaults to INDEX_VERSION_PATH.
+
+    Returns:
+        int: The saved index version, 0 if there is none.
+    """
+
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return int(json.load(f).get("version", 0))
+        return 0
+    except Exception as e:
+        logger.error(f"An error occurred while reading index version: {e}")
+        return 0
+
+
 class Indexer2:
     # TODO Write docstring
 
     def __init__(self):
+        # Models are shared by every indexer of the process (see utils.model_registry)
         self.context_llm_session = LLMSession(LLM_CONTEXTUAL_PROVIDER, LLM_CONTEXTUAL_MODEL)
-        self.reranker = Reranker()
+        self.document_profiles = DocumentProfiles() # Facts and summary of each document
+        self.contextualizer = DocumentContextualizer(self.context_llm_session, profiles=self.document_profiles)
+        self.cascade_reranker = CascadeReranker()
 
         self.vector_store = None
         self.lexical_store = None
 
-        self.global_chunks_list = []
-        self.global_context_chunks_list = []
-        self.global_store_docs = []
-        self.global_documents = []
-        self.global_uuid = []
+        # Single chunk table shared by the vector and lexical stores
+        self.chunk_store = ChunkStore()
 
         self.lock = threading.Lock() # Use lock for concurrency
 
+        # Token usage and cost of the last pipeline run and of its documents (see services.usage)
+        self.run_usage = None
+        self.document_usage = {}
+        self.query_executor = ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS) # Retrieval branches of queries
+
+        # Retrieval results cache, invalidated when the index version changes
+        self.index_version = 0
+        self.query_cache = QueryCache() if QUERY_CACHE_ENABLE.lower() == "yes" else None
+
+    @property
+    def reranker(self):
+        return shared_reranker()
+
     def process_docs(self, limit:int = DOCUMENT_LIMIT):
         # TODO Write docstring
         # TODO Use process_single_doc
@@ -40,55 +84,17 @@ class Indexer2:
 
         try:
             documents = load_documents(DOCUMENT_PATH_INPUT, limit=limit)
+            self.contextualizer.register_documents([doc["content"] for doc in documents])
 
             for doc in documents:
                 logger.info(f"Process doc: {doc['file_path']}")
                 content = doc["content"]
                 chunks = chunk_text_gpt2(content, CHUNK_SIZE, OVERLAP_SIZE)
-                count = 0
-                as_error = False
-                sub_store_docs_list = []
-                sub_chunks_list = []
-                sub_context_chunks_list = []
-                sub_document_list = []
-                sub_uuid_list = []
-
-                for chunk in chunks:
-                    count += 1
-                    logger.info(f"Process chunk no: {count}")
-                    context = self.context_llm_session.get_context(chunk, content)
-                    if context is None:
-                        as_error = True
-                        break
-
-                    store_element = f"CONTEXT:\n{context}\nCHUNK:\n{chunk}" # chunk or context (context + chunk)
-                    # logger.debug(f"\nCONTEXT:\n{store_element}")
-                    # logger.debug(f"\nCHUNK:\n{chunk}")
-
-                    # Use for storing chunk
-                    sub_store_docs_list.append({
-                        "file_path": doc["file_path"],
-                        "document_id": os.path.basename(doc["file_path"]),
-                        "content": store_element
-                    })
-
-                    sub_chunks_list.append(chunk)
-                    sub_context_chunks_list.append(context)
-                    sub_document_list.append(
-                        Document(
-                            page_content=store_element,
-                            metadata={"source": os.path.basename(doc["file_path"])},
-                        )
-                    )
-                    sub_uuid_list.append(str(uuid4()))
-
-                if not as_error:
+                contexts = self.contextualizer.contextualize(content, chunks, doc["file_path"])
+
+                if contexts is not None:
                     # Update global data
-                    self.global_store_docs.extend(sub_store_docs_list)
-                    self.global_chunks_list.extend(sub_chunks_list)
-                    self.global_context_chunks_list.extend(sub_context_chunks_list)
-                    self.global_documents.extend(sub_document_list)
-                    self.global_uuid.extend(sub_uuid_list)
+                    self.chunk_store.add_chunks(doc["file_path"], contexts, chunks)
 
                     # Move doc
                     os.makedirs(DOCUMENT_PATH_OUTPUT, exist_ok=True)
@@ -104,25 +110,35 @@ class Indexer2:
     def build_index(self, update: bool = False):
         # TODO Write docstring
         
-        if not self.global_documents or not self.global_store_docs:
-            logger.error(f"Size of documents: {len(self.global_documents)}")
-            logger.error(f"Size of store doc: {len(self.global_store_docs)}")
+        if not len(self.chunk_store):
+            logger.error(f"Size of chunk store: {len(self.chunk_store)}")
             logger.error(f"Error durring building index.")
             return False
         
         try:
             if not update:
-                self.vector_store = FaissLangchainVectorStore(EMBEDDING_PROVIDER, EMBEDDING_MODEL, INDEX_PATH, False)
-                self.lexical_store = BM25LexicalStore(preload=False)
+                self.vector_store = FaissLangchainVectorStore(EMBEDDING_PROVIDER, EMBEDDING_MODEL, INDEX_PATH, False, chunk_store=self.chunk_store)
+                self.lexical_store = BM25LexicalStore(preload=False, chunk_store=self.chunk_store)
 
             logger.info(f"Building vector index with Faiss")
-            self.vector_store.add_elements(self.global_documents, self.global_uuid)
+            documents = [
+                Document(
+                    page_content=self.chunk_store.content(i),
+                    metadata={"source": self.chunk_store.document_id(i), "chunk_id": i},
+                )
+                for i in range(len(self.chunk_store))
+            ]
+            self.vector_store.add_elements(documents, self.chunk_store.uuids())
+            del documents
             self.vector_store.save_index()
             
             logger.info(f"Building lexical index with BM25")
-            self.lexical_store.add_documents(self.global_store_docs)
+            self.lexical_store.add_documents(self.chunk_store)
             self.lexical_store.save_store()
 
+            logger.info(f"Pre-tokenizing passages for reranking")
+            self.tokenize_chunks()
+
             return True
         except Exception as e:
             logger.error(f"An error occured in building index: {e}")
@@ -132,76 +148,215 @@ class Indexer2:
         # TODO Write docstring
         
         try:
-            self.vector_store = FaissLangchainVectorStore(EMBEDDING_PROVIDER, EMBEDDING_MODEL, INDEX_PATH, True)
-            self.lexical_store = BM25LexicalStore(preload=True)
-            logger.info(f"Index loading successful")
+            self.vector_store = FaissLangchainVectorStore(EMBEDDING_PROVIDER, EMBEDDING_MODEL, INDEX_PATH, False, chunk_store=self.chunk_store)
+            self.lexical_store = BM25LexicalStore(preload=False, chunk_store=self.chunk_store)
+            # Both stores must load, a half-written index mustn't serve queries
+            if not self.vector_store.load_index():
+                logger.error("Vector index could not be loaded.")
+                return False
+            if not self.lexical_store.load_store():
+                logger.error("Lexical store could not be loaded.")
+                return False
+            self.index_version = self.read_index_version()
+            logger.info(f"Index loading successful (version {self.index_version})")
 
             return True
         except Exception as e:
             logger.error(f"An error occured during loading index: {e}")
             return False
 
-    def query_index(self, query: str, keeps_double_entries: bool = False):
-        # TODO Write docstring
+    def close(self):
+        """Shut down the thread pool of the query branches, once the queries in flight are done."""
+
+        self.query_executor.shutdown(wait=False)
+
+    @profile("query_index")
+    def query_index(self, query: str, keeps_double_entries: bool = False, return_scores: bool = False):
+        """Retrieve the chunks most relevant to a query.
+
+        The vector and lexical stores are queried concurrently, each with its own timeout
+        (a failed or late store contributes no hit). Hits are fused (see retrieval.fusion), only the best fused
+        candidates are sent to the reranker, and the reranked chunks are returned.
+
+        Args:
+            query (str): The search query to be processed.
+            keeps_double_entries (bool, optional): If True, skips fusion and sends the
+                concatenated hits of both stores, duplicates included, to the reranker.
+                Defaults to False.
+            return_scores (bool, optional): If True, returns one dict per chunk with its
+                'content', 'rerank_score', 'first_stage_score', 'fused_score' and per-store
+                ranks and scores.
+                Defaults to False.
+
+        Returns:
+            list: The top-ranked chunks (or dicts if return_scores is True).
+                  Returns an empty list if an error occurs.
+
+        Raises:
+            ValueError: If the query is an empty string.
+        """
         
         if query.strip() == "":
             raise ValueError("Query can't be empty.")
+
+        # Slow queries are logged with their stage timings and candidate counts
+        with slow_query_log.track("query_index", query, index_version=self.index_version):
+            return self._query_index(query, keeps_double_entries, return_scores)
+
+    def _query_index(self, query: str, keeps_double_entries: bool, return_scores: bool):
+        if self.query_cache is not None:
+            cache_key = self.query_cache.make_key(query, RETRIEVAL_TOP_K, RERANK_TOP_K, FUSION_TOP_K, FUSION_MIN_SCORE_RATIO, RERANK_CASCADE_FIRST_STAGE, RERANK_CASCADE_DEPTH, RERANK_CASCADE_STOP_MARGIN, keeps_double_entries, return_scores)
+            cached = self.query_cache.get(cache_key, self.index_version)
+            if cached is not None:
+                return list(cached)
         
         try:
-            # Querying vector store
-            result = self.vector_store.search(query, RETRIEVAL_TOP_K)
-            # {res.page_content} {res.metadata}
-
-            # Retrieve chunk
-            retrieved_chunks = []
-            for res in result:
-                retrieved_chunks.append(res.page_content)
-
-            # Retrieve lexical content
-            lexical_result = self.lexical_store.search(query, RETRIEVAL_TOP_K)
-            retrieved_lex = []
-            for item in lexical_result:
-                retrieved_lex.append(item["content"])
-
-            # Build final chunk
+            # Querying vector and lexical stores concurrently
+            branches = run_branches(self.query_executor, {
+                "vector": (lambda: self.vector_store.search_with_embedding(query, RETRIEVAL_TOP_K), RETRIEVAL_VECTOR_TIMEOUT),
+                "lexical": (lambda: self.lexical_store.search(query, RETRIEVAL_TOP_K, with_score=True), RETRIEVAL_LEXICAL_TIMEOUT),
+            })
+            vector_result, query_embedding = branches["vector"] or ([], None)
+            vector_hits = [(doc.page_content, score, doc.metadata.get("chunk_id")) for doc, score in vector_result]
+            lexical_hits = [(item["content"], score, item.get("chunk_id")) for item, score in branches["lexical"] or []]
+            record_count("vector_hits", len(vector_hits))
+            record_count("lexical_hits", len(lexical_hits))
+            if not vector_hits and not lexical_hits:
+                logger.error(f"No result from vector and lexical stores")
+                return []
+
+            # Build candidates
             if keeps_double_entries:
-                corpus_list = retrieved_chunks + retrieved_lex
+                candidates = [
+                    {"content": content, "chunk_id": chunk_id, "fused_score": None, "vector_rank": rank, "vector_score": score, "lexical_rank": None, "lexical_score": None}
+                    for rank, (content, score, chunk_id) in enumerate(vector_hits, start=1)
+                ] + [
+                    {"content": content, "chunk_id": chunk_id, "fused_score": None, "vector_rank": None, "vector_score": None, "lexical_rank": rank, "lexical_score": score}
+                    for rank, (content, score, chunk_id) in enumerate(lexical_hits, start=1)
+                ]
             else:
-                corpus_list = list(set(retrieved_chunks + retrieved_lex))
+                with stage("fusion"):
+                    candidates = prune_candidates(fuse_results(vector_hits, lexical_hits), FUSION_TOP_K, FUSION_MIN_SCORE_RATIO)
+            corpus_list = [candidate["content"] for candidate in candidates]
+            record_count("rerank_candidates", len(candidates))
 
-            # Rerank result
+            # Rerank result through the cascade (cheap first stage, then cross-encoder)
             chunk_rank = []
-            rank_result = self.reranker.rerank_results(query, corpus_list, RERANK_TOP_K)
+            with stage("rerank"):
+                passages_ids = [self.chunk_store.passage_tokens(candidate["chunk_id"], self.reranker.tokens_signature) for candidate in candidates]
+                if recording():
+                    record_count("rerank_input_tokens", sum(len(ids) for ids in passages_ids if ids is not None))
+                embeddings, found = None, None
+                if RERANK_CASCADE_FIRST_STAGE == "cosine":
+                    embeddings, found = self.vector_store.get_vectors([candidate["chunk_id"] for candidate in candidates])
+                rank_result = self.cascade_reranker.rerank_results(query, corpus_list, RERANK_TOP_K, passages_ids, query_embedding, embeddings, found)
             for item in rank_result:
-                chunk_rank.append(corpus_list[item["corpus_id"]])
+                if return_scores:
+                    chunk_rank.append({**candidates[item["corpus_id"]], "first_stage_score": item["first_stage_score"], "rerank_score": item["score"]})
+                else:
+                    chunk_rank.append(corpus_list[item["corpus_id"]])
+
+            if self.query_cache is not None and chunk_rank:
+                self.query_cache.put(cache_key, list(chunk_rank), self.index_version)
 
             return chunk_rank
         except Exception as e:
             logger.error(f"An error occured during querying: {e}")
             return []
         
+    def tokenize_chunks(self, batch_size: int = 1024):
+        """Store the reranker token IDs of every chunk that doesn't have them yet.
+
+        Passages never change once indexed, so they are tokenized once here and
+        reranking only has to tokenize the query.
+
+        Args:
+            batch_size (int, optional): Number of passages tokenized per call. Defaults to 1024.
+
+        Returns:
+            bool: True if the tokens are up to date, False otherwise.
+        """
+
+        try:
+            signature = self.reranker.tokens_signature
+            start = self.chunk_store.passage_token_count() if self.chunk_store.tokens_signature == signature else 0
+
+            for batch_start in range(start, len(self.chunk_store), batch_size):
+                batch_end = min(batch_start + batch_size, len(self.chunk_store))
+                passages = [self.chunk_store.content(i) for i in range(batch_start, batch_end)]
+                self.chunk_store.add_passage_tokens(self.reranker.tokenize_passages(passages), signature)
+
+            return True
+        except Exception as e:
+            logger.error(f"An error occurred while tokenizing chunks: {e}")
+            return False
+
+    def read_index_version(self):
+        """Read the index version saved next to the index.
+
+        Returns:
+            int: The saved index version, 0 if there is none.
+        """
+
+        return read_index_version()
+
+    def bump_index_version(self):
+        """Increment the index version and save it next to the index.
+
+        Cached query results of previous versions are no longer served.
+
+        Returns:
+            int: The new index version.
+        """
+
+        self.index_version = max(self.index_version, self.read_index_version()) + 1
+
+        try:
+            # Write then rename, so readers never see a partial file
+            with open(INDEX_VERSION_PATH + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump({"version": self.index_version}, f)
+            os.replace(INDEX_VERSION_PATH + ".tmp", INDEX_VERSION_PATH)
+            logger.info(f"Index version {self.index_version} saved to {INDEX_VERSION_PATH}")
+        except Exception as e:
+            logger.error(f"An error occurred while saving index version: {e}")
+
+        return self.index_version
+
     def save_chunks(self):
         # TODO Write docstring
         
         try:
             # Save store documents
             with open(DOCUMENT_STORE_PATH, 'w', encoding='utf-8') as f:
-                json.dump({"documents": self.global_store_docs}, f, ensure_ascii=False, indent=4)
+                json.dump({"documents": [doc.to_dict() for doc in self.chunk_store]}, f, ensure_ascii=False, indent=4)
                 logger.info(f"Documents store saved to {DOCUMENT_STORE_PATH}")
 
             # Save documents
             documents_data = [
-                {"page_content": doc.page_content, "metadata": doc.metadata}
-                for doc in self.global_documents
+                {"page_content": self.chunk_store.content(i), "metadata": {"source": self.chunk_store.document_id(i)}}
+                for i in range(len(self.chunk_store))
             ]
             with open(DOCUMENT_CHUNKS_PATH, 'w', encoding='utf-8') as f:
                 json.dump({"documents": documents_data}, f, ensure_ascii=False, indent=4)
                 logger.info(f"Documents saved to {DOCUMENT_CHUNKS_PATH}")
+            del documents_data
             
             # Save UUIDs
             with open(UUIDS_CHUNKS_PATH, 'w', encoding='utf-8') as f:
-                json.dump({"uuids": self.global_uuid}, f, ensure_ascii=False, indent=4)
+                json.dump({"uuids": self.chunk_store.uuids()}, f, ensure_ascii=False, indent=4)
                 logger.info(f"UUIDs saved to {UUIDS_CHUNKS_PATH}")
+
+            # Save reranker tokens
+            if self.chunk_store.passage_token_count():
+                self.chunk_store.save_passage_tokens(RERANKER_TOKENS_PATH)
+                logger.info(f"Reranker tokens saved to {RERANKER_TOKENS_PATH}")
+
+            # Save document profiles
+            if len(self.document_profiles):
+                self.document_profiles.save(DOCUMENT_PROFILES_PATH)
+
+            # Publish the new index once every file is written (see RetrievalService)
+            self.bump_index_version()
             
             return True
         except Exception as e:
@@ -212,28 +367,39 @@ class Indexer2:
         # TODO Write docstring
         
         try:
-            if os.path.exists(DOCUMENT_STORE_PATH):
-                with open(DOCUMENT_STORE_PATH, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.global_store_docs = data.get("documents", [])
-                    logger.info(f"Documents strore loaded from {DOCUMENT_STORE_PATH}") 
-
-            # Load documents
-            if os.path.exists(DOCUMENT_CHUNKS_PATH):
-                with open(DOCUMENT_CHUNKS_PATH, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.global_documents = [
-                        Document(page_content=doc["page_content"], metadata=doc["metadata"])
-                        for doc in data.get("documents", [])
-                    ]
-                    logger.info(f"Documents loaded from {DOCUMENT_CHUNKS_PATH}")
+            # The lexical store may already have filled the shared chunk store
+            if not len(self.chunk_store):
+                if os.path.exists(DOCUMENT_STORE_PATH):
+                    with open(DOCUMENT_STORE_PATH, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                        self.chunk_store.add_store_docs(data.get("documents", []))
+                        logger.info(f"Documents strore loaded from {DOCUMENT_STORE_PATH}") 
+
+                # Load documents
+                elif os.path.exists(DOCUMENT_CHUNKS_PATH):
+                    with open(DOCUMENT_CHUNKS_PATH, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                        for doc in data.get("documents", []):
+                            self.chunk_store.add(doc["metadata"].get("source", ""), doc["page_content"])
+                        logger.info(f"Documents loaded from {DOCUMENT_CHUNKS_PATH}")
             
             # Load UUIDs
             if os.path.exists(UUIDS_CHUNKS_PATH):
                 with open(UUIDS_CHUNKS_PATH, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    self.global_uuid = data.get("uuids", [])
+                    self.chunk_store.set_uuids(data.get("uuids", []))
                     logger.info(f"UUIDs loaded from {UUIDS_CHUNKS_PATH}")
+
+            # Load document profiles
+            self.document_profiles.load(DOCUMENT_PROFILES_PATH)
+
+            # Load reranker tokens, or tokenize passages once if they are missing
+            if self.chunk_store.load_passage_tokens(RERANKER_TOKENS_PATH, self.reranker.tokens_signature):
+                logger.info(f"Reranker tokens loaded from {RERANKER_TOKENS_PATH}")
+            self.tokenize_chunks()
+
+            if self.vector_store is not None:
+                self.vector_store.share_chunk_store()
             
             return True
         except Exception as e:
@@ -246,46 +412,15 @@ class Indexer2:
         logger.info(f"Processing document: {doc['file_path']}")
         content = doc["content"]
         chunks = chunk_text_gpt2(content, CHUNK_SIZE, OVERLAP_SIZE)
-        as_error = False
-        sub_store_docs_list = []
-        sub_chunks_list = []
-        sub_context_chunks_list = []
-        sub_document_list = []
-        sub_uuid_list = []
-
-        for count, chunk in enumerate(chunks, start=1):
-            logger.info(f"Processing chunk {count}")
-            context = self.context_llm_session.get_context(chunk, content)
-            if context is None:
-                as_error = True
-                break
-            store_element = f"CONTEXT:\n{context}\nCHUNK:\n{chunk}"
-
-            # Storage chunk data
-            with self.lock:  # Lock writing
-                sub_store_docs_list.append({
-                    "file_path": doc["file_path"],
-                    "document_id": os.path.basename(doc["file_path"]),
-                    "content": store_element
-                })
-
-                sub_chunks_list.append(chunk)
-                sub_context_chunks_list.append(context)
-                sub_document_list.append(
-                    Document(
-                        page_content=store_element,
-                        metadata={"source": os.path.basename(doc["file_path"])},
-                    )
-                )
-                sub_uuid_list.append(str(uuid4()))
+        with UsageScope(doc["file_path"]) as usage:
+            contexts = self.contextualizer.contextualize(content, chunks, doc["file_path"])
+        with self.lock:
+            self.document_usage[doc["file_path"]] = usage
 
-        if not as_error:
+        if contexts is not None:
             # Update global data
-            self.global_store_docs.extend(sub_store_docs_list)
-            self.global_chunks_list.extend(sub_chunks_list)
-            self.global_context_chunks_list.extend(sub_context_chunks_list)
-            self.global_documents.extend(sub_document_list)
-            self.global_uuid.extend(sub_uuid_list)
+            with self.lock:  # Lock writing
+                self.chunk_store.add_chunks(doc["file_path"], contexts, chunks)
 
             # Move doc
             os.makedirs(DOCUMENT_PATH_OUTPUT, exist_ok=True)
@@ -299,8 +434,12 @@ class Indexer2:
             documents = load_documents(DOCUMENT_PATH_INPUT, limit=DOCUMENT_LIMIT)
             logger.info(f"Processing {len(documents)} documents in parallel")
 
+            # Boilerplate lines are found across all documents before any is contextualized
+            self.contextualizer.register_documents([doc["content"] for doc in documents])
+
             with ThreadPoolExecutor(max_workers = PROCESSING_DOC_MAX_WORKERS) as executor:
-                futures = {executor.submit(self.process_single_doc, doc): doc for doc in documents}
+                # Each document runs in a copy of the context, so its usage also goes to the run scope
+                futures = {executor.submit(contextvars.copy_context().run, self.process_single_doc, doc): doc for doc in documents}
 
                 for future in as_completed(futures):
                     try:
@@ -315,7 +454,35 @@ class Indexer2:
 
     def execute_pipeline(self, strict:bool = False):
         # TODO Write docstring
-        
+
+        self.document_usage = {}
+        with UsageScope("run") as self.run_usage, profile("execute_pipeline"):
+            success = self._execute_pipeline(strict)
+
+        if USAGE_ENABLE.lower() == "yes":
+            totals = self.run_usage.totals()
+            logger.info(f"Indexing usage: {totals['calls']} calls, {totals['input_tokens']} input tokens "
+                        f"({totals['cached_tokens']} cached), {totals['output_tokens']} output tokens, cost {totals['cost']:.4f}")
+            if USAGE_REPORT_PATH:
+                save_usage_report(self.usage_report(), USAGE_REPORT_PATH)
+        return success
+
+    def usage_report(self):
+        """Return the token usage and cost of the last pipeline run, in total and per document.
+
+        Documents only account for their contextualization calls: their chunks are
+        embedded together when the index is built, which counts in the run only.
+
+        Returns:
+            dict: {'run': run summary, 'documents': list of document summaries}.
+        """
+
+        return {
+            "run": self.run_usage.summary() if self.run_usage is not None else None,
+            "documents": [usage.summary() for usage in self.document_usage.values()],
+        }
+
+    def _execute_pipeline(self, strict:bool = False):
         logger.info("Starting indexing pipeline")
 
         if not self.load_index():
@@ -1,10 +1,17 @@
+import json
+import time
+import asyncio
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_ollama import ChatOllama
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain.schema import SystemMessage, HumanMessage
 from config.config import OPENAI_API_KEY, ANTHROPIC_API_KEY, GOOGLE_API_KEY
-from templates.prompts import ADD_CONTEXT_HUMAN_PROMPT, ADD_CONTEXT_SYSTEM_PROMPT, BASIC_QUESTION_SYSTEM_PROMPT, BASIC_QUESTION_HUMAN_PROMPT
+from utils.model_registry import registry
+from utils.cassette import get_cassette, CassetteChatModel
+from utils.timing import stage, record_stage, record_count, recording
+from services.usage import message_usage, add_usage, record_llm_usage, estimate_tokens
+from templates.prompts import ADD_CONTEXT_HUMAN_PROMPT, ADD_CONTEXT_SYSTEM_PROMPT, ADD_CONTEXT_WINDOW_HUMAN_PROMPT, ADD_CONTEXT_SUMMARY_SYSTEM_PROMPT, ADD_CONTEXT_SUMMARY_HUMAN_PROMPT, EXTRACT_FACTS_SYSTEM_PROMPT, EXTRACT_FACTS_HUMAN_PROMPT, SUMMARIZE_DOCUMENT_SYSTEM_PROMPT, SUMMARIZE_DOCUMENT_HUMAN_PROMPT, BASIC_QUESTION_SYSTEM_PROMPT, BASIC_QUESTION_HUMAN_PROMPT
 from utils.logger import logger
 
 class LLMSession:
@@ -13,30 +20,56 @@ class LLMSession:
 
     This class initializes the specified LLM provider and model, allowing for
     the invocation of language model functionalities. Supported providers include
-    OpenAI, Anthropic, Ollama, and Google.
+    OpenAI, Anthropic, Ollama, and Google, plus an offline 'fake' provider for load tests.
 
     Attributes:
         provider (str): The name of the LLM provider.
         model (str): The model name to be used with the provider.
-        llm: An instance of the language model corresponding to the specified provider.
+        llm: An instance of the language model corresponding to the specified provider,
+            shared by every session of the process through the model registry and recorded
+            or replayed when CASSETTE_MODE is set (see utils.cassette).
+        semantic_cache (SemanticAnswerCache): Optional cache of answers for similar queries.
+        prompt_builder (PromptBuilder): Optional token budget of the documents sent with a query.
     """
 
-    def __init__(self, provider, model):
+    def __init__(self, provider, model, semantic_cache=None, prompt_builder=None):
         self.provider = provider
         self.model = model
+        self.semantic_cache = semantic_cache
+        self.prompt_builder = prompt_builder
+
+        if self.provider not in ["openai", "ollama", "anthropic", "google", "fake"]:
+            raise Exception(f"Invalid LLM provider: {self.provider}")
+
+    @property
+    def llm(self):
+        """The shared language model, created on first use."""
 
         model_providers = {
-            "openai": lambda: ChatOpenAI(model=self.model, openai_api_key=OPENAI_API_KEY),
+            "openai": lambda: ChatOpenAI(model=self.model, openai_api_key=OPENAI_API_KEY, stream_usage=True),
             "anthropic": lambda: ChatAnthropic(model=self.model, anthropic_api_key=ANTHROPIC_API_KEY),
             "ollama": lambda: ChatOllama(model=self.model),
             "google": lambda: ChatGoogleGenerativeAI(model=self.model, google_api_key=GOOGLE_API_KEY),
+            "fake": self._fake_llm,
         }
 
-        if self.provider not in ["openai", "ollama", "anthropic", "google"]:
-            raise Exception(f"Invalid LLM provider: {self.provider}")
-
-        self.llm = model_providers[self.provider]()
+        load_model = model_providers[self.provider]
+        cassette = get_cassette()
+        if cassette is not None:
+            return registry.get("llm", self.provider, self.model, lambda: CassetteChatModel(cassette, self.provider, self.model, load_model))
+        return registry.get("llm", self.provider, self.model, load_model)
     
+    def _fake_llm(self):
+        from services.fake_llm import FakeChatModel
+        return FakeChatModel(model=self.model)
+
+    def _invoke(self, messages: list, kind: str):
+        # Invoke the model and record the tokens of the call (see services.usage)
+        message = self.llm.invoke(messages)
+        record_llm_usage(kind, self.provider, self.model, message_usage(message), messages, message.content)
+        return message.content
+
+    @stage("get_context")
     def get_context(self, chunk, document):
         """Generate context for a given chunk and document.
 
@@ -63,10 +96,125 @@ class LLMSession:
                 ))
             ]
 
-            return self.llm.invoke(input_message).content
+            return self._invoke(input_message, "get_context")
         except Exception as e:
             logger.error(f"An error has occurred while invoking model - get_context: {e}")
             return None
+
+    @stage("get_context")
+    def get_window_context(self, chunk, header, summary, window):
+        """Generate context for a chunk of a document too long to be sent in full.
+
+        Args:
+            chunk (str): The text chunk to be included in the context.
+            header (str): The beginning of the document (reference, court, parties...).
+            summary (str): The summary of the whole document.
+            window (str): The text around the chunk.
+
+        Returns:
+            str: The generated context response from the language model.
+                 Returns None if an error occurs during invocation.
+        """
+
+        try:
+            input_message = [
+                SystemMessage(content=ADD_CONTEXT_SYSTEM_PROMPT),
+                HumanMessage(content=ADD_CONTEXT_WINDOW_HUMAN_PROMPT.format(
+                    chunk = chunk,
+                    header = header,
+                    summary = summary,
+                    window = window
+                ))
+            ]
+
+            return self._invoke(input_message, "get_context")
+        except Exception as e:
+            logger.error(f"An error has occurred while invoking model - get_window_context: {e}")
+            return None
+
+    @stage("get_summary")
+    def get_summary(self, document, summary=""):
+        """Update the summary of a document with its next part.
+
+        Args:
+            document (str): The next part of the document.
+            summary (str, optional): The summary of the previous parts. Defaults to "".
+
+        Returns:
+            str: The summary of the document read so far.
+                 Returns None if an error occurs during invocation.
+        """
+
+        try:
+            input_message = [
+                SystemMessage(content=SUMMARIZE_DOCUMENT_SYSTEM_PROMPT),
+                HumanMessage(content=SUMMARIZE_DOCUMENT_HUMAN_PROMPT.format(
+                    summary = summary or "-",
+                    document = document
+                ))
+            ]
+
+            return self._invoke(input_message, "get_summary")
+        except Exception as e:
+            logger.error(f"An error has occurred while invoking model - get_summary: {e}")
+            return None
+
+    @stage("get_context")
+    def get_summary_context(self, chunk, summary):
+        """Generate a short context for a chunk from the summary of its document.
+
+        Args:
+            chunk (str): The text chunk to be included in the context.
+            summary (str): The summary of the document.
+
+        Returns:
+            str: The generated context response from the language model.
+                 Returns None if an error occurs during invocation.
+        """
+
+        try:
+            input_message = [
+                SystemMessage(content=ADD_CONTEXT_SUMMARY_SYSTEM_PROMPT),
+                HumanMessage(content=ADD_CONTEXT_SUMMARY_HUMAN_PROMPT.format(
+                    chunk = chunk,
+                    summary = summary
+                ))
+            ]
+
+            return self._invoke(input_message, "get_context")
+        except Exception as e:
+            logger.error(f"An error has occurred while invoking model - get_summary_context: {e}")
+            return None
+
+    @stage("get_facts")
+    def get_facts(self, header, summary):
+        """Extract the document-level facts (reference, authority, date, place).
+
+        Args:
+            header (str): The beginning of the document.
+            summary (str): The summary of the document.
+
+        Returns:
+            dict: The facts, with an empty string for the missing ones.
+                 Returns None if an error occurs during invocation.
+        """
+
+        try:
+            input_message = [
+                SystemMessage(content=EXTRACT_FACTS_SYSTEM_PROMPT),
+                HumanMessage(content=EXTRACT_FACTS_HUMAN_PROMPT.format(
+                    header = header,
+                    summary = summary
+                ))
+            ]
+
+            answer = self._invoke(input_message, "get_facts")
+            answer = answer[answer.find("{"):answer.rfind("}") + 1]  # Drop code fences or comments
+            facts = json.loads(answer)
+            return {key: str(facts.get(key) or "") for key in ["reference", "authority", "date", "place"]}
+        except Exception as e:
+            logger.error(f"An error has occurred while invoking model - get_facts: {e}")
+            return None
     
     def get_response_from_documents(self, query: str, documents: list):
         """Generate a response from the language model based on a query and a list of documents.
@@ -74,7 +222,8 @@ class LLMSession:
         This method constructs a context message for the language model by combining
         a predefined system prompt with a human message that includes the provided
         query and documents. It invokes the language model to generate a response
-        based on this context.
+        based on this context. If a semantic cache is set, the answer of a similar
+        query retrieved from the same chunks is returned without invoking the model.
 
         Args:
             query (str): The query to be included in the context.
@@ -86,15 +235,127 @@ class LLMSession:
         """
         
         try:
-            input_message = [
-                SystemMessage(content=BASIC_QUESTION_SYSTEM_PROMPT),
-                HumanMessage(content=BASIC_QUESTION_HUMAN_PROMPT.format(
-                    query = query, 
-                    documents = "\nChunk: ".join(documents)
-                ))
-            ]
+            vector, answer = self._cached_answer(query, documents)
+            if answer is not None:
+                return answer
 
-            return self.llm.invoke(input_message).content
+            with stage("generate"):
+                answer = self._invoke(self._question_messages(query, documents), "generate")
+
+            self._store_answer(query, documents, answer, vector)
+            return answer
         except Exception as e:
             logger.error(f"An error has occurred while invoking model - get_response_from_documents: {e}")
             return None
+
+    def stream_response_from_documents(self, query: str, documents: list):
+        """Stream the response of the language model to a query over a list of documents.
+
+        Same as get_response_from_documents, but the answer is yielded piece by piece as
+        the model generates it. A cached answer is yielded at once.
+
+        Args:
+            query (str): The query to be included in the context.
+            documents (list): A list of documents to be included in the context.
+
+        Yields:
+            str: The next piece of the response. Stops early if an error occurs.
+        """
+
+        try:
+            vector, answer = self._cached_answer(query, documents)
+            if answer is not None:
+                yield answer
+                return
+
+            messages = self._question_messages(query, documents)
+            parts, usage, start = [], None, time.perf_counter()
+            for chunk in self.llm.stream(messages):
+                usage = add_usage(usage, message_usage(chunk))
+                text = _chunk_text(chunk)
+                if text:
+                    if not parts:
+                        record_stage("first_token", time.perf_counter() - start)
+                    parts.append(text)
+                    yield text
+            record_stage("generate", time.perf_counter() - start)
+            record_llm_usage("generate", self.provider, self.model, usage, messages, "".join(parts))
+
+            self._store_answer(query, documents, "".join(parts), vector)
+        except Exception as e:
+            logger.error(f"An error has occurred while streaming model - stream_response_from_documents: {e}")
+
+    async def astream_response_from_documents(self, query: str, documents: list):
+        """Asynchronously stream the response of the language model (see stream_response_from_documents).
+
+        Args:
+            query (str): The query to be included in the context.
+            documents (list): A list of documents to be included in the context.
+
+        Yields:
+            str: The next piece of the response. Stops early if an error occurs.
+        """
+
+        try:
+            # The cache lookup embeds the query, off the event loop
+            vector, answer = await asyncio.to_thread(self._cached_answer, query, documents)
+            if answer is not None:
+                yield answer
+                return
+
+            messages = self._question_messages(query, documents)
+            parts, usage, start = [], None, time.perf_counter()
+            async for chunk in self.llm.astream(messages):
+                usage = add_usage(usage, message_usage(chunk))
+                text = _chunk_text(chunk)
+                if text:
+                    if not parts:
+                        record_stage("first_token", time.perf_counter() - start)
+                    parts.append(text)
+                    yield text
+            record_stage("generate", time.perf_counter() - start)
+            record_llm_usage("generate", self.provider, self.model, usage, messages, "".join(parts))
+
+            self._store_answer(query, documents, "".join(parts), vector)
+        except Exception as e:
+            logger.error(f"An error has occurred while streaming model - astream_response_from_documents: {e}")
+
+    def _question_messages(self, query: str, documents: list):
+        if self.prompt_builder is not None:
+            fixed_text = BASIC_QUESTION_SYSTEM_PROMPT + BASIC_QUESTION_HUMAN_PROMPT.format(query = query, documents = "")
+            documents = self.prompt_builder.fit_documents(documents, fixed_text)
+
+        messages = [
+            SystemMessage(content=BASIC_QUESTION_SYSTEM_PROMPT),
+            HumanMessage(content=BASIC_QUESTION_HUMAN_PROMPT.format(
+                query = query, 
+                documents = "\nChunk: ".join(documents)
+            ))
+        ]
+        if recording():
+            record_count("prompt_documents", len(documents))
+            record_count("prompt_tokens", estimate_tokens([message.content for message in messages]))
+        return messages
+
+    def _cached_answer(self, query: str, documents: list):
+        """Return the query vector and the semantic cache answer, (None, None) without cache."""
+
+        if self.semantic_cache is None:
+            return None, None
+
+        vector = self.semantic_cache.query_vector(query)
+        answer = self.semantic_cache.lookup(query, documents, vector) if vector is not None else None
+        return vector, answer
+
+    def _store_answer(self, query: str, documents: list, answer: str, vector):
+        if vector is not None and documents and answer:
+            self.semantic_cache.store(query, documents, answer, vector)
+
+
+def _chunk_text(chunk):
+    """Return the text of a streamed message chunk, whose content may be a list of blocks."""
+
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
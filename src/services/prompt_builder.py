@@ -0,0 +1,181 @@
+import tiktoken
+from config.config import LLM_GENERATIVE_CONTEXT_LENGTH, PROMPT_TOKENIZER_ENCODING, PROMPT_ANSWER_TOKENS, PROMPT_MAX_DOCUMENT_TOKENS, PROMPT_MIN_OVERLAP_CHARS
+from retrieval.chunk_store import format_content, split_content
+from utils.model_registry import registry
+from utils.logger import logger
+
+
+def get_tokenizer(encoding: str = PROMPT_TOKENIZER_ENCODING):
+    """Return the tiktoken encoding shared by the process, loaded on first use."""
+
+    return registry.get("tokenizer", "tiktoken", encoding, lambda: tiktoken.get_encoding(encoding))
+
+
+def count_tokens(text: str, encoding: str = PROMPT_TOKENIZER_ENCODING):
+    """Count the tokens of a text.
+
+    Args:
+        text (str): The text.
+        encoding (str, optional): The tiktoken encoding. Defaults to PROMPT_TOKENIZER_ENCODING.
+
+    Returns:
+        int: The number of tokens.
+    """
+
+    return len(get_tokenizer(encoding).encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_end: bool = False, encoding: str = PROMPT_TOKENIZER_ENCODING):
+    """Cut a text to a number of tokens.
+
+    Args:
+        text (str): The text.
+        max_tokens (int): Maximum number of tokens to keep.
+        keep_end (bool, optional): Keep the end of the text instead of its start. Defaults to False.
+        encoding (str, optional): The tiktoken encoding. Defaults to PROMPT_TOKENIZER_ENCODING.
+
+    Returns:
+        str: The text, cut if it is longer than max_tokens.
+    """
+
+    if max_tokens <= 0:
+        return ""
+
+    tokenizer = get_tokenizer(encoding)
+    tokens = tokenizer.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return tokenizer.decode(tokens[-max_tokens:] if keep_end else tokens[:max_tokens])
+
+
+def split_tokens(text: str, max_tokens: int, encoding: str = PROMPT_TOKENIZER_ENCODING):
+    """Split a text into consecutive parts of at most max_tokens tokens."""
+
+    tokenizer = get_tokenizer(encoding)
+    tokens = tokenizer.encode(text, disallowed_special=())
+    return [tokenizer.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max(max_tokens, 1))]
+
+
+def text_overlap(left: str, right: str, min_overlap: int = PROMPT_MIN_OVERLAP_CHARS):
+    """Return the length of the longest end of left that is also the start of right.
+
+    Args:
+        left (str): The text that may end with the overlap.
+        right (str): The text that may start with the overlap.
+        min_overlap (int, optional): Shorter overlaps are ignored. Defaults to PROMPT_MIN_OVERLAP_CHARS.
+
+    Returns:
+        int: The overlap length in characters, 0 if there is none.
+    """
+
+    if min_overlap <= 0 or len(right) < min_overlap:
+        return 0
+
+    probe = right[:min_overlap]
+    start = left.find(probe)
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+
+class PromptBuilder:
+    """Fit retrieved chunks into the token budget of a generation prompt.
+
+    The budget of the documents is the model context length minus the tokens reserved
+    for the answer and the tokens of the fixed part of the prompt (system prompt, query),
+    optionally capped by max_document_tokens. Chunks are added greedily by decreasing
+    rerank score; a chunk that doesn't fit is skipped so smaller ones can still be added.
+    Text shared with a chunk already in the prompt (the overlap between adjacent chunks
+    of a document) is removed before counting.
+
+    Attributes:
+        context_length (int): Context length of the generative model, in tokens.
+        answer_tokens (int): Tokens reserved for the answer.
+        max_document_tokens (int): Maximum tokens of documents, 0 for no cap.
+        min_overlap (int): Minimum length in characters of a removed overlap, 0 to keep overlaps.
+        encoding (str): The tiktoken encoding used to count tokens.
+    """
+
+    def __init__(self, context_length: int = LLM_GENERATIVE_CONTEXT_LENGTH, answer_tokens: int = PROMPT_ANSWER_TOKENS,
+                 max_document_tokens: int = PROMPT_MAX_DOCUMENT_TOKENS, min_overlap: int = PROMPT_MIN_OVERLAP_CHARS,
+                 encoding: str = PROMPT_TOKENIZER_ENCODING):
+        self.context_length = context_length
+        self.answer_tokens = answer_tokens
+        self.max_document_tokens = max_document_tokens
+        self.min_overlap = min_overlap
+        self.encoding = encoding
+
+    def document_budget(self, fixed_text: str = ""):
+        """Return the number of tokens left for documents.
+
+        Args:
+            fixed_text (str, optional): The rest of the prompt. Defaults to "".
+
+        Returns:
+            int: The document budget in tokens.
+        """
+
+        budget = self.context_length - self.answer_tokens - count_tokens(fixed_text, self.encoding)
+        if self.max_document_tokens > 0:
+            budget = min(budget, self.max_document_tokens)
+        return max(budget, 0)
+
+    def _remove_overlaps(self, chunk: str, kept_chunks: list[str]):
+        for kept in kept_chunks:
+            overlap = text_overlap(kept, chunk, self.min_overlap)  # chunk follows kept
+            if overlap:
+                chunk = chunk[overlap:]
+            overlap = text_overlap(chunk, kept, self.min_overlap)  # chunk precedes kept
+            if overlap:
+                chunk = chunk[:-overlap]
+        return chunk
+
+    def fit_documents(self, documents: list[str], fixed_text: str = "", scores: list[float] = None, separator: str = "\nChunk: "):
+        """Select the documents to send to the model within the token budget.
+
+        Args:
+            documents (list[str]): Retrieved chunks, best first.
+            fixed_text (str, optional): The rest of the prompt. Defaults to "".
+            scores (list[float], optional): Rerank score of each document. Defaults to None
+                (documents are already sorted).
+            separator (str, optional): The text joining documents in the prompt. Defaults to "\\nChunk: ".
+
+        Returns:
+            list[str]: The kept documents, best first.
+        """
+
+        if not documents:
+            return []
+
+        tokenizer = get_tokenizer(self.encoding)
+        order = list(range(len(documents)))
+        if scores is not None:
+            order.sort(key=lambda i: scores[i], reverse=True)
+
+        budget = self.document_budget(fixed_text)
+        separator_tokens = len(tokenizer.encode(separator, disallowed_special=()))
+        kept, kept_chunks, used = [], [], 0
+        for i in order:
+            context, chunk = split_content(documents[i])
+            chunk = self._remove_overlaps(chunk, kept_chunks)
+            if not chunk.strip():
+                continue  # Already fully in the prompt
+
+            text = format_content(context, chunk) if context else chunk
+            tokens = tokenizer.encode(text, disallowed_special=())
+            cost = len(tokens) + separator_tokens
+            if used + cost > budget:
+                if kept or budget <= separator_tokens:
+                    continue
+                # Not even the best document fits: truncate it
+                text = tokenizer.decode(tokens[:budget - separator_tokens])
+                cost = budget
+
+            kept.append(text)
+            kept_chunks.append(chunk)
+            used += cost
+
+        logger.info(f"Prompt kept {len(kept)} of {len(documents)} documents ({used} of {budget} tokens)")
+        return kept
@@ -0,0 +1,137 @@
+import threading
+from config.config import INDEX_WATCH_INTERVAL
+from services.indexer2 import Indexer2, read_index_version
+from utils.logger import logger
+
+
+class RetrievalService:
+    """A read-only retrieval service shared by every session of the process.
+
+    The service loads one Indexer2 (FAISS index, BM25 store and chunk store) and serves
+    all queries from it. A background thread watches the index version saved by the
+    indexing pipeline; when it changes, a new indexer is loaded next to the current one
+    and swapped in with a single reference assignment. Queries in flight keep the indexer
+    they started with, so a reload never blocks them, and the old indexer is closed (and
+    its index freed) once the last of them returns. Both indexes are in memory during the swap.
+
+    If the index can't be loaded at start (missing or partially written), the service is
+    not loaded and the watcher (if hot reload is enabled) retries at every check until an index loads.
+
+    Attributes:
+        watch_interval (float): Seconds between two version checks, 0 to disable hot reload.
+        reloads (int): Number of successful reloads.
+        loaded (bool): Whether an index is loaded and queries can be served.
+    """
+
+    def __init__(self, watch_interval: float = INDEX_WATCH_INTERVAL):
+        self.watch_interval = watch_interval
+        self.reloads = 0
+
+        self._reload_lock = threading.Lock()
+        self._lock = threading.Lock() # Guards the swap and the queries in flight
+        self._in_flight = {} # Indexer -> number of queries running on it
+        self._stop = threading.Event()
+        self._indexer, self.loaded = self._load_indexer()
+        if not self.loaded:
+            logger.error(f"Index could not be loaded, waiting for the index watcher to retry")
+
+        self._watcher = None
+        if self.watch_interval > 0:
+            self._watcher = threading.Thread(target=self._watch, name="index-watcher", daemon=True)
+            self._watcher.start()
+
+    @property
+    def indexer(self):
+        """The indexer currently serving queries."""
+
+        return self._indexer
+
+    @property
+    def index_version(self):
+        """The version of the index currently serving queries."""
+
+        return self._indexer.index_version
+
+    def query(self, query: str, keeps_double_entries: bool = False, return_scores: bool = False):
+        """Retrieve the chunks most relevant to a query (see Indexer2.query_index)."""
+
+        indexer = self._acquire()  # Keep the same index for the whole query
+        try:
+            return indexer.query_index(query, keeps_double_entries, return_scores)
+        finally:
+            self._release(indexer)
+
+    def reload(self, force: bool = False):
+        """Load the index saved on disk and swap it in if its version changed.
+
+        Args:
+            force (bool, optional): Reload even if the version didn't change. Defaults to False.
+
+        Returns:
+            bool: True if a new index was swapped in, False otherwise.
+        """
+
+        if not self._reload_lock.acquire(blocking=False):
+            return False  # Another reload is in progress
+
+        try:
+            version = read_index_version()
+            if not force and self.loaded and version == self._indexer.index_version:
+                return False
+
+            logger.info(f"Reloading index: version {self._indexer.index_version} -> {version}")
+            indexer, loaded = self._load_indexer()
+            if not loaded:
+                if self.loaded:
+                    logger.error(f"Index version {version} could not be loaded, keeping version {self._indexer.index_version}")
+                else:
+                    logger.error(f"Index version {version} could not be loaded, no index is serving queries")
+                indexer.close()
+                return False
+
+            with self._lock:
+                previous, self._indexer = self._indexer, indexer
+                busy = previous in self._in_flight
+                self.loaded = True
+            if not busy:
+                previous.close()  # Otherwise closed by its last query
+            self.reloads += 1
+            logger.info(f"Index version {indexer.index_version} is now serving queries")
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def close(self):
+        """Stop watching the index version."""
+
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def _acquire(self):
+        with self._lock:
+            indexer = self._indexer
+            self._in_flight[indexer] = self._in_flight.get(indexer, 0) + 1
+        return indexer
+
+    def _release(self, indexer):
+        with self._lock:
+            self._in_flight[indexer] -= 1
+            if self._in_flight[indexer]:
+                return
+            del self._in_flight[indexer]
+            replaced = indexer is not self._indexer
+        if replaced:
+            indexer.close()
+
+    def _load_indexer(self):
+        indexer = Indexer2()
+        loaded = indexer.load_index() and indexer.load_chunks()
+        return indexer, loaded
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"An error has occurred while reloading index: {e}")
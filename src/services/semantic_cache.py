@@ -0,0 +1,183 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import faiss
+import numpy as np
+from config.config import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MIN_OVERLAP, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_MAX_ENTRIES
+from utils.logger import logger
+
+
+def chunk_key(chunk: str):
+    """Return a short stable identifier of a retrieved chunk."""
+
+    return hashlib.blake2b(chunk.encode("utf-8"), digest_size=8).digest()
+
+
+class SemanticAnswerCache:
+    """A cache of generated answers looked up by query similarity.
+
+    Query embeddings are stored in a small FAISS inner-product index over normalized
+    vectors (cosine similarity). A cached answer is returned when a new query is close
+    enough to a cached one and was answered from mostly the same chunks.
+
+    Attributes:
+        embed (callable): Function returning the embedding of a text, e.g. faiss_langchain_vector_store.embed_query
+            which reuses the embedding of the retrieval.
+        threshold (float): Minimum cosine similarity between queries.
+        min_overlap (float): Minimum Jaccard overlap between the retrieved chunk sets.
+        ttl (float): Lifetime of an entry in seconds, 0 for no expiration.
+        max_entries (int): Maximum number of cached answers, least recently used first out.
+        hits (int): Number of answers served from the cache.
+        misses (int): Number of lookups without a usable answer.
+    """
+
+    def __init__(self, embed, threshold: float = SEMANTIC_CACHE_THRESHOLD, min_overlap: float = SEMANTIC_CACHE_MIN_OVERLAP,
+                 ttl: float = SEMANTIC_CACHE_TTL, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, candidates: int = 4):
+        self.embed = embed
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.candidates = candidates
+
+        self.hits = 0
+        self.misses = 0
+
+        self.index = None  # Created on first insert, once the embedding size is known
+        self._entries = OrderedDict()  # faiss id -> (answer, chunk keys, expires_at)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def query_vector(self, query: str):
+        """Return the normalized embedding of a query, reusable for lookup and store.
+
+        Returns:
+            np.ndarray or None: A (1, dim) float32 array, or None if embedding fails.
+        """
+
+        try:
+            vector = np.asarray(self.embed(query), dtype="float32").reshape(1, -1)
+            faiss.normalize_L2(vector)
+            return vector
+        except Exception as e:
+            logger.error(f"An error has occurred while embedding query for semantic cache: {e}")
+            return None
+
+    def _remove(self, ids: list[int]):
+        for _id in ids:
+            self._entries.pop(_id, None)
+        self.index.remove_ids(np.asarray(ids, dtype="int64"))
+
+    def lookup(self, query: str, documents: list[str], vector: np.ndarray = None):
+        """Return a cached answer for a similar query answered from similar chunks.
+
+        Args:
+            query (str): The user query.
+            documents (list[str]): The chunks retrieved for the query.
+            vector (np.ndarray, optional): The query vector from query_vector, computed if omitted.
+
+        Returns:
+            str or None: The cached answer, or None if there is no match.
+        """
+
+        try:
+            if self.index is None or not self._entries:
+                self.misses += 1
+                return None
+
+            if vector is None:
+                vector = self.query_vector(query)
+            if vector is None:
+                self.misses += 1
+                return None
+            keys = {chunk_key(doc) for doc in documents}
+
+            with self._lock:
+                similarities, ids = self.index.search(vector, min(self.candidates, len(self._entries)))
+                now = time.monotonic()
+                expired = []
+
+                for similarity, _id in zip(similarities[0], ids[0]):
+                    entry = self._entries.get(int(_id))
+                    if entry is None or similarity < self.threshold:
+                        continue
+                    answer, cached_keys, expires_at = entry
+                    if expires_at is not None and expires_at < now:
+                        expired.append(int(_id))
+                        continue
+
+                    union = keys | cached_keys
+                    overlap = len(keys & cached_keys) / len(union) if union else 1.0
+                    if overlap >= self.min_overlap:
+                        self._entries.move_to_end(int(_id))
+                        if expired:
+                            self._remove(expired)
+                        self.hits += 1
+                        logger.info(f"Semantic cache hit (similarity={similarity:.3f}, overlap={overlap:.2f})")
+                        return answer
+
+                if expired:
+                    self._remove(expired)
+                self.misses += 1
+                return None
+        except Exception as e:
+            logger.error(f"An error has occurred while looking up semantic cache: {e}")
+            return None
+
+    def store(self, query: str, documents: list[str], answer: str, vector: np.ndarray = None):
+        """Cache the answer generated for a query and its retrieved chunks.
+
+        Args:
+            query (str): The user query.
+            documents (list[str]): The chunks the answer was generated from.
+            answer (str): The generated answer.
+            vector (np.ndarray, optional): The query vector from query_vector, computed if omitted.
+
+        Returns:
+            bool: True if the answer was cached, False otherwise.
+        """
+
+        try:
+            if vector is None:
+                vector = self.query_vector(query)
+            if vector is None:
+                return False
+            expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+
+            with self._lock:
+                if self.index is None:
+                    self.index = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+
+                _id = self._next_id
+                self._next_id += 1
+                self.index.add_with_ids(vector, np.asarray([_id], dtype="int64"))
+                self._entries[_id] = (answer, frozenset(chunk_key(doc) for doc in documents), expires_at)
+
+                overflow = len(self._entries) - self.max_entries
+                if overflow > 0:
+                    self._remove(list(self._entries)[:overflow])
+
+            return True
+        except Exception as e:
+            logger.error(f"An error has occurred while storing in semantic cache: {e}")
+            return False
+
+    def clear(self):
+        """Remove every cached answer."""
+
+        with self._lock:
+            self._entries.clear()
+            if self.index is not None:
+                self.index.reset()
+
+    def stats(self):
+        """Return the cache metrics (entries, hits, misses and hit rate)."""
+
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
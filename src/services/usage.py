@@ -0,0 +1,227 @@
+import os
+import json
+import threading
+import contextvars
+from config.config import USAGE_ENABLE, USAGE_PRICES_PATH, METRICS_ENABLE
+from services.prompt_builder import count_tokens
+from utils.metrics import metrics
+from utils.logger import logger
+
+_active_scopes = contextvars.ContextVar("usage_scopes", default=())
+
+
+def message_usage(message):
+    """Return the (input, output, cached input) tokens reported with a model response, None if there are none.
+
+    Reads the usage_metadata of LangChain messages, or the raw usage of the provider in
+    the response metadata.
+    """
+
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        details = usage.get("input_token_details") or {}
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0), details.get("cache_read", 0) or 0
+
+    metadata = getattr(message, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or metadata.get("usage") or {}
+    if usage:
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or usage.get("cache_read_input_tokens") or 0
+        return usage.get("prompt_tokens", usage.get("input_tokens", 0)), usage.get("completion_tokens", usage.get("output_tokens", 0)), cached
+    return None
+
+
+def add_usage(total, usage):
+    """Sum two (input, output, cached) usages, either of which may be None."""
+
+    if usage is None:
+        return total
+    if total is None:
+        return tuple(usage)
+    return tuple(a + b for a, b in zip(total, usage))
+
+
+def estimate_tokens(texts: list[str]):
+    """Estimate the tokens of texts with the prompt tokenizer, or their words if it isn't available."""
+
+    try:
+        return sum(count_tokens(text) for text in texts)
+    except Exception:
+        return sum(len(text.split()) for text in texts)
+
+
+class PriceTable:
+    """Prices of the providers per million tokens.
+
+    The JSON file maps 'provider/model' (or 'model') to its 'input', 'output' and
+    optional 'cached_input' prices, e.g. {"openai/gpt-4o-mini": {"input": 0.15, "output": 0.6,
+    "cached_input": 0.075}}. Unpriced models cost 0.
+
+    Attributes:
+        prices (dict): The price table.
+    """
+
+    def __init__(self, path: str = USAGE_PRICES_PATH):
+        self.prices = {}
+        self._unpriced = set()
+
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.prices = json.load(f)
+                logger.info(f"Price table loaded from {path}")
+            except Exception as e:
+                logger.error(f"An error has occurred while loading the price table: {e}")
+
+    def cost(self, provider: str, model: str, input_tokens: int, output_tokens: int = 0, cached_tokens: int = 0):
+        price = self.prices.get(f"{provider}/{model}") or self.prices.get(model)
+        if price is None:
+            if self.prices and (provider, model) not in self._unpriced:
+                self._unpriced.add((provider, model))
+                logger.warning(f"No price for {provider}/{model}, its cost is counted as 0")
+            return 0.0
+
+        uncached = max(input_tokens - cached_tokens, 0)
+        cached_price = price.get("cached_input", price.get("input", 0))
+        return (uncached * price.get("input", 0) + cached_tokens * cached_price + output_tokens * price.get("output", 0)) / 1_000_000
+
+
+class UsageScope:
+    """Token usage and cost of a unit of work: a pipeline run, a document or a query.
+
+    Used as a context manager: the calls recorded inside it, in this thread or in threads
+    started from a copy of its context, are added to it and to the enclosing scopes.
+
+    Attributes:
+        name (str): Name of the unit of work.
+        calls (dict): 'kind provider/model' mapped to calls, input, output and cached tokens and cost.
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._token = None
+
+    def add(self, kind: str, provider: str, model: str, input_tokens: int, output_tokens: int, cached_tokens: int, cost: float):
+        key = f"{kind} {provider}/{model}"
+        with self._lock:
+            entry = self.calls.setdefault(key, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cost": 0.0})
+            entry["calls"] += 1
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["cached_tokens"] += cached_tokens
+            entry["cost"] += cost
+
+    def totals(self):
+        with self._lock:
+            entries = list(self.calls.values())
+        return {name: sum(entry[name] for entry in entries) for name in ["calls", "input_tokens", "output_tokens", "cached_tokens", "cost"]}
+
+    def summary(self):
+        """Return the totals and the usage per kind of call."""
+
+        with self._lock:
+            calls = {key: dict(entry) for key, entry in self.calls.items()}
+        return {"name": self.name, **self.totals(), "by_call": calls}
+
+    def __enter__(self):
+        self._token = _active_scopes.set(_active_scopes.get() + (self,))
+        return self
+
+    def __exit__(self, *exc):
+        _active_scopes.reset(self._token)
+        return False
+
+
+_prices = None
+_prices_lock = threading.Lock()
+
+
+def get_prices():
+    """Return the price table of the process, loaded on first use."""
+
+    global _prices
+    with _prices_lock:
+        if _prices is None:
+            _prices = PriceTable()
+    return _prices
+
+
+def record_usage(kind: str, provider: str, model: str, input_tokens: int, output_tokens: int = 0, cached_tokens: int = 0):
+    """Record the tokens of a provider call in the active scopes and the metrics (if USAGE_ENABLE is 'yes').
+
+    Args:
+        kind (str): Kind of call ('get_context', 'generate', 'embed_documents', ...).
+        provider (str): The provider.
+        model (str): The model.
+        input_tokens (int): Input tokens, cached ones included.
+        output_tokens (int, optional): Output tokens. Defaults to 0.
+        cached_tokens (int, optional): Input tokens read from the provider cache. Defaults to 0.
+    """
+
+    if USAGE_ENABLE.lower() != "yes":
+        return
+
+    cost = get_prices().cost(provider, model, input_tokens, output_tokens, cached_tokens)
+    for scope in _active_scopes.get():
+        scope.add(kind, provider, model, input_tokens, output_tokens, cached_tokens, cost)
+
+    if METRICS_ENABLE.lower() == "yes":
+        labels = {"kind": kind, "provider": provider, "model": model}
+        metrics.inc("rag_provider_calls_total", 1, "Calls to the LLM and embeddings providers.", **labels)
+        for token_type, count in [("input", input_tokens), ("output", output_tokens), ("cached", cached_tokens)]:
+            metrics.inc("rag_tokens_total", count, "Tokens of the LLM and embeddings calls.", type=token_type, **labels)
+        metrics.inc("rag_cost_total", cost, "Cost of the LLM and embeddings calls (price table currency).", **labels)
+
+
+def record_llm_usage(kind: str, provider: str, model: str, usage, messages: list = None, answer: str = ""):
+    """Record the usage of a chat model call, estimated from the prompt and answer when the provider reports none.
+
+    Args:
+        kind (str): Kind of call.
+        provider (str): The provider.
+        model (str): The model.
+        usage (tuple): (input, output, cached) tokens reported by the provider, or None.
+        messages (list, optional): The prompt messages, for the estimate. Defaults to None.
+        answer (str, optional): The answer, for the estimate. Defaults to "".
+    """
+
+    if USAGE_ENABLE.lower() != "yes":
+        return
+
+    if usage is None:
+        usage = (estimate_tokens([str(message.content) for message in messages or []]), estimate_tokens([str(answer)]), 0)
+    record_usage(kind, provider, model, *usage)
+
+
+def record_embedding_usage(kind: str, provider: str, model: str, texts: list[str]):
+    """Record the estimated input tokens of an embeddings call (providers don't report them through LangChain).
+
+    Texts are only tokenized when the usage goes somewhere, i.e. inside a UsageScope or
+    with metrics enabled, so that queries outside a scope don't pay for the estimate.
+    """
+
+    if USAGE_ENABLE.lower() != "yes":
+        return
+    if not _active_scopes.get() and METRICS_ENABLE.lower() != "yes":
+        return
+    record_usage(kind, provider, model, estimate_tokens(texts))
+
+
+def save_usage_report(report: dict, path: str):
+    """Save a usage report to a JSON file.
+
+    Returns:
+        bool: True if the report was saved, False otherwise.
+    """
+
+    try:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Usage report saved to {path}")
+        return True
+    except Exception as e:
+        logger.error(f"An error has occurred while saving the usage report: {e}")
+        return False
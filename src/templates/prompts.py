@@ -60,3 +60,110 @@ Hello, can you answer the following question:
 **Provided documents:**  
 {documents}  
 """
+
+
+
+SUMMARIZE_DOCUMENT_SYSTEM_PROMPT = """
+You are an expert in document analysis.  
+
+Your task is to write a summary of a document that is read part by part.  
+You receive the summary of the previous parts, if any, and the next part of the document. Return the updated summary of the whole document read so far.  
+The summary must include, if available:  
+- **Reference**: case (file or folder) number  
+- **Legal authority**: issuing body or court  
+- **Date of decision**  
+- **Place or address of decision**  
+- **Parties, subject and outcome** of the document  
+
+The output must be:  
+- **Short, clear, and concise**  
+- **Written in the same language as the input text**  
+- **Strictly factual, without interpretation or additional commentary**  
+
+Do not use emoticons or emojis.  
+"""
+
+SUMMARIZE_DOCUMENT_HUMAN_PROMPT = """
+Hello, could you update the summary of this document with its next part?  
+
+**Summary of the previous parts:**  
+{summary}  
+
+**Next part of the document:**  
+{document}  
+"""
+
+ADD_CONTEXT_WINDOW_HUMAN_PROMPT = """  
+Hello, could you provide the context for this text chunk in the language of chunk?  
+The document is too long to be provided in full: you receive its beginning, its summary and the text around the chunk.  
+
+**Chunk to analyze:**  
+{chunk}  
+
+**Beginning of the document:**  
+{header}  
+
+**Summary of the document:**  
+{summary}  
+
+**Text around the chunk:**  
+{window}  
+"""  
+
+
+
+EXTRACT_FACTS_SYSTEM_PROMPT = """
+You are an expert in document analysis.  
+
+Your task is to extract the document-level facts from the beginning and the summary of a document.  
+Return **only** a JSON object with the following keys, and an empty string for a fact that is not available:  
+- "reference": case (file or folder) number  
+- "authority": issuing body or court  
+- "date": date of decision  
+- "place": place or address of decision  
+
+The values must be:  
+- **Written in the same language as the input text**  
+- **Strictly factual, without interpretation or additional commentary**  
+"""
+
+EXTRACT_FACTS_HUMAN_PROMPT = """
+Hello, could you extract the facts of this document?  
+
+**Beginning of the document:**  
+{header}  
+
+**Summary of the document:**  
+{summary}  
+"""
+
+ADD_CONTEXT_SUMMARY_SYSTEM_PROMPT = """
+You are an expert in document analysis.  
+
+Your task is to situate a text chunk within its document, using the summary of the document.  
+Describe only what the chunk is about and where it fits in the document: the reference, legal authority, date and place are added separately and must not be extracted or repeated.  
+
+The output must be:  
+- **One or two sentences**  
+- **Written in the same language as the input text**  
+- **Strictly factual, without interpretation or additional commentary**  
+
+Do not use emoticons or emojis.  
+"""
+
+ADD_CONTEXT_SUMMARY_HUMAN_PROMPT = """  
+Hello, could you situate this text chunk within the document in one or two sentences, in the language of chunk?  
+The reference, legal authority, date and place of the document are already known: do not repeat them.  
+
+**Chunk to analyze:**  
+{chunk}  
+
+**Summary of the document:**  
+{summary}  
+"""  
+
+DOCUMENT_FACTS_TEMPLATE = """**Reference**: {reference}
+**Legal authority**: {authority}
+**Date of decision**: {date}
+**Place or address of decision**: {place}
+**Context**: {context}"""
@@ -0,0 +1,123 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from utils.logger import logger
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Collect concurrent requests for a few milliseconds and process them as one batch.
+
+    Callers block in submit() while a background thread gathers requests until either
+    max_batch_size requests are waiting or max_wait_ms has elapsed since the first one,
+    runs process_batch once on all of them and hands each caller its own result.
+
+    Attributes:
+        name (str): Name of the batcher, used in logs and for the worker thread.
+        process_batch (callable): Function taking a list of requests and returning one
+            result per request, in the same order.
+        max_batch_size (int): Maximum number of requests per batch.
+        max_wait_ms (float): Maximum time to wait for more requests after the first one.
+        batches (int): Number of batches processed.
+        requests (int): Number of requests processed.
+        closed (bool): True once close() is called, requests are then processed one by one
+            in the calling thread.
+    """
+
+    def __init__(self, process_batch, max_batch_size: int, max_wait_ms: float, name: str = "micro-batcher"):
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self.batches = 0
+        self.requests = 0
+        self.closed = False
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock() # Makes the closed check and the put atomic with close()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, request, timeout: float = None):
+        """Submit a request and wait for its result.
+
+        Args:
+            request: The request, as expected by process_batch.
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to None.
+
+        Returns:
+            The result of the request.
+
+        Raises:
+            Exception: The error raised by process_batch for the batch of the request.
+        """
+
+        future = Future()
+        with self._lock:
+            # Nothing is queued after _STOP, requests submitted once closed run here
+            queued = not self.closed
+            if queued:
+                self._queue.put((request, future))
+        if not queued:
+            return self.process_batch([request])[0]
+        return future.result(timeout)
+
+    def close(self):
+        """Stop the worker thread once the pending requests are processed."""
+
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._process(batch)
+
+    def _process(self, batch: list):
+        try:
+            results = self.process_batch([request for request, _ in batch])
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            logger.error(f"An error has occurred in {self.name} batch: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+        self.batches += 1
+        self.requests += len(batch)
+
+    def stats(self):
+        """Return the number of batches, requests and the mean batch size."""
+
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+from config.config import CASSETTE_MODE, CASSETTE_PATH, CASSETTE_LATENCY_SCALE
+from utils.model_registry import registry
+from utils.logger import logger
+
+
+class CassetteMiss(Exception):
+    """A replayed request was not recorded."""
+
+
+class ReplayedError(Exception):
+    """An error recorded for a request, raised again on replay."""
+
+
+class Cassette:
+    """Record provider calls to a file and replay them without network.
+
+    In 'record' mode, every call goes to the provider and its request, response (or error)
+    and timing are appended to a JSON lines file, keyed by a hash of the provider, model and
+    request. In 'replay' mode, calls are served from the file after the recorded latency
+    multiplied by latency_scale (0 to answer at once); a request recorded several times gets
+    its responses in the recorded order, then again from the first. An unknown request raises
+    CassetteMiss.
+
+    Attributes:
+        path (str): Path of the cassette file.
+        mode (str): 'record' or 'replay'.
+        latency_scale (float): Multiplier of the recorded latencies in replay mode.
+        hits (int): Number of replayed calls.
+        misses (int): Number of replayed calls without recording.
+        recorded (int): Number of recorded calls.
+    """
+
+    def __init__(self, path: str = CASSETTE_PATH, mode: str = CASSETTE_MODE, latency_scale: float = CASSETTE_LATENCY_SCALE):
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        self._entries = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+        if self.mode not in ["record", "replay"]:
+            raise ValueError(f"Cassette mode '{self.mode}' not supported. Use 'record' or 'replay'.")
+
+        if self.mode == "replay":
+            self.load()
+        elif os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    @staticmethod
+    def make_key(kind: str, provider: str, model: str, request):
+        """Return the content hash identifying a request."""
+
+        payload = json.dumps({"kind": kind, "provider": provider, "model": model, "request": request}, sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    def load(self):
+        """Load the recorded calls of the cassette file."""
+
+        self._entries, self._positions = {}, {}
+        if not os.path.exists(self.path):
+            logger.error(f"Cassette {self.path} not found")
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+        logger.info(f"Cassette loaded from {self.path} ({sum(len(entries) for entries in self._entries.values())} calls)")
+
+    def stats(self):
+        """Return the replayed, missed and recorded call counts."""
+
+        return {"hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+    def _write(self, key: str, kind: str, provider: str, model: str, request, **fields):
+        entry = {"key": key, "kind": kind, "provider": provider, "model": model, "request": request, **fields}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.recorded += 1
+
+    def _replay(self, key: str):
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMiss(f"Request {key} not found in cassette {self.path}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            self.hits += 1
+            return entries[position % len(entries)]
+
+    def _delay(self, seconds: float):
+        return max(seconds, 0.0) * self.latency_scale
+
+    def call(self, kind: str, provider: str, model: str, request, func):
+        """Run or replay a call.
+
+        Args:
+            kind (str): Kind of call ('llm', 'embed_query', ...).
+            provider (str): The provider.
+            model (str): The model.
+            request: JSON-serializable request, used for the key.
+            func (callable): Function making the call and returning a JSON-serializable response.
+
+        Returns:
+            The response.
+
+        Raises:
+            CassetteMiss: If the request is not recorded, in replay mode.
+            ReplayedError: If the recorded call failed, in replay mode.
+        """
+
+        key = self.make_key(kind, provider, model, request)
+        if self.mode == "replay":
+            entry = self._replay(key)
+            time.sleep(self._delay(entry["latency"]))
+            if entry.get("error"):
+                raise ReplayedError(entry["error"])
+            if "response" in entry:
+                return entry["response"]
+            # Call recorded as a stream
+            return {"content": "".join(chunk["content"] if isinstance(chunk, dict) else chunk for chunk in entry["chunks"])}
+
+        start = time.perf_counter()
+        try:
+            response = func()
+        except Exception as e:
+            self._write(key, kind, provider, model, request, error=str(e), latency=time.perf_counter() - start)
+            raise
+        self._write(key, kind, provider, model, request, response=response, latency=time.perf_counter() - start)
+        return response
+
+    def _replay_chunks(self, entry: dict):
+        if "chunks" in entry:
+            return entry["chunks"], entry["offsets"]
+        return [entry["response"]], [entry["latency"]]
+
+    def stream(self, kind: str, provider: str, model: str, request, func):
+        """Run or replay a streamed call (see call). func returns an iterator of JSON-serializable chunks.
+
+        Yields:
+            The chunks, replayed with their recorded offsets.
+        """
+
+        key = self.make_key(kind, provider, model, request)
+        if self.mode == "replay":
+            entry = self._replay(key)
+            if entry.get("error"):
+                time.sleep(self._delay(entry["latency"]))
+                raise ReplayedError(entry["error"])
+            previous = 0.0
+            for chunk, offset in zip(*self._replay_chunks(entry)):
+                time.sleep(self._delay(offset - previous))
+                previous = offset
+                yield chunk
+            return
+
+        start = time.perf_counter()
+        chunks, offsets = [], []
+        try:
+            for chunk in func():
+                chunks.append(chunk)
+                offsets.append(time.perf_counter() - start)
+                yield chunk
+        except Exception as e:
+            self._write(key, kind, provider, model, request, error=str(e), latency=time.perf_counter() - start)
+            raise
+        self._write(key, kind, provider, model, request, chunks=chunks, offsets=offsets, latency=time.perf_counter() - start)
+
+    async def astream(self, kind: str, provider: str, model: str, request, func):
+        """Asynchronous version of stream. func returns an async iterator of chunks."""
+
+        key = self.make_key(kind, provider, model, request)
+        if self.mode == "replay":
+            entry = self._replay(key)
+            if entry.get("error"):
+                await asyncio.sleep(self._delay(entry["latency"]))
+                raise ReplayedError(entry["error"])
+            previous = 0.0
+            for chunk, offset in zip(*self._replay_chunks(entry)):
+                await asyncio.sleep(self._delay(offset - previous))
+                previous = offset
+                yield chunk
+            return
+
+        start = time.perf_counter()
+        chunks, offsets = [], []
+        try:
+            async for chunk in func():
+                chunks.append(chunk)
+                offsets.append(time.perf_counter() - start)
+                yield chunk
+        except Exception as e:
+            self._write(key, kind, provider, model, request, error=str(e), latency=time.perf_counter() - start)
+            raise
+        self._write(key, kind, provider, model, request, chunks=chunks, offsets=offsets, latency=time.perf_counter() - start)
+
+
+def get_cassette():
+    """Return the cassette of the process, None if CASSETTE_MODE is 'off'."""
+
+    if CASSETTE_MODE.lower() == "off":
+        return None
+    return registry.get("cassette", CASSETTE_MODE.lower(), CASSETTE_PATH, lambda: Cassette(CASSETTE_PATH, CASSETTE_MODE.lower()))
+
+
+class CassetteChatModel:
+    """A chat model whose invoke, stream and astream calls go through a cassette.
+
+    The wrapped model is only created when a call has to reach the provider, so replaying
+    needs neither network nor API key.
+    """
+
+    def __init__(self, cassette: Cassette, provider: str, model: str, load_model):
+        self.cassette = cassette
+        self.provider = provider
+        self.model = model
+        self._load_model = load_model
+        self._inner = None
+
+    @property
+    def inner(self):
+        if self._inner is None:
+            self._inner = self._load_model()
+        return self._inner
+
+    @staticmethod
+    def _request(messages):
+        return [{"type": message.type, "content": message.content} for message in messages]
+
+    @staticmethod
+    def _record(message):
+        # Content, with the token usage if the provider reported it
+        if getattr(message, "usage_metadata", None):
+            return {"content": message.content, "usage_metadata": dict(message.usage_metadata)}
+        return message.content
+
+    @staticmethod
+    def _message(recorded, message_class):
+        if isinstance(recorded, dict):
+            return message_class(content=recorded["content"], usage_metadata=recorded.get("usage_metadata"))
+        return message_class(content=recorded)
+
+    def invoke(self, messages, **kwargs):
+        recorded = self.cassette.call("llm", self.provider, self.model, self._request(messages),
+                                      lambda: self._record(self.inner.invoke(messages, **kwargs)))
+        return self._message(recorded, AIMessage)
+
+    def stream(self, messages, **kwargs):
+        chunks = self.cassette.stream("llm", self.provider, self.model, self._request(messages),
+                                      lambda: (self._record(chunk) for chunk in self.inner.stream(messages, **kwargs)))
+        for recorded in chunks:
+            yield self._message(recorded, AIMessageChunk)
+
+    async def astream(self, messages, **kwargs):
+        async def records():
+            async for chunk in self.inner.astream(messages, **kwargs):
+                yield self._record(chunk)
+
+        async for recorded in self.cassette.astream("llm", self.provider, self.model, self._request(messages), records):
+            yield self._message(recorded, AIMessageChunk)
+
+
+class CassetteEmbeddings(Embeddings):
+    """A LangChain embeddings model whose calls go through a cassette (see CassetteChatModel)."""
+
+    def __init__(self, cassette: Cassette, provider: str, model: str, load_model):
+        self.cassette = cassette
+        self.provider = provider
+        self.model = model
+        self._load_model = load_model
+        self._inner = None
+
+    @property
+    def inner(self):
+        if self._inner is None:
+            self._inner = self._load_model()
+        return self._inner
+
+    def embed_query(self, text: str):
+        return self.cassette.call("embed_query", self.provider, self.model, text, lambda: self.inner.embed_query(text))
+
+    def embed_documents(self, texts: list[str]):
+        return self.cassette.call("embed_documents", self.provider, self.model, texts, lambda: self.inner.embed_documents(texts))
@@ -0,0 +1,45 @@
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from utils.logger import logger
+
+
+def run_branches(executor: ThreadPoolExecutor, branches: dict, default=None):
+    """Run independent branches concurrently and collect their results.
+
+    Each branch is submitted to the executor at once, so the total latency is set by
+    the slowest branch instead of their sum. A branch that fails or exceeds its timeout
+    gets the default value; a timed out branch keeps running in the executor but its
+    result is ignored.
+
+    Args:
+        executor (ThreadPoolExecutor): Executor running the branches.
+        branches (dict): Branch name mapped to a (callable, timeout) tuple. The timeout is
+            in seconds, None or a value <= 0 waits without limit.
+        default (optional): Result of a failed or timed out branch. Defaults to None.
+
+    Returns:
+        dict: Branch name mapped to its result.
+    """
+
+    start = time.perf_counter()
+    # Each branch runs in a copy of the caller's context, so its stages are timed with the request (see utils.timing)
+    futures = {name: (executor.submit(contextvars.copy_context().run, func), timeout) for name, (func, timeout) in branches.items()}
+
+    results = {}
+    for name, (future, timeout) in futures.items():
+        remaining = None
+        if timeout is not None and timeout > 0:
+            remaining = max(0.0, timeout - (time.perf_counter() - start))
+
+        try:
+            results[name] = future.result(timeout=remaining)
+        except TimeoutError:
+            future.cancel()
+            logger.warning(f"Branch '{name}' exceeded its timeout of {timeout}s")
+            results[name] = default
+        except Exception as e:
+            logger.error(f"An error has occurred in branch '{name}': {e}")
+            results[name] = default
+
+    return results
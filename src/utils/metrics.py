@@ -0,0 +1,105 @@
+import os
+import threading
+from config.config import METRICS_BUCKETS
+from utils.logger import logger
+
+
+def _labels(labels: dict):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{str(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    """Prometheus-style metrics of the process, rendered in the text exposition format.
+
+    Stage durations (see utils.timing.stage) feed the rag_stage_duration_seconds histogram
+    and the rag_stage_errors_total counter, labelled by stage. Other counters are created
+    on first increment.
+
+    Attributes:
+        buckets (list[float]): Upper bounds of the histogram buckets in seconds.
+    """
+
+    def __init__(self, buckets: list[float]):
+        self.buckets = sorted(buckets)
+        self._stages = {} # Stage name -> [bucket counts, sum, count, errors]
+        self._counters = {} # Counter name -> (help, {labels tuple: value})
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        """Record the duration of a stage."""
+
+        with self._lock:
+            state = self._stages.get(stage)
+            if state is None:
+                state = self._stages[stage] = [[0] * len(self.buckets), 0.0, 0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += seconds
+            state[2] += 1
+            state[3] += 1 if error else 0
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels):
+        """Increment a counter."""
+
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            description, values = self._counters.setdefault(name, (help, {}))
+            values[key] = values.get(key, 0) + value
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+
+        with self._lock:
+            lines = [
+                "# HELP rag_stage_duration_seconds Duration of the pipeline stages.",
+                "# TYPE rag_stage_duration_seconds histogram",
+            ]
+            for stage, (counts, total, count, _) in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"rag_stage_duration_seconds_bucket{_labels({'stage': stage, 'le': bound})} {cumulative}")
+                lines.append(f"rag_stage_duration_seconds_bucket{_labels({'stage': stage, 'le': '+Inf'})} {count}")
+                lines.append(f"rag_stage_duration_seconds_sum{_labels({'stage': stage})} {total}")
+                lines.append(f"rag_stage_duration_seconds_count{_labels({'stage': stage})} {count}")
+
+            lines += ["# HELP rag_stage_errors_total Failed runs of the pipeline stages.", "# TYPE rag_stage_errors_total counter"]
+            lines += [f"rag_stage_errors_total{_labels({'stage': stage})} {state[3]}" for stage, state in sorted(self._stages.items())]
+
+            for name, (description, values) in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {description or name}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(dict(key))} {value}" for key, value in sorted(values.items())]
+
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Write the metrics to a file (e.g. for the node_exporter textfile collector).
+
+        Returns:
+            bool: True if the file was written, False otherwise.
+        """
+
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(path + ".tmp", path)
+            logger.info(f"Metrics saved to {path}")
+            return True
+        except Exception as e:
+            logger.error(f"An error has occurred while saving metrics: {e}")
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+
+# Metrics of the process
+metrics = Metrics([float(bound) for bound in METRICS_BUCKETS.split(",") if bound.strip()])
@@ -0,0 +1,153 @@
+import time
+import threading
+from config.config import MODEL_IDLE_TIMEOUT
+from utils.logger import logger
+
+
+class ModelRegistry:
+    """A process-wide registry of shared models and clients.
+
+    Models are keyed by (kind, provider, model), e.g. ("llm", "openai", "gpt-4o-mini") or
+    ("reranker", "torch", "cross-encoder/ms-marco-MiniLM-L-6-v2"). A model is loaded by its
+    factory on first use and the same instance (and its connection pool) is returned to
+    every caller of the process. Loading holds a per-key lock, so concurrent first calls
+    load the model once without blocking the other keys.
+
+    Models that are not used for idle_timeout seconds are dropped from the registry and
+    closed if they have a close() method; the next get() loads them again. Callers should
+    get the model at use time rather than keep it, otherwise an unloaded model stays in
+    memory until they release it.
+
+    Attributes:
+        idle_timeout (float): Idle time in seconds before a model is unloaded, 0 to keep models.
+        loads (int): Number of models loaded.
+        unloads (int): Number of models unloaded.
+    """
+
+    def __init__(self, idle_timeout: float = MODEL_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.loads = 0
+        self.unloads = 0
+
+        self._models = {}
+        self._last_used = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._janitor = None
+
+    def get(self, kind: str, provider: str, model: str, factory):
+        """Return the shared model for a key, loading it on first use.
+
+        Args:
+            kind (str): The kind of model ('llm', 'embeddings', 'reranker', ...).
+            provider (str): The provider or backend of the model.
+            model (str): The model name.
+            factory (callable): Function without arguments that loads the model.
+
+        Returns:
+            The shared model instance.
+
+        Raises:
+            Exception: The error raised by the factory if loading fails.
+        """
+
+        key = (kind, provider, model)
+        with self._lock:
+            instance = self._models.get(key)
+            if instance is not None:
+                self._last_used[key] = time.monotonic()
+                return instance
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                instance = self._models.get(key)
+            if instance is None:
+                start = time.perf_counter()
+                instance = factory()
+                logger.info(f"Model registry: loaded {kind} {provider}/{model} in {time.perf_counter() - start:.2f}s")
+                with self._lock:
+                    self._models[key] = instance
+                    self.loads += 1
+
+        with self._lock:
+            self._last_used[key] = time.monotonic()
+        self._start_janitor()
+        return instance
+
+    def unload(self, kind: str, provider: str, model: str):
+        """Drop a model from the registry and close it.
+
+        Returns:
+            bool: True if the model was loaded, False otherwise.
+        """
+
+        with self._lock:
+            instance = self._models.pop((kind, provider, model), None)
+            self._last_used.pop((kind, provider, model), None)
+        if instance is None:
+            return False
+
+        self._close(instance)
+        self.unloads += 1
+        logger.info(f"Model registry: unloaded {kind} {provider}/{model}")
+        return True
+
+    def unload_idle(self, max_idle: float = None):
+        """Unload the models not used for max_idle seconds.
+
+        Args:
+            max_idle (float, optional): Idle time in seconds. Defaults to idle_timeout.
+
+        Returns:
+            int: The number of unloaded models.
+        """
+
+        max_idle = self.idle_timeout if max_idle is None else max_idle
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, last_used in self._last_used.items() if now - last_used >= max_idle]
+
+        return sum(self.unload(*key) for key in idle)
+
+    def clear(self):
+        """Unload every model."""
+
+        with self._lock:
+            keys = list(self._models)
+        for key in keys:
+            self.unload(*key)
+
+    def stats(self):
+        """Return the loaded models with their idle time, and the load and unload counts."""
+
+        now = time.monotonic()
+        with self._lock:
+            models = {"/".join(key): round(now - self._last_used.get(key, now), 1) for key in self._models}
+        return {"models": models, "loads": self.loads, "unloads": self.unloads}
+
+    def _close(self, instance):
+        close = getattr(instance, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.error(f"An error has occurred while closing model: {e}")
+
+    def _start_janitor(self):
+        if self.idle_timeout <= 0 or self._janitor is not None:
+            return
+        with self._lock:
+            if self._janitor is not None:
+                return
+            self._janitor = threading.Thread(target=self._run_janitor, name="model-registry-janitor", daemon=True)
+            self._janitor.start()
+
+    def _run_janitor(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 4, 1.0))
+            self.unload_idle()
+
+
+# Registry shared by the whole process
+registry = ModelRegistry()
@@ -0,0 +1,235 @@
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from config.config import PROFILE_ENABLE, PROFILE_TARGETS, PROFILE_EVERY, PROFILE_ENGINE, PROFILE_INTERVAL_MS, PROFILE_MEMORY, PROFILE_PATH
+from utils.logger import logger
+
+_settings = {
+    "enabled": PROFILE_ENABLE.lower() == "yes",
+    "targets": {target.strip() for target in PROFILE_TARGETS.split(",") if target.strip()},
+    "every": max(PROFILE_EVERY, 1),
+    "engine": PROFILE_ENGINE.lower(),
+    "interval": PROFILE_INTERVAL_MS / 1000,
+    "memory": PROFILE_MEMORY.lower() == "yes",
+    "path": PROFILE_PATH,
+}
+_calls = Counter() # Target name -> calls seen
+_calls_lock = threading.Lock()
+_active = threading.Lock() # Held by the profile in progress, one at a time in the process
+
+
+def configure_profiling(targets: str = None, every: int = None, engine: str = None, memory: bool = None, path: str = None):
+    """Enable profiling at runtime (e.g. from a command line switch), overriding the PROFILE_* configuration.
+
+    Args:
+        targets (str, optional): Comma-separated targets. Defaults to PROFILE_TARGETS.
+        every (int, optional): Profile every Nth call of a target. Defaults to PROFILE_EVERY.
+        engine (str, optional): 'sampling' or 'cprofile'. Defaults to PROFILE_ENGINE.
+        memory (bool, optional): Trace allocations with tracemalloc. Defaults to PROFILE_MEMORY.
+        path (str, optional): Directory of the profiles. Defaults to PROFILE_PATH.
+    """
+
+    _settings["enabled"] = True
+    if targets is not None:
+        _settings["targets"] = {target.strip() for target in targets.split(",") if target.strip()}
+    if every is not None:
+        _settings["every"] = max(every, 1)
+    if engine is not None:
+        _settings["engine"] = engine.lower()
+    if memory is not None:
+        _settings["memory"] = memory
+    if path is not None:
+        _settings["path"] = path
+    logger.info(f"Profiling {', '.join(sorted(_settings['targets']))} every {_settings['every']} call(s) with {_settings['engine']}")
+
+
+def is_profiled(name: str):
+    """Return True if calls named name are profiling targets."""
+
+    return _settings["enabled"] and name in _settings["targets"]
+
+
+class StackSampler:
+    """Wall-clock sampling profiler: records the Python stack of every thread at a fixed interval.
+
+    Stacks are counted in the collapsed format of flamegraph.pl and speedscope, rooted at
+    the thread name, so work handed to executor threads is included.
+
+    Attributes:
+        interval (float): Seconds between samples.
+        stacks (Counter): Collapsed stack mapped to its number of samples.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """Return the samples in the collapsed stack format, one 'frame;frame;... count' line per stack."""
+
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileRun:
+    """One profiled call, written to its own directory of PROFILE_PATH.
+
+    The 'sampling' engine writes stacks.collapsed (flamegraph.pl, speedscope); the
+    'cprofile' engine writes profile.prof (pstats, snakeviz) and stats.txt, for the calling
+    thread only. With memory tracing, memory.txt has the peak and the top allocation sites.
+    Every run writes summary.json.
+
+    Attributes:
+        name (str): Name of the profiled target.
+        directory (str): Output directory.
+    """
+
+    def __init__(self, name: str, call: int):
+        self.name = name
+        self.call = call
+        self.engine = _settings["engine"]
+        self.memory = _settings["memory"]
+        self.directory = os.path.join(_settings["path"], f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{call}")
+        self._profiler = None
+        self._sampler = None
+        self._started_tracemalloc = False
+        self._snapshot = None
+        self._traced = None
+        self._start = None
+        self.seconds = None
+
+    def start(self):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+
+        if self.engine == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(_settings["interval"])
+            self._sampler.start()
+        self._start = time.perf_counter()
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self.memory:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._traced = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+    def save(self):
+        """Write the profile files.
+
+        Returns:
+            bool: True if the profile was saved, False otherwise.
+        """
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            summary = {"name": self.name, "call": self.call, "engine": self.engine, "seconds": self.seconds}
+
+            if self._profiler is not None:
+                self._profiler.dump_stats(os.path.join(self.directory, "profile.prof"))
+                stream = io.StringIO()
+                pstats.Stats(self._profiler, stream=stream).sort_stats("cumulative").print_stats(50)
+                with open(os.path.join(self.directory, "stats.txt"), 'w', encoding='utf-8') as f:
+                    f.write(stream.getvalue())
+
+            if self._sampler is not None:
+                with open(os.path.join(self.directory, "stacks.collapsed"), 'w', encoding='utf-8') as f:
+                    f.write(self._sampler.collapsed())
+                summary["samples"] = self._sampler.samples
+
+            if self._snapshot is not None:
+                current, peak = self._traced
+                lines = [f"Peak traced memory: {peak / 1024 / 1024:.1f} MB", f"Traced memory at the end: {current / 1024 / 1024:.1f} MB", ""]
+                lines += [str(statistic) for statistic in self._snapshot.statistics("lineno")[:30]]
+                with open(os.path.join(self.directory, "memory.txt"), 'w', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+                summary["peak_memory_bytes"] = peak
+
+            with open(os.path.join(self.directory, "summary.json"), 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            logger.info(f"Profile of {self.name} ({self.seconds:.2f}s) saved to {self.directory}")
+            return True
+        except Exception as e:
+            logger.error(f"An error has occurred while saving the profile of {self.name}: {e}")
+            return False
+
+
+@contextmanager
+def profile(name: str):
+    """Profile a block, or a function when used as a decorator, if name is a profiling target.
+
+    Only every PROFILE_EVERY-th call of a target is profiled, and one call at a time in
+    the process: calls starting while another is profiled run unprofiled. Stages of
+    utils.timing are profiled when their name is a target.
+    """
+
+    if not is_profiled(name):
+        yield
+        return
+
+    with _calls_lock:
+        _calls[name] += 1
+        call = _calls[name]
+    if (call - 1) % _settings["every"] or not _active.acquire(blocking=False):
+        yield
+        return
+
+    run = ProfileRun(name, call)
+    try:
+        run.start()
+        try:
+            yield
+        finally:
+            run.stop()
+            run.save()
+    finally:
+        _active.release()
@@ -0,0 +1,75 @@
+import math
+import time
+import random
+import threading
+
+
+class SimulatedError(Exception):
+    """An error raised on purpose by a simulated provider."""
+
+
+class CallSimulator:
+    """Simulate the latency and failures of a remote call.
+
+    Attributes:
+        name (str): Name of the simulated provider, used in error messages.
+        latency_ms (float): Mean latency of a call in milliseconds.
+        jitter_ms (float): Spread of the latency in milliseconds.
+        distribution (str): Latency distribution: 'constant', 'uniform' (latency +/- jitter),
+            'normal' (standard deviation jitter) or 'lognormal' (long tail, jitter as standard deviation).
+        error_rate (float): Probability that a call fails with SimulatedError.
+        calls (int): Number of simulated calls.
+        errors (int): Number of simulated failures.
+    """
+
+    def __init__(self, name: str, latency_ms: float, jitter_ms: float, distribution: str, error_rate: float, seed: int = None):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+
+        if self.distribution not in ["constant", "uniform", "normal", "lognormal"]:
+            raise ValueError(f"Latency distribution '{self.distribution}' not supported.")
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self):
+        """Draw the latency of a call, in seconds."""
+
+        with self._lock:
+            if self.distribution == "constant" or self.jitter_ms <= 0:
+                latency = self.latency_ms
+            elif self.distribution == "uniform":
+                latency = self._random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+            elif self.distribution == "normal":
+                latency = self._random.gauss(self.latency_ms, self.jitter_ms)
+            else:
+                # Parameters of the underlying normal giving the requested mean and deviation
+                mean = max(self.latency_ms, 1e-3)
+                sigma2 = math.log(1 + (self.jitter_ms / mean) ** 2)
+                latency = self._random.lognormvariate(math.log(mean) - sigma2 / 2, sigma2 ** 0.5)
+
+        return max(latency, 0.0) / 1000
+
+    def call(self, latency: float = None):
+        """Wait for the latency of a call, then fail with the error rate.
+
+        Args:
+            latency (float, optional): Latency in seconds. Defaults to a sampled latency.
+
+        Raises:
+            SimulatedError: For a share error_rate of the calls.
+        """
+
+        time.sleep(self.sample_latency() if latency is None else latency)
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if failed:
+            raise SimulatedError(f"Simulated {self.name} error")
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+from contextlib import contextmanager
+from config.config import SLOW_QUERY_ENABLE, SLOW_QUERY_THRESHOLD_MS, SLOW_ANSWER_THRESHOLD_MS, SLOW_QUERY_PATH, SLOW_QUERY_MAX_BYTES, SLOW_QUERY_BACKUPS
+from utils.timing import StageTimings
+from utils.logger import logger
+
+
+class SlowQueryLog:
+    """Rotating JSON lines log of the requests slower than a threshold.
+
+    Each entry has the time, kind ('query_index' or 'answer'), query, latency, stage
+    durations and counts of the request (see utils.timing.StageTimings), plus the fields
+    given by the caller such as the index version. The 'timestamp' lets the log be
+    replayed as a trace by the query load test.
+
+    Attributes:
+        enabled (bool): Whether slow requests are logged.
+        thresholds (dict): Kind of request mapped to its threshold in milliseconds.
+        path (str): Path of the log.
+    """
+
+    def __init__(self, enabled: bool = True, thresholds: dict = None, path: str = SLOW_QUERY_PATH,
+                 max_bytes: int = SLOW_QUERY_MAX_BYTES, backups: int = SLOW_QUERY_BACKUPS):
+        self.enabled = enabled
+        self.thresholds = thresholds or {"query_index": SLOW_QUERY_THRESHOLD_MS, "answer": SLOW_ANSWER_THRESHOLD_MS}
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def _get_writer(self):
+        # The file is only created with the first slow request
+        with self._lock:
+            if self._writer is None:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8')
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                writer = logging.getLogger(f"slow_queries.{self.path}")
+                writer.setLevel(logging.INFO)
+                writer.propagate = False
+                writer.addHandler(handler)
+                self._writer = writer
+        return self._writer
+
+    def record(self, kind: str, query: str, seconds: float, timings: StageTimings, **fields):
+        """Log a request if it is slower than the threshold of its kind.
+
+        Args:
+            kind (str): Kind of request.
+            query (str): The query.
+            seconds (float): Latency of the request.
+            timings (StageTimings): Stage durations and counts of the request.
+            **fields: Other fields of the entry (index_version, error, ...).
+
+        Returns:
+            bool: True if the request was logged, False otherwise.
+        """
+
+        threshold = self.thresholds.get(kind)
+        if not self.enabled or threshold is None or seconds * 1000 < threshold:
+            return False
+
+        try:
+            entry = {
+                "timestamp": time.time(),
+                "kind": kind,
+                "query": query,
+                "latency_ms": seconds * 1000,
+                "threshold_ms": threshold,
+                **fields,
+                "stages_ms": {name: value * 1000 for name, value in timings.stages.items()},
+                "counts": dict(timings.counts),
+            }
+            self._get_writer().info(json.dumps(entry, ensure_ascii=False))
+            return True
+        except Exception as e:
+            logger.error(f"An error has occurred while logging a slow query: {e}")
+            return False
+
+    @contextmanager
+    def track(self, kind: str, query: str, **fields):
+        """Time the block as a request of this kind and log it if it is slow.
+
+        Yields:
+            StageTimings: The timings of the request, None if the log is disabled.
+        """
+
+        if not self.enabled:
+            yield None
+            return
+
+        start = time.perf_counter()
+        error = None
+        with StageTimings() as timings:
+            try:
+                yield timings
+            except BaseException as e:
+                error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                if error is not None:
+                    fields["error"] = error
+                self.record(kind, query, time.perf_counter() - start, timings, **fields)
+
+
+# Slow query log of the process
+slow_query_log = SlowQueryLog(SLOW_QUERY_ENABLE.lower() == "yes")
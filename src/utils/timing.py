@@ -0,0 +1,156 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager, ExitStack
+from config.config import METRICS_ENABLE, TRACING_ENABLE
+from utils.metrics import metrics
+from utils.profiling import is_profiled, profile
+from utils.logger import logger
+
+_current_timings = contextvars.ContextVar("stage_timings", default=None)
+
+_metrics_enabled = METRICS_ENABLE.lower() == "yes"
+_tracing_enabled = TRACING_ENABLE.lower() == "yes"
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+class StageTimings:
+    """Durations of the stages of one request.
+
+    Used as a context manager around a request: the stage() blocks run inside it, in this
+    thread or in branches submitted with utils.concurrency.run_branches, add their duration
+    under their name (a stage run several times is summed). Timings opened inside another
+    (e.g. query_index inside an answer) also add to the enclosing one.
+
+    Attributes:
+        stages (dict): Stage name mapped to its total duration in seconds.
+        counts (dict): Sizes recorded with record_count (candidates, tokens, ...).
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+        self.parent = None
+        self._lock = threading.Lock()
+        self._token = None
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if self.parent is not None:
+            self.parent.add(name, seconds)
+
+    def set_count(self, name: str, value: int):
+        with self._lock:
+            self.counts[name] = value
+        if self.parent is not None:
+            self.parent.set_count(name, value)
+
+    def __enter__(self):
+        current = _current_timings.get()
+        if current is not self:
+            self.parent = current
+        self._token = _current_timings.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current_timings.reset(self._token)
+        return False
+
+
+def get_tracer():
+    """Return the OpenTelemetry tracer, None if tracing is disabled or opentelemetry isn't installed.
+
+    Spans go to the tracer provider of the process. If none is set and opentelemetry-sdk
+    and the OTLP exporter are installed, one exporting to the endpoint of the standard
+    OTEL_EXPORTER_OTLP_* variables is set.
+    """
+
+    global _tracer, _tracing_enabled
+
+    if not _tracing_enabled:
+        return None
+    if _tracer is not None:
+        return _tracer
+
+    with _tracer_lock:
+        if _tracer is None:
+            try:
+                from opentelemetry import trace
+                if not hasattr(trace.get_tracer_provider(), "add_span_processor"):
+                    try:
+                        from opentelemetry.sdk.trace import TracerProvider
+                        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                        provider = TracerProvider()
+                        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                        trace.set_tracer_provider(provider)
+                    except ImportError:
+                        logger.warning("opentelemetry-sdk or its OTLP exporter isn't installed, spans go to the configured tracer provider")
+                _tracer = trace.get_tracer("contextual_rag")
+            except Exception as e:
+                logger.error(f"An error has occurred while setting up tracing, tracing disabled: {e}")
+                _tracing_enabled = False
+    return _tracer
+
+
+def record_stage(name: str, seconds: float, error: bool = False):
+    """Record a stage timed by the caller, e.g. one spanning the pieces of a streamed answer."""
+
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+    if _metrics_enabled:
+        metrics.observe(name, seconds, error)
+
+
+def recording():
+    """Return True if a StageTimings is collecting the current request, to skip computing unused counts."""
+
+    return _current_timings.get() is not None
+
+
+def record_count(name: str, value: int):
+    """Record a size of the current request (e.g. number of rerank candidates) in its StageTimings."""
+
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.set_count(name, value)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block, or a function when used as a decorator, as a pipeline stage.
+
+    The duration is added to the StageTimings of the current request, to the stage
+    histogram if METRICS_ENABLE is 'yes', and the block is traced as an OpenTelemetry span
+    if TRACING_ENABLE is 'yes'. Stages named in the profiling targets are profiled (see
+    utils.profiling). Without any of them, it is a no-op.
+    """
+
+    timings = _current_timings.get()
+    profiled = is_profiled(name)
+    if timings is None and not _metrics_enabled and not _tracing_enabled and not profiled:
+        yield
+        return
+
+    tracer = get_tracer()
+    start = time.perf_counter()
+    failed = False
+    try:
+        with ExitStack() as blocks:
+            if profiled:
+                blocks.enter_context(profile(name))
+            if tracer is not None:
+                blocks.enter_context(tracer.start_as_current_span(name))
+            yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if timings is not None:
+            timings.add(name, seconds)
+        if _metrics_enabled:
+            metrics.observe(name, seconds, failed)
@@ -8,9 +8,11 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/src")
 from src.services.llm_session import LLMSession
 from src.services.indexer import Indexer
 from src.services.indexer2 import Indexer2
+from src.services.prompt_builder import PromptBuilder
 from src.config.config import LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL
 from src.utils.logger import setup_mlflow
 from src.utils.logger import logger
+from services.usage import UsageScope
 
 setup_mlflow()
 
@@ -20,7 +22,7 @@ def main():
     logger.info(f"Physical cores : {psutil.cpu_count(logical=False)}")
     logger.info(f"CPU Usage : {psutil.cpu_percent()}%")
 
-    llm_session = LLMSession(LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL)
+    llm_session = LLMSession(LLM_GENERATIVE_PROVIDER, LLM_GENERATIVE_MODEL, prompt_builder=PromptBuilder())
     # indexer = Indexer()
     indexer = Indexer2()
 
@@ -38,11 +40,13 @@ def main():
     ]
 
     for query in queries:
-        doc_res = indexer.query_index(query)
-        # logger.info(doc_res)
+        with UsageScope(query) as usage:
+            doc_res = indexer.query_index(query)
+            # logger.info(doc_res)
 
-        answer = llm_session.get_response_from_documents(query, doc_res)
+            answer = llm_session.get_response_from_documents(query, doc_res)
         logger.info(f"Query: {query}")
+        logger.info(f"Usage: {usage.totals()}")
         logger.info(f"Answer: {answer}\n\n")
         
 